@@ -0,0 +1,185 @@
+"""
+Cálculo de cuotas y tablas de amortización para muchos préstamos a la vez.
+
+Métodos:
+    frances -> cuota fija; al principio se paga más interés y menos capital
+    aleman  -> capital fijo; la cuota baja cada mes porque el interés se
+               calcula sobre un saldo cada vez menor
+
+Todas las funciones reciben arreglos (o columnas de un DataFrame) y calculan
+con NumPy sin recorrer los préstamos uno por uno: las tablas completas son
+matrices préstamos x meses, y los meses posteriores al plazo de cada préstamo
+quedan en cero.
+
+La tasa nominal anual depende del tipo de préstamo (TASAS_ANUALES) y se
+capitaliza mensualmente.
+"""
+
+import numpy as np
+import pandas as pd
+from configuracion import get_configuracion
+
+# Tasa nominal anual por tipo de préstamo
+TASAS_ANUALES = {
+    "Personal": 0.18,
+    "Hipotecario": 0.105,
+    "Vehicular": 0.13,
+    "Educativo": 0.09,
+    "Emergencia": 0.20,
+}
+
+METODOS = ("frances", "aleman")
+METODO = get_configuracion().amortizacion_metodo
+
+
+def tasas_mensuales(tipos_prestamo):
+    """
+    Traduce tipos de préstamo a tasas mensuales
+
+    Args:
+        tipos_prestamo (array-like | str): Tipos de préstamo
+
+    Returns:
+        numpy.ndarray: Tasa mensual de cada préstamo (NaN si el tipo no tiene tasa)
+    """
+    tipos = pd.Series(np.atleast_1d(tipos_prestamo), dtype=object)
+    return (tipos.map(TASAS_ANUALES).astype("float64") / 12).to_numpy()
+
+
+def _validar_metodo(metodo):
+    if metodo not in METODOS:
+        raise ValueError(f"Método de amortización desconocido: {metodo} (use {', '.join(METODOS)})")
+
+
+def _cuota_francesa(montos, plazos, tasas):
+    # Con tasa 0 la fórmula se indetermina; la cuota es simplemente monto / plazo
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cuota = montos * tasas / (1 - (1 + tasas) ** -plazos)
+    return np.where(tasas == 0, montos / plazos, cuota)
+
+
+def resumen_cuotas(montos, plazos, tasas, metodo=METODO):
+    """
+    Calcula primera cuota, última cuota, total de intereses y total a pagar
+
+    Args:
+        montos (array-like): Monto de cada préstamo
+        plazos (array-like): Plazo en meses de cada préstamo
+        tasas (array-like): Tasa mensual de cada préstamo
+        metodo (str): frances o aleman
+
+    Returns:
+        dict: Arreglos primera_cuota, ultima_cuota, total_intereses y total_pagado
+    """
+    _validar_metodo(metodo)
+    montos, plazos, tasas = (np.asarray(v, dtype="float64") for v in (montos, plazos, tasas))
+
+    if metodo == "frances":
+        primera = ultima = _cuota_francesa(montos, plazos, tasas)
+        total_intereses = primera * plazos - montos
+    else:
+        capital = montos / plazos
+        primera = capital + tasas * montos
+        ultima = capital * (1 + tasas)
+        # Suma de intereses sobre saldos P, P - A, ..., A  =  tasa * A * n (n + 1) / 2
+        total_intereses = tasas * montos * (plazos + 1) / 2
+
+    return {
+        "primera_cuota": primera,
+        "ultima_cuota": ultima,
+        "total_intereses": total_intereses,
+        "total_pagado": montos + total_intereses,
+    }
+
+
+def calendarios(montos, plazos, tasas, metodo=METODO):
+    """
+    Calcula las tablas de amortización completas de muchos préstamos
+
+    Args:
+        montos (array-like): Monto de cada préstamo
+        plazos (array-like): Plazo en meses de cada préstamo
+        tasas (array-like): Tasa mensual de cada préstamo
+        metodo (str): frances o aleman
+
+    Returns:
+        dict: Matrices (préstamos x meses) cuota, interes, capital y saldo;
+            los meses posteriores al plazo de cada préstamo quedan en cero
+    """
+    _validar_metodo(metodo)
+    montos, plazos, tasas = (np.asarray(v, dtype="float64")[:, None] for v in (montos, plazos, tasas))
+    meses = np.arange(1, int(plazos.max()) + 1 if plazos.size else 1, dtype="float64")[None, :]
+    vigente = meses <= plazos
+
+    if metodo == "frances":
+        cuota = _cuota_francesa(montos, plazos, tasas)
+        # Saldo al inicio del mes k: P (1+r)^(k-1) - C ((1+r)^(k-1) - 1) / r
+        # (1+r)^(k-1) como exp((k-1) log(1+r)): mucho más barato que la potencia
+        factor = np.exp((meses - 1) * np.log1p(tasas))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            saldo_inicial = montos * factor - cuota * (factor - 1) / tasas
+        if (tasas == 0).any():
+            saldo_inicial = np.where(tasas == 0, montos - cuota * (meses - 1), saldo_inicial)
+        interes = tasas * saldo_inicial
+        capital = cuota - interes
+        cuota = np.broadcast_to(cuota, interes.shape)
+    else:
+        capital = montos / plazos
+        saldo_inicial = montos - capital * (meses - 1)
+        interes = tasas * saldo_inicial
+        cuota = capital + interes
+        capital = np.broadcast_to(capital, interes.shape)
+
+    saldo = saldo_inicial - capital
+    # El último saldo puede quedar en -1e-9 por redondeo
+    saldo[np.abs(saldo) < 1e-6] = 0.0
+    return {nombre: np.where(vigente, matriz, 0.0) for nombre, matriz in
+            (("cuota", cuota), ("interes", interes), ("capital", capital), ("saldo", saldo))}
+
+
+def cotizar(monto, plazo, tipo_prestamo, metodo=METODO):
+    """
+    Cotiza un préstamo para mostrarlo en el formulario
+
+    Args:
+        monto (float): Monto solicitado
+        plazo (int): Plazo en meses
+        tipo_prestamo (str): Tipo de préstamo, define la tasa
+        metodo (str): frances o aleman
+
+    Returns:
+        dict: tasa_anual, primera_cuota, ultima_cuota, total_intereses y
+            total_pagado, más la tabla de amortización como DataFrame
+    """
+    tasa = tasas_mensuales(tipo_prestamo)
+    resumen = {clave: float(valor[0]) for clave, valor in resumen_cuotas([monto], [plazo], tasa, metodo).items()}
+    tabla = calendarios([monto], [plazo], tasa, metodo)
+    resumen["tasa_anual"] = TASAS_ANUALES.get(tipo_prestamo)
+    resumen["tabla"] = pd.DataFrame({
+        "mes": np.arange(1, int(plazo) + 1),
+        **{nombre: matriz[0, :int(plazo)].round(2) for nombre, matriz in tabla.items()},
+    })
+    return resumen
+
+
+def agregar_cuotas(df, metodo=METODO):
+    """
+    Agrega a un DataFrame de solicitudes las columnas cuota_mensual y total_intereses
+
+    Args:
+        df (pandas.DataFrame): Debe tener tipo_prestamo, monto_solicitado y plazo_meses
+        metodo (str): frances o aleman (en el alemán, cuota_mensual es la primera cuota)
+
+    Returns:
+        pandas.DataFrame: Copia de `df` con las columnas nuevas
+    """
+    resumen = resumen_cuotas(
+        df["monto_solicitado"].to_numpy(dtype="float64"),
+        df["plazo_meses"].to_numpy(dtype="float64"),
+        tasas_mensuales(df["tipo_prestamo"].to_numpy()),
+        metodo,
+    )
+    df = df.copy()
+    df["cuota_mensual"] = resumen["primera_cuota"].round(2)
+    df["total_intereses"] = resumen["total_intereses"].round(2)
+    return df
@@ -3,7 +3,9 @@ from datetime import datetime, date, timedelta
 import pandas as pd
 import uuid
 import logging
-import re
+import os
+import tempfile
+import time
 
 # Configurar logging para debugging
 logging.basicConfig(level=logging.INFO)
@@ -11,10 +13,25 @@ logger = logging.getLogger(__name__)
 
 # Importar funciones de GCP
 try:
-    from gcp_config import insert_solicitud, get_all_solicitudes, create_table_if_not_exists, verificar_configuracion
-    logger.info("✅ Módulo gcp_config importado correctamente")
+    from storage import (
+        preparar_esquema_en_segundo_plano, estado_esquema, consultar_solicitudes, get_historial_estados,
+    )
+    from batch_writer import encolar_solicitud, estado_envio, ColaLlena, PENDIENTE, CONFIRMADA, RECHAZADA
+    from consultas import COLUMNAS_LISTADO, VENTANA_DIAS, clave_filtros
+    from query_cache import get_query_cache
+    from metricas import get_registro
+    from importar_solicitudes import importar, COLUMNAS_REQUERIDAS
+    from resumen_cartera import get_resumen_cartera, mes_inicial, ORDEN_BANDAS
+    from exportar_solicitudes import exportar, FORMATOS as FORMATOS_EXPORTACION, MIME as MIME_EXPORTACION
+    from validacion import validar_solicitud, formatear_cedula
+    from indice_cedulas import get_indice_cedulas, verificar_duplicado
+    from busqueda_solicitudes import get_indice_busqueda
+    from estados import cambiar_estado, transiciones_permitidas
+    from amortizacion import cotizar, agregar_cuotas, METODOS, METODO as METODO_AMORTIZACION
+    from schema import TIPOS_PRESTAMO, ESTADOS, MONTO_MIN, MONTO_MAX, PLAZO_MIN, PLAZO_MAX, PLAZO_PASO, EDAD_MINIMA
+    logger.info("✅ Módulos de datos importados correctamente")
 except ImportError as e:
-    st.error(f"❌ Error al importar gcp_config: {str(e)}")
+    st.error(f"❌ Error al importar los módulos de datos: {str(e)}")
     st.stop()
 
 # Configuración de la página
@@ -24,65 +41,78 @@ st.set_page_config(
     layout="wide"
 )
 
-# ========== FUNCIÓN DE FORMATO FINAL ==========
-def formato_final_telefono(texto):
-    """
-    Aplica formato final (XXX) XXX-XXXX a un número de 10 dígitos.
-    
-    Args:
-        texto (str): Cadena que puede contener números y otros caracteres
-        
-    Returns:
-        str: Número formateado o cadena vacía si no tiene 10 dígitos
-    """
-    # Extraer solo números
-    numeros = re.sub(r'\D', '', texto)
-    
-    # Solo formatear si tiene exactamente 10 dígitos
-    if len(numeros) == 10:
-        return f"({numeros[:3]}) {numeros[3:6]}-{numeros[6:]}"
-    
-    # Si no tiene 10 dígitos, devolver vacío o el texto original
-    return texto
-
-def formato_final_cedula(texto):
-    """
-    Aplica formato final XXX-XXXXXXX-X a un número de 11 dígitos.
-    
-    Args:
-        texto (str): Cadena que puede contener números y otros caracteres
-        
-    Returns:
-        str: Número formateado o cadena vacía si no tiene 10 dígitos
-    """
-    # Extraer solo números
-    numeros = re.sub(r'\D', '', texto)
-    
-    # Solo formatear si tiene exactamente 11 dígitos
-    if len(numeros) == 11:
-        return f"({numeros[:3]}) {numeros[3:10]}-{numeros[10:]}"
-    
-    # Si no tiene 11 dígitos, devolver vacío o el texto original
-    return texto
-
 # ========== INICIALIZACIÓN DE SESSION STATE ==========
 # Esto evita errores en la primera ejecución
 if 'form_submitted' not in st.session_state:
     st.session_state.form_input = False
 
 
-# Crear tabla en BigQuery si no existe (solo una vez)
-if 'tabla_verificada' not in st.session_state:
-    try:
-        with st.spinner("🔌 Verificando conexión con BigQuery..."):
-            resultado = create_table_if_not_exists()
-            if resultado:
-                st.session_state.tabla_verificada = True
-                st.success("✅ Conexión con BigQuery establecida", icon="✅")
-            else:
-                st.warning("⚠️ No se pudo verificar la tabla en BigQuery")
-    except Exception as e:
-        st.error(f"❌ Error de conexión: {str(e)}")
+# Las tablas se preparan una sola vez por proceso y en segundo plano (ver el
+# final del script); aquí solo se informa si el último intento falló
+_, error_esquema = estado_esquema()
+if error_esquema is not None:
+    st.warning(f"⚠️ No se pudo verificar el esquema en BigQuery: {error_esquema}. Se reintentará al guardar.")
+
+# ==================== ESTADO DEL ENVÍO ====================
+
+# st.fragment existe desde Streamlit 1.37; antes se consulta con un botón
+_fragmento = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+
+def _panel_estado_envio(seguimiento):
+    envio = estado_envio(seguimiento)
+    if envio.estado == CONFIRMADA:
+        st.success(f"✅ Solicitud guardada en BigQuery · Seguimiento: `{seguimiento}`")
+    elif envio.estado == RECHAZADA:
+        st.error(f"❌ BigQuery rechazó la solicitud `{seguimiento}`: {envio.detalle}")
+    elif envio.estado == PENDIENTE:
+        st.info(f"⏳ Solicitud registrada, guardándose en BigQuery ({envio.detalle}) · Seguimiento: `{seguimiento}`")
+    else:
+        st.info(f"ℹ️ Solicitud registrada · Seguimiento: `{seguimiento}`")
+    return envio.estado
+
+
+def mostrar_estado_envio(seguimiento):
+    """
+    Muestra el estado de una solicitud enviada; mientras esté pendiente se
+    vuelve a consultar cada segundo sin volver a ejecutar toda la página
+    """
+    if _fragmento is None:
+        if _panel_estado_envio(seguimiento) == PENDIENTE:
+            st.button("🔄 Actualizar estado")
+        return
+
+    pendiente = estado_envio(seguimiento).estado == PENDIENTE
+
+    @_fragmento(run_every=1.0 if pendiente else None)
+    def panel():
+        if _panel_estado_envio(seguimiento) != PENDIENTE and pendiente:
+            # Al terminar se ejecuta la página completa para dejar de consultar
+            st.rerun()
+
+    panel()
+
+
+# st.download_button acepta una función en `data` (se llama recién al hacer
+# clic) desde Streamlit 1.52; antes hay que pasarle el contenido
+_DESCARGA_DIFERIDA = tuple(int(parte) for parte in st.__version__.split(".")[:2]) >= (1, 52)
+
+
+def _leer_archivo(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def boton_descarga_archivo(etiqueta, path, file_name, mime):
+    """
+    Botón para descargar un archivo del disco sin cargarlo en memoria en cada
+    ejecución de la página (con Streamlit 1.52 o más nuevo)
+    """
+    if _DESCARGA_DIFERIDA:
+        st.download_button(etiqueta, lambda: _leer_archivo(path), file_name=file_name, mime=mime, on_click="ignore")
+    else:
+        st.download_button(etiqueta, _leer_archivo(path), file_name=file_name, mime=mime)
+
 
 # ==================== INTERFAZ ====================
 
@@ -90,15 +120,64 @@ st.title("💰 Módulo de Crédito - Cooperativa")
 st.write("Sistema para gestionar solicitudes de préstamos")
 
 # Tabs
-tab1, tab2 = st.tabs(["📝 Nueva Solicitud", "📊 Ver Solicitudes"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(
+    ["📝 Nueva Solicitud", "📊 Ver Solicitudes", "📈 Cartera", "📥 Importación Masiva", "🛠️ Administración"]
+)
 
 # ==================== TAB 1: FORMULARIO ====================
 
 with tab1:
     st.header("Solicitud de Préstamo")
 
+    # Fuera del formulario para que la cotización se actualice al mover los valores
+    st.subheader("1. Información del Préstamo")
+    col3, col4 = st.columns(2)
+    with col3:
+        tipo_prestamo = st.selectbox(
+            "Tipo de Préstamo *",
+            TIPOS_PRESTAMO
+        )
+        monto_solicitado = st.number_input(
+            "Monto Solicitado (RD$) *",
+            min_value=MONTO_MIN,
+            max_value=MONTO_MAX,
+            value=50000.0,
+            step=1000.0,
+            format="%.2f"
+        )
+    with col4:
+        plazo_meses = st.slider(
+            "Plazo (meses) *",
+            min_value=PLAZO_MIN,
+            max_value=PLAZO_MAX,
+            value=12,
+            step=PLAZO_PASO
+        )
+        metodo_amortizacion = st.radio(
+            "Método de amortización",
+            METODOS,
+            index=METODOS.index(METODO_AMORTIZACION),
+            format_func={"frances": "Francés (cuota fija)", "aleman": "Alemán (capital fijo)"}.get,
+            horizontal=True,
+        )
+
+    cotizacion = cotizar(monto_solicitado, plazo_meses, tipo_prestamo, metodo_amortizacion)
+    col_tasa, col_cuota, col_int, col_total = st.columns(4)
+    col_tasa.metric("Tasa anual", f"{cotizacion['tasa_anual']:.2%}")
+    if metodo_amortizacion == "frances":
+        col_cuota.metric("Cuota mensual", f"RD$ {cotizacion['primera_cuota']:,.2f}")
+    else:
+        col_cuota.metric(
+            "Primera cuota", f"RD$ {cotizacion['primera_cuota']:,.2f}",
+            help=f"Baja cada mes hasta RD$ {cotizacion['ultima_cuota']:,.2f}",
+        )
+    col_int.metric("Total intereses", f"RD$ {cotizacion['total_intereses']:,.2f}")
+    col_total.metric("Total a pagar", f"RD$ {cotizacion['total_pagado']:,.2f}")
+    with st.expander("📅 Tabla de amortización"):
+        st.dataframe(cotizacion["tabla"], use_container_width=True, hide_index=True)
+
     with st.form("formulario_prestamo", clear_on_submit=False):
-        st.subheader("1. Datos del Solicitante")
+        st.subheader("2. Datos del Solicitante")
         col1, col2 = st.columns(2)
         with col1:
             nombre = st.text_input("Nombre Completo *", placeholder="Ej: Juan Pérez")
@@ -112,7 +191,7 @@ with tab1:
 
         with col2:
             email = st.text_input("Correo Electrónico", placeholder="Ej: juan@email.com")
-            fecha_max = date.today() - timedelta(days=18*365)
+            fecha_max = date.today() - timedelta(days=EDAD_MINIMA*365)
             fecha_nacimiento = st.date_input(
                 "Fecha de Nacimiento *", 
                 min_value=date(1940, 1, 1),
@@ -121,32 +200,6 @@ with tab1:
             )
             ocupacion = st.text_input("Ocupación *", placeholder="Ej: Contador")
 
-        st.divider()
-        st.subheader("2. Información del Préstamo")
-
-        col3, col4 = st.columns(2)
-        with col3:
-            tipo_prestamo = st.selectbox(
-                "Tipo de Préstamo *",
-                ["Personal", "Hipotecario", "Vehicular", "Educativo", "Emergencia"]
-            )
-            monto_solicitado = st.number_input(
-                "Monto Solicitado (RD$) *",
-                min_value=1000.0,
-                max_value=5000000.0,
-                value=50000.0,
-                step=1000.0,
-                format="%.2f"
-            )
-        with col4:
-            plazo_meses = st.slider(
-                "Plazo (meses) *",
-                min_value=6,
-                max_value=120,
-                value=12,
-                step=6
-            )
-
         st.divider()
         st.subheader("3. Información Adicional")
         proposito = st.text_area("Propósito del Préstamo *", placeholder="Describa brevemente para qué utilizará el préstamo...")
@@ -156,79 +209,503 @@ with tab1:
         # ========== VALIDACIÓN Y USO ==========
 
         if submitted:
-            telefono_formateado = formato_final_telefono(telefono_raw)
-            
-            # Validar que tenga 10 dígitos
-            numeros_solo_telefono = re.sub(r'\D', '', telefono_formateado)
-        
-            cedula_formateada = formato_final_cedula(cedula_raw)
-            
-            # Validar que tenga 10 dígitos
-            numeros_solo_cedula = re.sub(r'\D', '', cedula_formateada)
-        
-            errores = []
-            if not nombre or len(nombre) < 3:
-                errores.append("❌ El nombre debe tener al menos 3 caracteres")
-            if len(numeros_solo_telefono) != 10:
-                errores.append("❌ El teléfono debe tener 10 dígitos")
-            if not ocupacion:
-                errores.append("❌ La ocupación es obligatoria")
-            if not proposito or len(proposito) < 10:
-                errores.append("❌ El propósito debe tener al menos 10 caracteres")
-            if len(numeros_solo_cedula) != 11:
-                errores.append("❌ El teléfono debe tener 11 dígitos")
-            
+            valores, errores = validar_solicitud({
+                'nombre': nombre,
+                'cedula': cedula_raw,
+                'telefono': telefono_raw,
+                'email': email,
+                'fecha_nacimiento': fecha_nacimiento,
+                'ocupacion': ocupacion,
+                'tipo_prestamo': tipo_prestamo,
+                'monto_solicitado': monto_solicitado,
+                'plazo_meses': plazo_meses,
+                'proposito': proposito,
+            })
+
+            if not errores:
+                with st.spinner("🔎 Buscando solicitudes previas..."):
+                    verificacion = verificar_duplicado(valores['cedula'], valores['tipo_prestamo'])
+
             if errores:
                 st.error("🚫 Por favor corrige los siguientes errores:")
-                for error in errores:
-                    st.warning(error)
+                for _, motivo in errores:
+                    st.warning(f"❌ {motivo}")
+            elif verificacion.bloquear:
+                st.error(f"🚫 {verificacion.mensaje}")
             else:
-                with st.spinner("💾 Guardando solicitud en BigQuery..."):
-                    solicitud = {
-                        'id': str(uuid.uuid4()),
-                        'fecha_solicitud': datetime.now().isoformat(),
-                        'nombre': nombre,
-                        'cedula': cedula_formateada,
-                        'telefono': telefono_formateado,
-                        'email': email if email else None,
-                        'fecha_nacimiento': str(fecha_nacimiento),
-                        'ocupacion': ocupacion,
-                        'tipo_prestamo': tipo_prestamo,
-                        'monto_solicitado': float(monto_solicitado),
-                        'plazo_meses': int(plazo_meses),
-                        'proposito': proposito,
-                        'estado': 'Pendiente'
-                    }
+                if verificacion.duplicada:
+                    st.warning(f"⚠️ {verificacion.mensaje}")
+                elif verificacion.mensaje:
+                    st.info(f"ℹ️ {verificacion.mensaje}")
+                solicitud = {
+                    'id': str(uuid.uuid4()),
+                    'fecha_solicitud': datetime.now().isoformat(),
+                    **valores,
+                    'fecha_nacimiento': str(valores['fecha_nacimiento']),
+                }
 
-                    resultado = insert_solicitud(solicitud)
-                    if resultado:
-                        st.success("✅ ¡Solicitud guardada exitosamente en BigQuery!")
-                        st.balloons()
+                # Se anota en el spool local y se escribe a BigQuery en el próximo
+                # lote, en el hilo del escritor; aquí no se espera la escritura
+                try:
+                    seguimiento = encolar_solicitud(solicitud)
+                except ColaLlena:
+                    st.error("⏳ Hay muchas solicitudes en espera. Intenta enviarla de nuevo en unos segundos.")
+                else:
+                    if seguimiento:
+                        st.session_state.solicitud_enviada = seguimiento
                         st.session_state.form_submitted = True
+                        st.balloons()
                     else:
-                        st.error("❌ Error al guardar en BigQuery")
+                        st.error("❌ Error al registrar la solicitud")
+
+    if st.session_state.get("solicitud_enviada"):
+        mostrar_estado_envio(st.session_state.solicitud_enviada)
 
 if st.session_state.get("form_submitted"):
     if st.button("📝 Nueva Solicitud"):
         st.session_state.form_submitted = False
+        st.session_state.pop("solicitud_enviada", None)
         st.rerun()
 
 # ==================== TAB 2: VER SOLICITUDES ====================
 
 with tab2:
     st.header("Solicitudes Registradas")
-    if st.button("🔄 Recargar datos"):
-        st.rerun()
+    query_cache = get_query_cache()
 
-    try:
-        with st.spinner("📊 Cargando solicitudes..."):
-            df = get_all_solicitudes()
+    # Streamlit ejecuta todas las pestañas en cada interacción; la consulta
+    # solo se hace cuando el usuario pidió ver el listado
+    if not st.session_state.get("listado_solicitado"):
+        if st.button("📊 Ver solicitudes"):
+            st.session_state.listado_solicitado = True
 
-        if df is not None and len(df) > 0:
-            st.success(f"✅ Se cargaron **{len(df)}** solicitudes")
-            st.dataframe(df, use_container_width=True)
+    if st.session_state.get("listado_solicitado"):
+        # Búsqueda en el índice local: no consulta la tabla
+        texto_busqueda = st.text_input(
+            "🔍 Buscar por nombre, ocupación o propósito", placeholder="Ej: maria comerciante"
+        )
+        if texto_busqueda.strip():
+            try:
+                indice_busqueda = get_indice_busqueda()
+                if not indice_busqueda.construido:
+                    # Se construye en segundo plano: la página no espera a que termine
+                    indice_busqueda.construir_en_segundo_plano()
+                    st.info("⏳ El índice de búsqueda está en construcción; intenta de nuevo en unos minutos")
+                else:
+                    with st.spinner("🔍 Buscando..."):
+                        encontradas = indice_busqueda.buscar(texto_busqueda)
+                    if len(encontradas) > 0:
+                        st.dataframe(encontradas, use_container_width=True, hide_index=True)
+                        st.caption(
+                            f"🔎 {len(encontradas)} resultados, de más a menos relevante, "
+                            f"en {indice_busqueda.stats['ultima_busqueda_ms']:.0f} ms"
+                        )
+                    else:
+                        st.info("📭 Ninguna solicitud coincide con la búsqueda")
+            except Exception as e:
+                st.error(f"⚠️ Error al buscar: {str(e)}")
+
+        with st.expander("🔎 Filtros"):
+            colf1, colf2, colf3 = st.columns(3)
+            with colf1:
+                filtro_estado = st.multiselect("Estado", ESTADOS)
+                filtro_tipo = st.multiselect("Tipo de Préstamo", TIPOS_PRESTAMO)
+            with colf2:
+                filtro_fechas = st.date_input("Fecha de solicitud (rango)", value=())
+                filtro_cedula = st.text_input("Cédula", placeholder="Ej: 40227305527", max_chars=11)
+            with colf3:
+                filtro_monto_min = st.number_input("Monto mínimo (RD$)", min_value=0.0, value=0.0, step=1000.0)
+                filtro_monto_max = st.number_input(
+                    "Monto máximo (RD$)", min_value=0.0, value=0.0, step=1000.0, help="0 = sin límite"
+                )
+            col_pag, col_prop = st.columns(2)
+            with col_pag:
+                tamano_pagina = st.selectbox("Filas por página", [25, 50, 100], index=1)
+            with col_prop:
+                mostrar_proposito = st.checkbox("Mostrar propósito")
+            if VENTANA_DIAS:
+                st.caption(
+                    f"📅 Sin rango de fechas se muestran los últimos {VENTANA_DIAS} días "
+                    f"(al filtrar por cédula, todo el historial)"
+                )
+
+        filtros = {
+            "estado": filtro_estado,
+            "tipo_prestamo": filtro_tipo,
+            "fecha_desde": filtro_fechas[0] if len(filtro_fechas) == 2 else None,
+            "fecha_hasta": filtro_fechas[1] if len(filtro_fechas) == 2 else None,
+            "monto_min": filtro_monto_min or None,
+            "monto_max": filtro_monto_max or None,
+            "cedula": formatear_cedula(filtro_cedula) if filtro_cedula else None,
+        }
+        columnas = COLUMNAS_LISTADO + ["proposito"] if mostrar_proposito else COLUMNAS_LISTADO
+
+        # Si cambian los filtros se vuelve a la primera página
+        clave_listado = (clave_filtros(filtros), tuple(columnas), tamano_pagina)
+        if st.session_state.get("listado_clave") != clave_listado:
+            st.session_state.listado_clave = clave_listado
+            st.session_state.listado_cursores = [None]
+        cursores = st.session_state.listado_cursores
+
+        if st.button("🔄 Recargar datos"):
+            query_cache.invalidate()
+
+        if "resultado_cambio_estado" in st.session_state:
+            estado_nuevo, resultado = st.session_state.pop("resultado_cambio_estado")
+            if resultado.aplicadas:
+                st.success(f"✅ {resultado.aplicadas} solicitudes pasaron a {estado_nuevo}")
+            for titulo, rechazadas in (("cambiaron mientras tanto", resultado.conflictos),
+                                       ("no admiten ese cambio", resultado.invalidas)):
+                if len(rechazadas):
+                    st.warning(f"⚠️ {len(rechazadas)} solicitudes no se cambiaron porque {titulo}")
+                    st.dataframe(rechazadas, use_container_width=True, hide_index=True)
+
+        try:
+            with st.spinner("📊 Cargando solicitudes..."):
+                df, siguiente_cursor = query_cache.get_or_load(
+                    ("solicitudes:pagina", clave_listado, cursores[-1]),
+                    lambda: consultar_solicitudes(filtros, columnas, cursores[-1], tamano_pagina),
+                )
+
+            if len(df) > 0:
+                st.success(f"✅ Página {len(cursores)}: **{len(df)}** solicitudes")
+                seleccionar_todas = st.checkbox(
+                    "Seleccionar toda la página", key=f"seleccionar_pagina_{st.session_state.get('cambios_estado', 0)}"
+                )
+                tabla = agregar_cuotas(df)
+                tabla.insert(0, "seleccionada", seleccionar_todas)
+                # La clave cambia con la página y después de cada cambio de estado,
+                # para que la selección no pase de una tabla a otra
+                editada = st.data_editor(
+                    tabla,
+                    use_container_width=True,
+                    hide_index=True,
+                    disabled=[columna for columna in tabla.columns if columna != "seleccionada"],
+                    column_config={"seleccionada": st.column_config.CheckboxColumn("✔", width="small")},
+                    key=f"listado_editor_{hash((clave_listado, len(cursores), seleccionar_todas))}"
+                        f"_{st.session_state.get('cambios_estado', 0)}",
+                )
+                st.caption(
+                    f"💵 cuota_mensual y total_intereses: método {METODO_AMORTIZACION}, "
+                    "con la tasa de cada tipo de préstamo"
+                )
+
+                seleccion = editada.loc[editada["seleccionada"], ["id", "estado"]]
+                destinos = [estado for estado in ESTADOS
+                            if any(estado in transiciones_permitidas(actual) for actual in seleccion["estado"])]
+                with st.expander(f"🔁 Cambiar estado ({len(seleccion)} seleccionadas)", expanded=len(seleccion) > 0):
+                    if destinos:
+                        col_est, col_usr = st.columns(2)
+                        with col_est:
+                            estado_nuevo = st.selectbox("Nuevo estado", destinos)
+                        with col_usr:
+                            usuario = st.text_input("Usuario", key="cambio_estado_usuario")
+                        comentario = st.text_input("Comentario (opcional)")
+                        if st.button(f"✅ Aplicar a {len(seleccion)} solicitudes", type="primary"):
+                            try:
+                                with st.spinner("🔁 Aplicando cambio de estado..."):
+                                    resultado = cambiar_estado(seleccion, estado_nuevo, usuario, comentario)
+                                st.session_state.resultado_cambio_estado = (estado_nuevo, resultado)
+                                st.session_state.cambios_estado = st.session_state.get("cambios_estado", 0) + 1
+                                query_cache.invalidate()
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"❌ No se pudo cambiar el estado: {str(e)}")
+                    elif len(seleccion):
+                        st.info("ℹ️ Las solicitudes seleccionadas están en un estado final")
+                    else:
+                        st.caption("Marca una o más solicitudes en la tabla para cambiarles el estado")
+
+                    if len(seleccion) == 1:
+                        try:
+                            historial = get_historial_estados(seleccion["id"].iloc[0])
+                            if len(historial):
+                                st.caption("Historial de la solicitud seleccionada")
+                                st.dataframe(historial.drop(columns="id"), use_container_width=True, hide_index=True)
+                        except Exception as e:
+                            st.warning(f"⚠️ No se pudo leer el historial: {str(e)}")
+            else:
+                st.info("📭 No hay solicitudes que coincidan con los filtros")
+
+            col_ant, _, col_sig = st.columns([1, 4, 1])
+            with col_ant:
+                if st.button("⬅️ Anterior", disabled=len(cursores) == 1):
+                    cursores.pop()
+                    st.rerun()
+            with col_sig:
+                if st.button("Siguiente ➡️", disabled=siguiente_cursor is None):
+                    cursores.append(siguiente_cursor)
+                    st.rerun()
+
+        except Exception as e:
+            st.error(f"⚠️ Error al cargar las solicitudes: {str(e)}")
+
+        st.caption(f"⚡ Consultas evitadas por la caché: {query_cache.stats['consultas_evitadas']}")
+
+        with st.expander("📤 Exportar solicitudes filtradas"):
+            st.caption("Se exportan todas las páginas con los filtros y columnas de arriba")
+            col_fmt, col_pii = st.columns(2)
+            with col_fmt:
+                formato_exportacion = st.selectbox("Formato", FORMATOS_EXPORTACION)
+            with col_pii:
+                enmascarar_exportacion = st.checkbox("Enmascarar cédula, teléfono y email", value=True)
+            if st.button("📤 Generar archivo"):
+                # Solo se conserva la última exportación de cada sesión
+                anterior = st.session_state.pop("exportacion", None)
+                if anterior and os.path.exists(anterior["path"]):
+                    os.remove(anterior["path"])
+                avance = st.empty()
+                exportacion_path = os.path.join(
+                    tempfile.gettempdir(), f"solicitudes_{uuid.uuid4().hex}.{formato_exportacion}"
+                )
+                try:
+                    resumen = exportar(
+                        exportacion_path,
+                        formato_exportacion,
+                        filtros,
+                        columnas,
+                        enmascarar=enmascarar_exportacion,
+                        ventana_dias=VENTANA_DIAS,
+                        progreso=lambda r: avance.info(
+                            f"🔄 {r['filas']:,} filas exportadas ({r['filas_por_segundo']:,.0f} filas/s)"
+                        ),
+                    )
+                    avance.empty()
+                    st.success(
+                        f"✅ {resumen['filas']:,} solicitudes exportadas en {resumen['segundos']:.1f} s "
+                        f"({resumen['filas_por_segundo']:,.0f} filas/s)"
+                    )
+                    st.session_state.exportacion = {
+                        "path": exportacion_path,
+                        "formato": formato_exportacion,
+                        "bytes": resumen["bytes"],
+                        "fecha": date.today(),
+                    }
+                except Exception as e:
+                    avance.empty()
+                    st.error(f"❌ Error al exportar: {str(e)}")
+                    if os.path.exists(exportacion_path):
+                        os.remove(exportacion_path)
+
+            exportacion = st.session_state.get("exportacion")
+            if exportacion and os.path.exists(exportacion["path"]):
+                boton_descarga_archivo(
+                    f"⬇️ Descargar ({exportacion['bytes'] / 1024 ** 2:.1f} MB)",
+                    exportacion["path"],
+                    f"solicitudes_{exportacion['fecha']:%Y%m%d}.{exportacion['formato']}",
+                    MIME_EXPORTACION[exportacion["formato"]],
+                )
+
+        with st.expander("🪪 Índice de cédulas (duplicados)"):
+            indice = get_indice_cedulas()
+            if st.button("🔄 Reconstruir índice"):
+                try:
+                    with st.spinner("🔄 Reconstruyendo índice..."):
+                        indice.reconstruir()
+                except Exception as e:
+                    st.error(f"❌ No se pudo reconstruir el índice: {str(e)}")
+            estadisticas = indice.estadisticas()
+            if estadisticas["construido"]:
+                col_ced, col_sol, col_mem = st.columns(3)
+                col_ced.metric("Cédulas", f"{estadisticas['cedulas']:,}")
+                col_sol.metric("Solicitudes", f"{estadisticas['solicitudes']:,}")
+                col_mem.metric("Memoria", f"{estadisticas['memoria_bytes'] / 1024 / 1024:.1f} MB")
+                st.caption(
+                    f"Política: {estadisticas['politica']} · Duplicadas detectadas: {estadisticas['duplicadas']}"
+                    f" · Bloqueadas: {estadisticas['bloqueadas']}"
+                    f" · Última reconstrucción: {estadisticas['ultima_reconstruccion_segundos']:.1f} s"
+                )
+            else:
+                st.info("ℹ️ El índice se está construyendo en segundo plano; mientras tanto no se verifican duplicados")
+
+        with st.expander("🔍 Índice de búsqueda"):
+            indice_busqueda = get_indice_busqueda()
+            if st.button("🔄 Reconstruir índice de búsqueda"):
+                try:
+                    with st.spinner("🔄 Reconstruyendo índice de búsqueda..."):
+                        indice_busqueda.reconstruir()
+                except Exception as e:
+                    st.error(f"❌ No se pudo reconstruir el índice de búsqueda: {str(e)}")
+            estadisticas_busqueda = indice_busqueda.estadisticas()
+            if estadisticas_busqueda["construido"]:
+                col_ind, col_tam = st.columns(2)
+                col_ind.metric("Solicitudes indexadas", f"{estadisticas_busqueda['solicitudes']:,}")
+                col_tam.metric("Tamaño", f"{estadisticas_busqueda['bytes'] / 1024 / 1024:.1f} MB")
+                st.caption("Las solicitudes borradas de la tabla desaparecen del índice al reconstruirlo")
+            else:
+                st.info("⏳ El índice se está construyendo en segundo plano")
+
+# ==================== TAB 3: CARTERA ====================
+
+with tab3:
+    st.header("Tablero de la Cartera")
+
+    # Igual que el listado: las consultas solo se hacen cuando se pide el tablero
+    if not st.session_state.get("tablero_solicitado"):
+        if st.button("📈 Ver tablero"):
+            st.session_state.tablero_solicitado = True
+
+    if st.session_state.get("tablero_solicitado"):
+        resumen_cartera = get_resumen_cartera()
+        periodos = {"Últimos 12 meses": 12, "Últimos 24 meses": 24, "Todo el historial": 0}
+        col_periodo, col_actualizar = st.columns([3, 1])
+        with col_periodo:
+            periodo = st.selectbox("Período", list(periodos))
+        with col_actualizar:
+            actualizar_resumen = st.button("🔄 Actualizar resumen")
+        desde_mes = mes_inicial(periodos[periodo])
+
+        try:
+            if actualizar_resumen:
+                with st.spinner("🔄 Actualizando el resumen..."):
+                    resultado = resumen_cartera.actualizar()
+                st.success(f"✅ Resumen actualizado ({resultado['modo']}) en {resultado['segundos']:.1f} s")
+            else:
+                # Los meses nuevos se agregan en segundo plano; mientras tanto se muestra el resumen guardado
+                resumen_cartera.actualizar_si_vencido()
+
+            inicio_tablero = time.perf_counter()
+            por_estado = resumen_cartera.consultar("estado", desde_mes)
+            if por_estado.empty and not resumen_cartera.actualizado_en_proceso:
+                # Resumen vacío: la primera construcción se espera aquí
+                with st.spinner("🔄 Construyendo el resumen de la cartera..."):
+                    resumen_cartera.actualizar()
+                inicio_tablero = time.perf_counter()
+                por_estado = resumen_cartera.consultar("estado", desde_mes)
+
+            if por_estado.empty:
+                st.info("📭 No hay solicitudes en el período seleccionado")
+            else:
+                por_mes = resumen_cartera.consultar("mes", desde_mes)
+                por_tipo = resumen_cartera.consultar("tipo_prestamo", desde_mes)
+                por_banda = resumen_cartera.consultar("banda_monto", desde_mes)
+                segundos_tablero = time.perf_counter() - inicio_tablero
+
+                total_solicitudes = int(por_estado["solicitudes"].sum())
+                total_monto = float(por_estado["monto_total"].sum())
+                aprobadas = por_estado.loc[por_estado["estado"] == "Aprobada", "solicitudes"].sum()
+                col_t, col_m, col_p, col_a = st.columns(4)
+                col_t.metric("Solicitudes", f"{total_solicitudes:,}")
+                col_m.metric("Monto solicitado", f"RD$ {total_monto:,.0f}")
+                col_p.metric("Monto promedio", f"RD$ {total_monto / total_solicitudes:,.0f}")
+                col_a.metric("Aprobadas", f"{aprobadas / total_solicitudes:.0%}")
+
+                st.subheader("Solicitudes por mes")
+                st.line_chart(por_mes.set_index("mes")[["solicitudes"]])
+
+                col_graf1, col_graf2 = st.columns(2)
+                with col_graf1:
+                    st.subheader("Monto por tipo de préstamo")
+                    st.bar_chart(por_tipo.set_index("tipo_prestamo")[["monto_total"]])
+                with col_graf2:
+                    st.subheader("Solicitudes por estado")
+                    st.bar_chart(por_estado.set_index("estado")[["solicitudes"]])
+
+                st.subheader("Solicitudes por banda de monto")
+                # Índice categórico para que las bandas no se ordenen alfabéticamente
+                por_banda.index = pd.CategoricalIndex(por_banda["banda_monto"], categories=ORDEN_BANDAS, ordered=True)
+                st.bar_chart(por_banda[["solicitudes"]])
+
+                ultima_actualizacion = resumen_cartera.ultima_actualizacion()
+                st.caption(
+                    f"⚡ Tablero cargado en {segundos_tablero * 1000:.0f} ms"
+                    + (f" · Resumen actualizado: {pd.Timestamp(ultima_actualizacion).tz_convert(None):%d/%m/%Y %H:%M} UTC"
+                       if ultima_actualizacion is not None else "")
+                )
+        except Exception as e:
+            st.error(f"⚠️ Error al cargar el tablero: {str(e)}")
+
+# ==================== TAB 4: IMPORTACIÓN MASIVA ====================
+
+with tab4:
+    st.header("Importación Masiva de Solicitudes")
+    st.write("Sube un archivo CSV o Excel con las columnas: " + ", ".join(f"`{c}`" for c in COLUMNAS_REQUERIDAS))
+    st.caption("Opcionales: `fecha_solicitud` y `estado`. Se aplican las mismas validaciones del formulario.")
+
+    archivo = st.file_uploader("Archivo de solicitudes", type=["csv", "xlsx"])
+    solo_validar = st.checkbox("Solo validar (no cargar)")
+
+    if archivo is not None and st.button("📥 Importar"):
+        avance = st.empty()
+        rechazos_path = os.path.join(tempfile.gettempdir(), f"rechazos_{uuid.uuid4().hex}.csv")
+        try:
+            resumen = importar(
+                archivo,
+                nombre=archivo.name,
+                rechazos_path=rechazos_path,
+                cargar=not solo_validar,
+                progreso=lambda r: avance.info(f"🔄 {r['leidas']:,} filas procesadas ({r['filas_por_segundo']:,.0f} filas/s)"),
+            )
+            avance.empty()
+            col_l, col_a, col_r, col_c = st.columns(4)
+            col_l.metric("Filas leídas", f"{resumen['leidas']:,}")
+            col_a.metric("Aceptadas", f"{resumen['aceptadas']:,}")
+            col_r.metric("Rechazadas", f"{resumen['rechazadas']:,}")
+            col_c.metric("Cargadas", f"{resumen['cargadas']:,}")
+            st.success(f"✅ Importación terminada en {resumen['segundos']:.1f} s")
+
+            if resumen["rechazadas"]:
+                with open(rechazos_path, "rb") as f:
+                    st.download_button(
+                        "⬇️ Descargar reporte de rechazos",
+                        f.read(),
+                        file_name=f"rechazos_{os.path.splitext(archivo.name)[0]}.csv",
+                        mime="text/csv",
+                    )
+        except Exception as e:
+            avance.empty()
+            st.error(f"❌ Error al importar: {str(e)}")
+        finally:
+            if os.path.exists(rechazos_path):
+                os.remove(rechazos_path)
+
+# ==================== TAB 5: ADMINISTRACIÓN ====================
+
+with tab5:
+    st.header("Métricas de acceso a datos")
+    registro_metricas = get_registro()
+    if registro_metricas is None:
+        st.info("ℹ️ Las métricas están desactivadas (METRICAS_ACTIVAS=false)")
+    else:
+        metricas = pd.DataFrame(registro_metricas.resumen())
+        if metricas.empty:
+            st.info("ℹ️ Todavía no hay llamadas a BigQuery en este proceso")
         else:
-            st.info("📭 No hay solicitudes registradas aún")
+            col_ll, col_er, col_gb, col_ca = st.columns(4)
+            col_ll.metric("Llamadas", f"{metricas['llamadas'].sum():,}")
+            col_er.metric("Errores", f"{metricas['errores'].sum():,}")
+            col_gb.metric("Facturado", f"{metricas['bytes_facturados'].sum() / 1024 ** 3:.3f} GB")
+            col_ca.metric("Aciertos de caché", f"{metricas['cache_aciertos'].sum():,}")
+            metricas["mb_procesados"] = metricas.pop("bytes_procesados") / 1024 ** 2
+            metricas["mb_facturados"] = metricas.pop("bytes_facturados") / 1024 ** 2
+            st.dataframe(
+                metricas,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    columna: st.column_config.NumberColumn(format="%.1f")
+                    for columna in ("promedio_ms", "p50_ms", "p95_ms", "mb_procesados", "mb_facturados")
+                },
+            )
+            st.caption("p50 y p95 se estiman a partir del histograma de latencia")
+
+        col_desc, col_reinicio = st.columns(2)
+        with col_desc:
+            st.download_button(
+                "⬇️ Descargar métricas (Prometheus)",
+                registro_metricas.texto_prometheus(),
+                file_name="metricas.prom",
+                mime="text/plain",
+            )
+        with col_reinicio:
+            if st.button("🧹 Reiniciar métricas"):
+                registro_metricas.reiniciar()
+                st.rerun()
 
-    except Exception as e:
-        st.error(f"⚠️ Error al cargar las solicitudes: {str(e)}")
+# Al final, cuando la página ya se envió al navegador: el hilo importa el SDK de
+# BigQuery (≈1 s) y no compite con el primer render del formulario
+preparar_esquema_en_segundo_plano()
+# Los índices de cédulas y de búsqueda también se construyen en segundo plano;
+# mientras tanto los envíos no se verifican contra duplicados y la búsqueda avisa
+get_indice_cedulas().construir_en_segundo_plano()
+get_indice_busqueda().construir_en_segundo_plano()
@@ -0,0 +1,575 @@
+"""
+Escritor en segundo plano para las solicitudes de préstamo.
+
+Las filas se anotan primero en un archivo local de solo-anexar (spool) y luego
+se envían a BigQuery en lotes, agrupadas por tamaño o por ventana de tiempo.
+Si el proceso se cae o BigQuery no responde, las filas que quedaron sin
+confirmar en el spool se vuelven a enviar al reiniciar. El `id` de cada
+solicitud se usa como insertId, así que los reintentos no duplican filas.
+
+Con tráfico continuo la cola casi nunca queda vacía, así que el spool se
+reescribe (archivo temporal y os.replace) solo con las filas pendientes cada
+SOLICITUDES_SPOOL_COMPACTAR_FILAS filas confirmadas o cada
+SOLICITUDES_SPOOL_COMPACTAR_MB anexados, lo que ocurra primero.
+
+`submit` retorna de inmediato con el `id` como número de seguimiento; la
+interfaz consulta después `estado(id)` para mostrar si la solicitud sigue
+pendiente, ya quedó guardada o fue rechazada. La cola está acotada: cuando
+hay BATCH_WRITER_MAX_PENDIENTES filas sin confirmar, `submit` espera a que se
+libere espacio y, si no se libera a tiempo, lanza ColaLlena.
+
+Cuando la inserción de un lote lanza una excepción:
+
+- errores pasajeros (servicio no disponible, error interno, 429, conexión
+  caída) -> el lote se reintenta, esperando el doble cada vez hasta
+  BATCH_WRITER_RETRY_DELAY_MAX segundos;
+- lote demasiado grande (413) -> se divide en dos mitades;
+- errores permanentes (solicitud inválida, tabla inexistente, esquema que no
+  coincide) -> las filas van al archivo de rechazadas, igual que las que
+  BigQuery rechaza una por una.
+
+Mientras exista el archivo BATCH_WRITER_PAUSA_PATH el escritor no envía
+lotes: las solicitudes se siguen aceptando y quedan en el spool. Lo usa
+migrar_tabla.py para intercambiar la tabla sin inserciones en curso.
+"""
+
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from configuracion import get_configuracion
+
+_config = get_configuracion()
+SPOOL_PATH = _config.spool_path
+RECHAZADAS_PATH = _config.rechazadas_path
+COMPACTAR_FILAS = _config.spool_compactar_filas
+COMPACTAR_BYTES = int(_config.spool_compactar_mb * 1024 ** 2)
+BATCH_SIZE = _config.batch_writer_size
+BATCH_WINDOW = _config.batch_writer_window
+RETRY_DELAY = _config.batch_writer_retry_delay
+RETRY_DELAY_MAX = _config.batch_writer_retry_delay_max
+MAX_PENDIENTES = _config.batch_writer_max_pendientes
+ESPERA_COLA = _config.batch_writer_espera_cola
+PAUSA_PATH = _config.batch_writer_pausa_path
+
+# Cada cuántos segundos se revisa si la pausa terminó
+REVISION_PAUSA = 1.0
+
+# Resultados que se recuerdan para consultar el estado de un envío
+MAX_RESULTADOS = 10000
+
+# Códigos HTTP de errores pasajeros: se reintenta el mismo lote
+CODIGOS_TRANSITORIOS = {408, 429, 500, 502, 503, 504}
+# Motivos de un 403 que solo piden esperar (cuotas por segundo)
+MOTIVOS_TRANSITORIOS = {"rateLimitExceeded", "backendError"}
+# Request Entity Too Large: el lote se divide
+CODIGO_LOTE_GRANDE = 413
+
+# Qué hacer con un lote cuya inserción lanzó una excepción
+TRANSITORIO = "transitorio"
+LOTE_GRANDE = "lote_grande"
+PERMANENTE = "permanente"
+
+PENDIENTE = "pendiente"
+CONFIRMADA = "confirmada"
+RECHAZADA = "rechazada"
+DESCONOCIDA = "desconocida"
+
+# Estado de un envío: uno de los valores de arriba y un detalle para mostrar
+EstadoEnvio = namedtuple("EstadoEnvio", ["estado", "detalle"])
+
+
+class ColaLlena(Exception):
+    """
+    La cola del escritor está llena y no se liberó espacio a tiempo
+    """
+
+
+def clasificar_excepcion(e):
+    """
+    Decide si un lote que falló con una excepción se reintenta, se divide o
+    se rechaza
+
+    Las excepciones de google.api_core traen el código HTTP en `code`; las de
+    red (requests, urllib3) derivan de OSError.
+
+    Args:
+        e (Exception): Excepción lanzada por la función de inserción
+
+    Returns:
+        str: TRANSITORIO, LOTE_GRANDE o PERMANENTE
+    """
+    codigo = getattr(e, "code", None)
+    if codigo == CODIGO_LOTE_GRANDE:
+        return LOTE_GRANDE
+    if codigo in CODIGOS_TRANSITORIOS:
+        return TRANSITORIO
+    if isinstance(codigo, int) and 400 <= codigo < 500:
+        motivos = {error.get("reason") for error in getattr(e, "errors", None) or [] if isinstance(error, dict)}
+        return TRANSITORIO if motivos & MOTIVOS_TRANSITORIOS else PERMANENTE
+    if isinstance(e, sqlite3.OperationalError):
+        # SQLite: la base ocupada por otro proceso es pasajera; una columna o tabla inexistente, no
+        return TRANSITORIO if "locked" in str(e) or "busy" in str(e) else PERMANENTE
+    if isinstance(e, (ValueError, TypeError, KeyError, sqlite3.DatabaseError)):
+        return PERMANENTE
+    # Errores de red y cualquier otro desconocido: mejor reintentar que descartar
+    return TRANSITORIO
+
+
+class BatchWriter:
+    """
+    Agrupa filas en lotes y las escribe con una sola llamada de inserción.
+
+    Args:
+        insert_fn (callable): Recibe una lista de filas y retorna la lista de
+            errores por fila con el formato de `insert_rows_json`. Si lanza
+            una excepción, clasificar_excepcion decide si el lote se
+            reintenta, se divide o se rechaza.
+        spool_path (str): Archivo de solo-anexar donde se anotan las filas
+        rechazadas_path (str): Archivo donde se guardan las filas que
+            BigQuery rechazó por datos inválidos (no se reintentan)
+        batch_size (int): Máximo de filas por lote
+        window (float): Segundos que se espera para completar un lote
+        retry_delay (float): Segundos antes del primer reintento de un lote
+            fallido; se duplica en cada reintento
+        retry_delay_max (float): Máximo de segundos entre reintentos
+        on_lote_escrito (callable): Se llama con la lista de filas guardadas
+            después de cada lote exitoso
+        max_pendientes (int): Máximo de filas sin confirmar; al llegar a
+            este número `submit` espera o lanza ColaLlena
+        pausa_path (str): Mientras exista este archivo no se envían lotes
+            (None = sin pausa)
+        compactar_filas (int): Filas confirmadas tras las que se reescribe
+            el spool solo con las pendientes
+        compactar_bytes (int): Bytes anexados al spool tras los que se
+            reescribe aunque no se llegue a compactar_filas
+    """
+
+    def __init__(self, insert_fn, spool_path=SPOOL_PATH, rechazadas_path=RECHAZADAS_PATH,
+                 batch_size=BATCH_SIZE, window=BATCH_WINDOW, retry_delay=RETRY_DELAY,
+                 on_lote_escrito=None, max_pendientes=MAX_PENDIENTES, pausa_path=PAUSA_PATH,
+                 retry_delay_max=RETRY_DELAY_MAX, compactar_filas=COMPACTAR_FILAS,
+                 compactar_bytes=COMPACTAR_BYTES):
+        self._insert_fn = insert_fn
+        self._on_lote_escrito = on_lote_escrito
+        self._spool_path = spool_path
+        self._rechazadas_path = rechazadas_path
+        self._batch_size = batch_size
+        self._window = window
+        self._retry_delay = retry_delay
+        self._retry_delay_max = retry_delay_max
+        self._max_pendientes = max_pendientes
+        self._pausa_path = pausa_path
+        self._compactar_filas = compactar_filas
+        self._compactar_bytes = compactar_bytes
+        self._confirmadas_sin_compactar = 0
+        self._bytes_tras_compactar = 0
+
+        self._cola = queue.Queue()
+        self._spool_lock = threading.Lock()
+        self._pendientes = {}
+        self._en_vuelo = 0
+        self._vacio = threading.Condition()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._espacio = threading.Condition(self._spool_lock)
+        self._resultados = OrderedDict()
+        self._ultimo_error = None
+
+        self._stats = {
+            "filas_recibidas": 0,
+            "filas_escritas": 0,
+            "filas_rechazadas": 0,
+            "filas_recuperadas": 0,
+            "lotes_escritos": 0,
+            "errores": 0,
+            "lotes_divididos": 0,
+            "compactaciones_spool": 0,
+            "envios_rechazados_cola_llena": 0,
+            "latencia_ultimo_lote": 0.0,
+            "latencia_total": 0.0,
+            "latencia_max": 0.0,
+        }
+
+    # ---------- API pública ----------
+
+    def start(self):
+        """
+        Reenvía lo que quedó pendiente en el spool e inicia el hilo escritor
+        """
+        if self._hilo is not None:
+            return
+        for fila in self._leer_pendientes_del_spool():
+            self._pendientes[fila["id"]] = fila
+            self._stats["filas_recuperadas"] += 1
+            self._encolar(fila)
+        if self._stats["filas_recuperadas"]:
+            print(f"♻️ Reenviando {self._stats['filas_recuperadas']} solicitudes pendientes del spool")
+
+        self._hilo = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._hilo.start()
+
+    def submit(self, fila, timeout=ESPERA_COLA):
+        """
+        Anota la fila en el spool y la deja en cola para el próximo lote
+
+        Args:
+            fila (dict): Solicitud con un campo `id` único
+            timeout (float): Segundos que se espera si la cola está llena
+
+        Returns:
+            str: El `id` de la fila, que también se usa como insertId y
+                como número de seguimiento para `estado`
+
+        Raises:
+            ColaLlena: Si la cola siguió llena durante `timeout` segundos
+        """
+        if self._detener.is_set():
+            raise RuntimeError("El escritor de lotes ya fue cerrado")
+
+        with self._espacio:
+            if not self._espacio.wait_for(lambda: len(self._pendientes) < self._max_pendientes, timeout):
+                self._stats["envios_rechazados_cola_llena"] += 1
+                raise ColaLlena(f"Hay {len(self._pendientes)} solicitudes esperando ser guardadas")
+            self._anexar_al_spool({"tipo": "fila", "fila": fila})
+            self._pendientes[fila["id"]] = fila
+        self._stats["filas_recibidas"] += 1
+        self._encolar(fila)
+        return fila["id"]
+
+    def estado(self, id_):
+        """
+        Consulta en qué va el envío de una fila
+
+        Args:
+            id_ (str): Número de seguimiento que retornó `submit`
+
+        Returns:
+            EstadoEnvio: pendiente, confirmada, rechazada, o desconocida si
+                el id no pasó por este escritor (o es muy antiguo)
+        """
+        with self._spool_lock:
+            if id_ in self._pendientes:
+                detalle = f"Reintentando: {self._ultimo_error}" if self._ultimo_error else "En cola"
+                return EstadoEnvio(PENDIENTE, detalle)
+            return self._resultados.get(id_, EstadoEnvio(DESCONOCIDA, None))
+
+    def flush(self, timeout=None):
+        """
+        Espera a que todas las filas en cola hayan sido escritas
+
+        Returns:
+            bool: True si la cola quedó vacía antes del timeout
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._vacio:
+            while self._en_vuelo:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._vacio.wait(restante)
+        return True
+
+    def close(self, timeout=30.0):
+        """
+        Vacía la cola y detiene el hilo escritor. Lo que no se alcance a
+        escribir queda en el spool para el próximo arranque.
+        """
+        if self._hilo is None:
+            return
+        self.flush(timeout)
+        self._detener.set()
+        self._hilo.join(timeout)
+        self._hilo = None
+
+    def metrics(self):
+        """
+        Retorna métricas de la cola y de la latencia de los lotes
+
+        Returns:
+            dict: Profundidad de cola, filas pendientes y contadores de lotes
+        """
+        stats = dict(self._stats)
+        latencia_total = stats.pop("latencia_total")
+        stats["latencia_promedio"] = latencia_total / stats["lotes_escritos"] if stats["lotes_escritos"] else 0.0
+        stats["profundidad_cola"] = self._cola.qsize()
+        stats["pendientes"] = len(self._pendientes)
+        return stats
+
+    # ---------- Hilo escritor ----------
+
+    def _encolar(self, fila):
+        with self._vacio:
+            self._en_vuelo += 1
+        self._cola.put(fila)
+
+    def _run(self):
+        while not self._detener.is_set():
+            lote = self._recolectar_lote()
+            if lote:
+                self._escribir(lote)
+
+    def _recolectar_lote(self):
+        try:
+            lote = [self._cola.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+
+        limite = time.monotonic() + self._window
+        while len(lote) < self._batch_size:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self, lote):
+        # Un 413 parte el lote; las partes se envían en orden
+        partes = [lote]
+        intentos = 0
+        while partes:
+            lote = partes[0]
+            if self._pausa_path and os.path.exists(self._pausa_path):
+                self._ultimo_error = "Escritura en pausa por mantenimiento de la tabla"
+                if self._detener.wait(REVISION_PAUSA):
+                    return
+                continue
+            inicio = time.monotonic()
+            try:
+                errores = self._insert_fn(lote) or []
+            except Exception as e:
+                self._stats["errores"] += 1
+                self._ultimo_error = f"{type(e).__name__}: {e}"
+                tipo = clasificar_excepcion(e)
+                if tipo == LOTE_GRANDE and len(lote) > 1:
+                    print(f"⚠️ Lote de {len(lote)} solicitudes demasiado grande, se divide en dos")
+                    self._stats["lotes_divididos"] += 1
+                    partes[0:1] = [lote[:len(lote) // 2], lote[len(lote) // 2:]]
+                    continue
+                if tipo == TRANSITORIO:
+                    espera = min(self._retry_delay * 2 ** intentos, self._retry_delay_max)
+                    intentos += 1
+                    print(f"❌ Error al escribir lote de {len(lote)} solicitudes: {e}. Reintento en {espera:.1f} s")
+                    if self._detener.wait(espera):
+                        return
+                    continue
+                # Reintentar no lo arreglaría: las filas quedan en el archivo de rechazadas
+                print(f"❌ Error permanente al escribir lote de {len(lote)} solicitudes: {e}")
+                error = [{"reason": type(e).__name__, "message": str(e)}]
+                self._rechazar([(fila, error) for fila in lote])
+                self._marcar_terminadas(len(lote))
+                partes.pop(0)
+                continue
+
+            intentos = 0
+            latencia = time.monotonic() - inicio
+            self._ultimo_error = None
+            self._stats["lotes_escritos"] += 1
+            self._stats["latencia_ultimo_lote"] = latencia
+            self._stats["latencia_total"] += latencia
+            self._stats["latencia_max"] = max(self._stats["latencia_max"], latencia)
+
+            reintentar, rechazadas = self._clasificar_errores(lote, errores)
+            confirmadas = [f for i, f in enumerate(lote) if i not in reintentar and i not in rechazadas]
+            if rechazadas:
+                print(f"❌ BigQuery rechazó {len(rechazadas)} solicitudes: {errores}")
+                self._rechazar([(lote[i], rechazadas[i]) for i in rechazadas])
+            self._stats["filas_escritas"] += len(confirmadas)
+            self._confirmar([f["id"] for f in confirmadas])
+            if confirmadas and self._on_lote_escrito:
+                try:
+                    self._on_lote_escrito(confirmadas)
+                except Exception as e:
+                    print(f"⚠️ Error en on_lote_escrito: {e}")
+            self._marcar_terminadas(len(lote) - len(reintentar))
+
+            resto = [lote[i] for i in sorted(reintentar)]
+            partes[0:1] = [resto] if resto else []
+
+    def _rechazar(self, filas_con_errores):
+        """
+        Guarda las filas en el archivo de rechazadas y las marca como
+        terminadas en el spool (no se vuelven a enviar)
+        """
+        self._stats["filas_rechazadas"] += len(filas_con_errores)
+        self._guardar_rechazadas(filas_con_errores)
+        self._confirmar(
+            [fila["id"] for fila, _ in filas_con_errores],
+            {fila["id"]: self._motivo_rechazo(errores) for fila, errores in filas_con_errores},
+        )
+
+    @staticmethod
+    def _clasificar_errores(lote, errores):
+        """
+        Separa las filas que BigQuery detuvo por culpa de otra fila del lote
+        (se reintentan) de las que tienen datos inválidos (se descartan)
+        """
+        reintentar, rechazadas = set(), {}
+        for error in errores:
+            indice = error.get("index")
+            if indice is None or indice >= len(lote):
+                continue
+            motivos = {e.get("reason") for e in error.get("errors", [])}
+            if motivos <= {"stopped"}:
+                reintentar.add(indice)
+            else:
+                rechazadas[indice] = error.get("errors", [])
+        return reintentar, rechazadas
+
+    @staticmethod
+    def _motivo_rechazo(errores):
+        return "; ".join(e.get("message") or e.get("reason") or "inválida" for e in errores) or "inválida"
+
+    def _marcar_terminadas(self, cantidad):
+        with self._vacio:
+            self._en_vuelo -= cantidad
+            if self._en_vuelo <= 0:
+                self._vacio.notify_all()
+
+    # ---------- Spool ----------
+
+    def _anexar_al_spool(self, registro):
+        # Se llama con _spool_lock tomado
+        linea = json.dumps(registro, default=str, ensure_ascii=False) + "\n"
+        os.makedirs(os.path.dirname(self._spool_path) or ".", exist_ok=True)
+        with open(self._spool_path, "a", encoding="utf-8") as f:
+            f.write(linea)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _confirmar(self, ids, rechazos=None):
+        if not ids:
+            return
+        rechazos = rechazos or {}
+        with self._spool_lock:
+            self._anexar_al_spool({"tipo": "confirmado", "ids": ids})
+            for id_ in ids:
+                self._pendientes.pop(id_, None)
+                self._resultados[id_] = (
+                    EstadoEnvio(RECHAZADA, rechazos[id_]) if id_ in rechazos
+                    else EstadoEnvio(CONFIRMADA, None)
+                )
+            while len(self._resultados) > MAX_RESULTADOS:
+                self._resultados.popitem(last=False)
+            self._confirmadas_sin_compactar += len(ids)
+            if (
+                not self._pendientes
+                or self._confirmadas_sin_compactar >= self._compactar_filas
+                or os.path.getsize(self._spool_path) - self._bytes_tras_compactar >= self._compactar_bytes
+            ):
+                self._compactar_spool()
+            self._espacio.notify_all()
+
+    def _compactar_spool(self):
+        # Se llama con _spool_lock tomado. Si el proceso cae a mitad, queda el spool anterior completo
+        temporal = self._spool_path + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            for fila in self._pendientes.values():
+                f.write(json.dumps({"tipo": "fila", "fila": fila}, default=str, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self._spool_path)
+        self._confirmadas_sin_compactar = 0
+        self._bytes_tras_compactar = os.path.getsize(self._spool_path)
+        self._stats["compactaciones_spool"] += 1
+
+    def _guardar_rechazadas(self, filas_con_errores):
+        os.makedirs(os.path.dirname(self._rechazadas_path) or ".", exist_ok=True)
+        with open(self._rechazadas_path, "a", encoding="utf-8") as f:
+            for fila, errores in filas_con_errores:
+                f.write(json.dumps({"fila": fila, "errores": errores}, default=str, ensure_ascii=False) + "\n")
+
+    def _leer_pendientes_del_spool(self):
+        if not os.path.exists(self._spool_path):
+            return []
+        filas = {}
+        with open(self._spool_path, encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    # Una línea cortada por una caída a mitad de escritura
+                    continue
+                if registro.get("tipo") == "fila":
+                    filas[registro["fila"]["id"]] = registro["fila"]
+                elif registro.get("tipo") == "confirmado":
+                    for id_ in registro["ids"]:
+                        filas.pop(id_, None)
+        return list(filas.values())
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    Retorna el escritor de lotes del proceso, iniciándolo la primera vez
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            from storage import insertar_lote_solicitudes
+            from query_cache import get_query_cache
+            # Las consultas guardadas dejan de ser válidas en cuanto se escribe un lote
+            _writer = BatchWriter(
+                insertar_lote_solicitudes,
+                on_lote_escrito=lambda filas: get_query_cache().invalidate(),
+            )
+            _writer.start()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def encolar_solicitud(solicitud_data, timeout=ESPERA_COLA):
+    """
+    Registra una solicitud para escritura en lote, sin esperar a que se escriba
+
+    Args:
+        solicitud_data (dict): Diccionario con los datos de la solicitud
+        timeout (float): Segundos que se espera si la cola está llena
+
+    Returns:
+        str: Número de seguimiento (el `id`) si la solicitud quedó guardada
+            en el spool, None si hubo error
+
+    Raises:
+        ColaLlena: Si el escritor está saturado; conviene reintentar en unos segundos
+    """
+    try:
+        id_ = get_writer().submit(solicitud_data, timeout)
+    except ColaLlena:
+        raise
+    except Exception as e:
+        print(f"❌ Error al registrar la solicitud: {e}")
+        return None
+
+    # Los índices de duplicados y de búsqueda la ven antes de que llegue a la tabla
+    try:
+        from indice_cedulas import get_indice_cedulas
+        get_indice_cedulas().registrar(solicitud_data)
+    except Exception as e:
+        print(f"⚠️ No se pudo registrar la solicitud en el índice de cédulas: {e}")
+    try:
+        from busqueda_solicitudes import get_indice_busqueda
+        get_indice_busqueda().registrar(solicitud_data)
+    except Exception as e:
+        print(f"⚠️ No se pudo registrar la solicitud en el índice de búsqueda: {e}")
+    return id_
+
+
+def estado_envio(id_):
+    """
+    Consulta el estado de una solicitud enviada con encolar_solicitud
+
+    Returns:
+        EstadoEnvio: pendiente, confirmada, rechazada o desconocida
+    """
+    return get_writer().estado(id_)
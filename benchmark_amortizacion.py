@@ -0,0 +1,129 @@
+"""
+Compara amortizacion.py contra un cálculo ingenuo préstamo por préstamo.
+
+El camino ingenuo es el que se escribiría sin NumPy: un ciclo por préstamo y
+otro por mes, acumulando la tabla en listas. Se mide tanto el cálculo de las
+tablas completas como el de solo la cuota y el total de intereses (lo que usa
+la columna del listado). Ambos caminos deben dar los mismos totales; el script
+lo verifica antes de reportar los tiempos.
+
+Uso:
+    python benchmark_amortizacion.py
+    python benchmark_amortizacion.py --prestamos 50000 --metodo aleman
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+from amortizacion import TASAS_ANUALES, METODOS, calendarios, resumen_cuotas, tasas_mensuales
+from schema import TIPOS_PRESTAMO, PLAZO_MIN, PLAZO_MAX, PLAZO_PASO
+
+
+def calendario_ingenuo(monto, plazo, tasa, metodo):
+    """
+    Tabla de amortización de un solo préstamo con ciclos de Python
+
+    Returns:
+        list: Tuplas (cuota, interes, capital, saldo) por mes
+    """
+    saldo = monto
+    filas = []
+    if metodo == "frances":
+        cuota = monto * tasa / (1 - (1 + tasa) ** -plazo) if tasa else monto / plazo
+        for _ in range(plazo):
+            interes = saldo * tasa
+            capital = cuota - interes
+            saldo -= capital
+            filas.append((cuota, interes, capital, saldo))
+    else:
+        capital = monto / plazo
+        for _ in range(plazo):
+            interes = saldo * tasa
+            saldo -= capital
+            filas.append((capital + interes, interes, capital, saldo))
+    return filas
+
+
+def _cartera(cantidad, semilla=0):
+    azar = random.Random(semilla)
+    tipos = [azar.choice(TIPOS_PRESTAMO) for _ in range(cantidad)]
+    montos = [float(azar.randrange(1, 500) * 1000) for _ in range(cantidad)]
+    plazos = [azar.choice(range(PLAZO_MIN, PLAZO_MAX + 1, PLAZO_PASO)) for _ in range(cantidad)]
+    return tipos, montos, plazos
+
+
+def _tiempo(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return time.perf_counter() - inicio, resultado
+
+
+def medir(prestamos=10_000, metodo="frances"):
+    """
+    Calcula las tablas de toda la cartera por ambos caminos
+
+    Args:
+        prestamos (int): Préstamos sintéticos
+        metodo (str): frances o aleman
+
+    Returns:
+        dict: Segundos y préstamos por segundo de cada camino, y la aceleración
+    """
+    tipos, montos, plazos = _cartera(prestamos)
+
+    def ingenuo():
+        return [calendario_ingenuo(m, p, TASAS_ANUALES[t] / 12, metodo) for t, m, p in zip(tipos, montos, plazos)]
+
+    def vectorizado():
+        tasas = tasas_mensuales(tipos)
+        return calendarios(montos, plazos, tasas, metodo), resumen_cuotas(montos, plazos, tasas, metodo)
+
+    def cuotas_ingenuo():
+        return [sum(fila[1] for fila in calendario_ingenuo(m, p, TASAS_ANUALES[t] / 12, metodo))
+                for t, m, p in zip(tipos, montos, plazos)]
+
+    def cuotas_vectorizado():
+        return resumen_cuotas(montos, plazos, tasas_mensuales(tipos), metodo)
+
+    segundos_ingenuo, tablas = _tiempo(ingenuo)
+    segundos_vectorizado, (matrices, resumen) = _tiempo(vectorizado)
+    segundos_cuotas_ingenuo, _ = _tiempo(cuotas_ingenuo)
+    segundos_cuotas_vectorizado, _ = _tiempo(cuotas_vectorizado)
+
+    intereses_ingenuo = np.array([sum(fila[1] for fila in tabla) for tabla in tablas])
+    if not (np.allclose(intereses_ingenuo, matrices["interes"].sum(axis=1))
+            and np.allclose(intereses_ingenuo, resumen["total_intereses"])):
+        raise AssertionError("Los intereses del cálculo vectorizado no coinciden con el ingenuo")
+
+    return {
+        "prestamos": prestamos,
+        "metodo": metodo,
+        "ingenuo_segundos": segundos_ingenuo,
+        "vectorizado_segundos": segundos_vectorizado,
+        "ingenuo_prestamos_por_segundo": prestamos / segundos_ingenuo,
+        "vectorizado_prestamos_por_segundo": prestamos / segundos_vectorizado,
+        "aceleracion": segundos_ingenuo / segundos_vectorizado,
+        "cuotas_ingenuo_segundos": segundos_cuotas_ingenuo,
+        "cuotas_vectorizado_segundos": segundos_cuotas_vectorizado,
+        "cuotas_aceleracion": segundos_cuotas_ingenuo / segundos_cuotas_vectorizado,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de amortizacion.py")
+    parser.add_argument("--prestamos", type=int, default=10_000)
+    parser.add_argument("--metodo", choices=METODOS, default="frances")
+    args = parser.parse_args()
+
+    resultado = medir(args.prestamos, args.metodo)
+    print(f"📊 {resultado['prestamos']:,} préstamos, método {resultado['metodo']} (tablas completas)")
+    print(f"   Ciclo por préstamo: {resultado['ingenuo_segundos']:>8.3f} s "
+          f"({resultado['ingenuo_prestamos_por_segundo']:>10,.0f} préstamos/s)")
+    print(f"   Vectorizado:        {resultado['vectorizado_segundos']:>8.3f} s "
+          f"({resultado['vectorizado_prestamos_por_segundo']:>10,.0f} préstamos/s)")
+    print(f"   Aceleración: {resultado['aceleracion']:.1f}x")
+    print("📊 Solo cuota y total de intereses")
+    print(f"   Ciclo por préstamo: {resultado['cuotas_ingenuo_segundos']:>8.3f} s")
+    print(f"   Vectorizado:        {resultado['cuotas_vectorizado_segundos']:>8.3f} s")
+    print(f"   Aceleración: {resultado['cuotas_aceleracion']:.1f}x")
@@ -0,0 +1,183 @@
+"""
+Mide el arranque en frío de la aplicación y detecta regresiones.
+
+Cada medición corre en un proceso nuevo, sin nada importado de antes:
+
+- importacion: importar los módulos que usa app.py (Streamlit, pandas y los
+  módulos de datos), como en el primer render.
+- primer_render: ejecutar app.py completo con AppTest, desde que arranca el
+  proceso hasta que el formulario queda dibujado.
+
+También se verifica que el SDK de BigQuery no se importe antes de dibujar el
+formulario: solo lo puede importar el hilo que prepara el esquema, que se
+lanza al final del script. Si algún paso lo importa antes, es un error.
+
+Con --guardar se escriben los resultados en un JSON; con --base se comparan
+contra uno anterior y el script termina con código 1 si algún tiempo empeora
+más que la tolerancia.
+
+Uso:
+    python benchmark_arranque.py
+    python benchmark_arranque.py --guardar arranque.json
+    python benchmark_arranque.py --base arranque.json --tolerancia 0.2
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+MODULO_SDK = "google.cloud.bigquery"
+HILO_ESQUEMA = "preparar-esquema"
+# La app también escribe en stdout; el resultado va en la línea con esta marca
+MARCA = "RESULTADO_ARRANQUE "
+
+# Se instala antes de cualquier import: anota el hilo que importa el SDK por primera vez
+_VIGIA_SDK = f"""
+import sys, threading, time
+_inicio = time.perf_counter()
+_sdk = {{}}
+
+class _Vigia:
+    def find_spec(self, nombre, path=None, target=None):
+        if nombre == {MODULO_SDK!r} and not _sdk:
+            _sdk["hilo"] = threading.current_thread().name
+            _sdk["segundos"] = time.perf_counter() - _inicio
+        return None
+
+sys.meta_path.insert(0, _Vigia())
+sys.path.insert(0, {DIRECTORIO!r})
+_MARCA = {MARCA!r}
+"""
+
+_IMPORTACION = _VIGIA_SDK + """
+import json
+import streamlit, pandas
+import storage, batch_writer, consultas, query_cache, importar_solicitudes, exportar_solicitudes, validacion
+import indice_cedulas, busqueda_solicitudes, resumen_cartera, estados, amortizacion, schema
+print(_MARCA + json.dumps({"segundos": time.perf_counter() - _inicio, "sdk": _sdk}))
+"""
+
+_PRIMER_RENDER = _VIGIA_SDK + """
+import json
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+app.run()
+segundos = time.perf_counter() - _inicio
+print(_MARCA + json.dumps({
+    "segundos": segundos,
+    "sdk": _sdk,
+    "errores": [str(e.value) for e in app.exception],
+    "formulario": len(app.text_input) > 0,
+}))
+"""
+
+
+def _ejecutar(codigo, directorio, backend, *argumentos):
+    entorno = dict(os.environ, STORAGE_BACKEND=backend, NO_GCE_CHECK="True")
+    if backend == "sqlite":
+        entorno["SQLITE_PATH"] = os.path.join(directorio, "solicitudes.db")
+    proceso = subprocess.run(
+        [sys.executable, "-c", codigo, *argumentos], cwd=directorio, env=entorno,
+        capture_output=True, text=True, timeout=300,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"El proceso de medición falló:\n{proceso.stderr[-2000:]}")
+    linea = next(linea for linea in proceso.stdout.splitlines() if linea.startswith(MARCA))
+    return json.loads(linea[len(MARCA):])
+
+
+def _sdk_antes_de_tiempo(sdk):
+    return bool(sdk) and sdk["hilo"] != HILO_ESQUEMA
+
+
+def medir(repeticiones=3, backend="bigquery"):
+    """
+    Mide la importación y el primer render, cada uno en procesos nuevos
+
+    Args:
+        repeticiones (int): Procesos por medición; se reporta la mediana
+        backend (str): STORAGE_BACKEND con el que se ejecuta la app
+
+    Returns:
+        dict: Segundos (mediana) de cada medición y los problemas encontrados
+    """
+    importacion, primer_render, problemas = [], [], []
+    # Directorio vacío: el spool, la caché y la base local no afectan la medición
+    with tempfile.TemporaryDirectory() as directorio:
+        for _ in range(repeticiones):
+            resultado = _ejecutar(_IMPORTACION, directorio, backend)
+            importacion.append(resultado["segundos"])
+            if _sdk_antes_de_tiempo(resultado["sdk"]):
+                problemas.append(f"Importar los módulos de app.py carga {MODULO_SDK}")
+
+            resultado = _ejecutar(_PRIMER_RENDER, directorio, backend, os.path.join(DIRECTORIO, "app.py"))
+            primer_render.append(resultado["segundos"])
+            if _sdk_antes_de_tiempo(resultado["sdk"]):
+                problemas.append(f"El primer render carga {MODULO_SDK} (hilo {resultado['sdk']['hilo']})")
+            if resultado["errores"] or not resultado["formulario"]:
+                problemas.append(f"El primer render falló: {resultado['errores'] or 'no se dibujó el formulario'}")
+
+    return {
+        "backend": backend,
+        "repeticiones": repeticiones,
+        "importacion_segundos": statistics.median(importacion),
+        "primer_render_segundos": statistics.median(primer_render),
+        "problemas": sorted(set(problemas)),
+    }
+
+
+def comparar(resultado, base, tolerancia=0.2):
+    """
+    Compara una medición contra otra guardada
+
+    Args:
+        resultado (dict): Medición actual
+        base (dict): Medición de referencia
+        tolerancia (float): Empeoramiento relativo permitido
+
+    Returns:
+        list: Regresiones encontradas (vacía si no hay)
+    """
+    regresiones = []
+    for clave in ("importacion_segundos", "primer_render_segundos"):
+        if clave in base and resultado[clave] > base[clave] * (1 + tolerancia):
+            regresiones.append(
+                f"{clave}: {resultado[clave]:.2f} s contra {base[clave]:.2f} s "
+                f"(+{resultado[clave] / base[clave] - 1:.0%}, tolerancia {tolerancia:.0%})"
+            )
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frío de app.py")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--backend", choices=("bigquery", "sqlite"), default="bigquery")
+    parser.add_argument("--guardar", help="JSON donde guardar la medición")
+    parser.add_argument("--base", help="JSON de una medición anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    resultado = medir(args.repeticiones, args.backend)
+    print(f"🚀 Arranque en frío (backend {resultado['backend']}, mediana de {resultado['repeticiones']})")
+    print(f"   Importación: {resultado['importacion_segundos']:>6.2f} s")
+    print(f"   Primer render: {resultado['primer_render_segundos']:>4.2f} s")
+
+    fallas = list(resultado["problemas"])
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            fallas += comparar(resultado, json.load(f), args.tolerancia)
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+        print(f"💾 Resultados guardados en {args.guardar}")
+
+    for falla in fallas:
+        print(f"❌ {falla}")
+    if fallas:
+        sys.exit(1)
+    print("✅ Sin regresiones")
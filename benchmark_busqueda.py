@@ -0,0 +1,118 @@
+"""
+Mide cuánto tarda una búsqueda por texto con el índice local y con LIKE.
+
+- LIKE: `LIKE '%...%'` sobre nombre, ocupación y propósito en una tabla
+  SQLite con las mismas filas, el equivalente local del recorrido completo
+  que haría BigQuery (que además factura las tres columnas en cada búsqueda).
+- Índice: busqueda_solicitudes.IndiceBusqueda (FTS5, ordenado por BM25).
+
+Las solicitudes son sintéticas, con nombres, ocupaciones y propósitos
+variados para que cada búsqueda encuentre una parte pequeña de la tabla.
+
+Uso:
+    python benchmark_busqueda.py
+    python benchmark_busqueda.py --filas 1000000 --repeticiones 5
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+import pandas as pd
+from fake_bigquery import generar_solicitudes, OCUPACIONES
+from busqueda_solicitudes import IndiceBusqueda, COLUMNAS_INDICE
+
+BUSQUEDAS = ["rosa", "pena", "tractor", "maria comerciante", "colmado", "ingeniero techo"]
+
+_NOMBRES = ["María", "José", "Rosa", "Pedro", "Ana", "Luis", "Carmen", "Rafael", "Altagracia", "Ramón"]
+_APELLIDOS = ["Peña", "Rodríguez", "Martínez", "García", "Núñez", "Gómez", "Pérez", "Santos", "Reyes", "Díaz"]
+_PROPOSITOS = [
+    "Compra de un tractor para la finca", "Reparación del techo de la casa", "Surtir el colmado",
+    "Pago de la universidad de mis hijos", "Compra de un motor para el negocio", "Consolidar deudas",
+    "Ampliación del local comercial", "Gastos médicos de la familia",
+]
+
+
+def _datos(filas, semilla=0):
+    azar = random.Random(semilla)
+    df = pd.DataFrame(generar_solicitudes(filas, semilla=semilla))[COLUMNAS_INDICE]
+    df["nombre"] = [f"{azar.choice(_NOMBRES)} {azar.choice(_APELLIDOS)} {azar.choice(_APELLIDOS)}"
+                    for _ in range(filas)]
+    df["ocupacion"] = [azar.choice(OCUPACIONES) for _ in range(filas)]
+    df["proposito"] = [f"{azar.choice(_PROPOSITOS)} ({i})" for i in range(filas)]
+    return df
+
+
+def _mejor_tiempo(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def _buscar_like(path, texto, limite):
+    condiciones = " AND ".join(
+        "(nombre LIKE ? OR ocupacion LIKE ? OR proposito LIKE ?)" for _ in texto.split()
+    )
+    valores = [f"%{palabra}%" for palabra in texto.split() for _ in range(3)]
+    with closing(sqlite3.connect(path)) as conn:
+        return conn.execute(
+            f"SELECT id FROM solicitudes WHERE {condiciones} ORDER BY fecha_solicitud DESC LIMIT ?",
+            (*valores, limite),
+        ).fetchall()
+
+
+def medir(filas=200_000, repeticiones=3, limite=50, semilla=0):
+    """
+    Busca los mismos textos con LIKE y con el índice
+
+    Returns:
+        dict: Segundos de construcción del índice y, por búsqueda, ms de cada
+            forma y resultados del índice
+    """
+    df = _datos(filas, semilla)
+    resultado = {"filas": filas, "busquedas": {}}
+    with tempfile.TemporaryDirectory() as directorio:
+        tabla_path = os.path.join(directorio, "tabla.db")
+        with closing(sqlite3.connect(tabla_path)) as conn:
+            df.astype({"fecha_solicitud": str}).to_sql("solicitudes", conn, index=False)
+
+        bloques = lambda: (df.iloc[i:i + 50_000] for i in range(0, len(df), 50_000))
+        indice = IndiceBusqueda(
+            path=os.path.join(directorio, "indice.db"), iterar_fn=bloques,
+            desde_fn=lambda desde: df.iloc[:0], sync_segundos=float("inf"),
+        )
+        inicio = time.perf_counter()
+        indice.reconstruir()
+        resultado["construccion_segundos"] = time.perf_counter() - inicio
+        resultado["indice_mb"] = os.path.getsize(os.path.join(directorio, "indice.db")) / 1024 ** 2
+
+        for texto in BUSQUEDAS:
+            segundos_like, _ = _mejor_tiempo(lambda: _buscar_like(tabla_path, texto, limite), repeticiones)
+            segundos_indice, encontradas = _mejor_tiempo(lambda: indice.buscar(texto, limite), repeticiones)
+            resultado["busquedas"][texto] = {
+                "like_ms": segundos_like * 1000,
+                "indice_ms": segundos_indice * 1000,
+                "resultados": len(encontradas),
+            }
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda por texto: índice local contra LIKE")
+    parser.add_argument("--filas", type=int, default=200_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--limite", type=int, default=50)
+    args = parser.parse_args()
+
+    resultado = medir(args.filas, args.repeticiones, args.limite)
+    print(f"🔎 {resultado['filas']:,} solicitudes · índice construido en {resultado['construccion_segundos']:.1f} s "
+          f"({resultado['indice_mb']:.0f} MB)")
+    for texto, medido in resultado["busquedas"].items():
+        print(f"   {texto!r:<22} LIKE {medido['like_ms']:>8.1f} ms · índice {medido['indice_ms']:>6.1f} ms "
+              f"· {medido['resultados']} resultados")
@@ -0,0 +1,545 @@
+"""
+Prueba de carga sin conexión: varios cajeros simultáneos enviando y
+consultando solicitudes contra un BigQuery falso.
+
+El cliente de fake_bigquery reemplaza a BigQuery con la latencia, la tasa de
+errores y el volumen de filas que se pidan. Hay dos escenarios:
+
+- directo: cada usuario llama a las mismas funciones que app.py en el mismo
+  orden (validar, buscar duplicados y encolar para un envío; consulta por la
+  caché y columnas de cuota para el listado).
+- apptest: cada usuario es una sesión de Streamlit (AppTest) que llena el
+  formulario, lo envía y abre o filtra el listado, como en el navegador.
+  AppTest no se puede usar desde varios hilos de un proceso, así que cada
+  usuario corre en su propio proceso, con su propio BigQuery falso (con las
+  mismas filas iniciales), spool y caché.
+
+Por cada escenario se reportan el throughput, la latencia p50/p95/p99 por tipo
+de operación, los errores de la app, el tiempo hasta que el escritor de lotes
+confirma todo lo enviado y el pico de memoria (RSS); en apptest, el del
+proceso de usuario más grande. Las operaciones que la prueba no pudo hacer
+(por ejemplo, un widget que no apareció) se reportan aparte como fallos de la
+prueba, no como errores de la app. El resultado es un JSON; con --base se
+compara contra uno anterior y el script termina con código 1 si el
+throughput baja o el p95 sube más que la tolerancia.
+
+El spool, la caché local y las demás rutas van a un directorio temporal.
+
+Uso:
+    python benchmark_carga.py
+    python benchmark_carga.py --usuarios 20 --operaciones 50 --latencia 0.2 --tasa-error 0.01 --filas 100000
+    python benchmark_carga.py --escenario apptest --usuarios 5 --salida carga.json
+    python benchmark_carga.py --base carga.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+ESCENARIOS = ("directo", "apptest")
+PROYECTO, DATASET = "proyecto-falso", "carga"
+# Segundos que se espera a que los procesos de apptest terminen de prepararse
+ESPERA_PROCESOS = 600
+
+
+class FalloDeLaPrueba(Exception):
+    """
+    La prueba no pudo hacer la operación (no es un error de la app)
+    """
+
+
+def _preparar_entorno(directorio):
+    """
+    Apunta la configuración al BigQuery falso y a rutas temporales. Tiene que
+    correr antes de importar cualquier módulo de la app, que leen la
+    configuración al importarse.
+    """
+    os.environ.update(
+        STORAGE_BACKEND="bigquery",
+        GCP_PROJECT_ID=PROYECTO,
+        BIGQUERY_DATASET=DATASET,
+        SOLICITUDES_SPOOL_PATH=os.path.join(directorio, "spool", "solicitudes.jsonl"),
+        SOLICITUDES_RECHAZADAS_PATH=os.path.join(directorio, "spool", "rechazadas.jsonl"),
+        SOLICITUDES_CACHE_DIR=os.path.join(directorio, "cache"),
+        METRICAS_ARCHIVO="",
+        METRICAS_PUERTO="0",
+    )
+    sys.path.insert(0, DIRECTORIO)
+
+
+def _preparar_datos(filas, latencia, tasa_error, semilla):
+    """
+    Crea el cliente falso, las tablas y las filas iniciales, y después le
+    activa la latencia y los errores
+    """
+    import gcp_config
+    from fake_bigquery import FakeBigQueryClient, generar_solicitudes
+    from schema import TABLE_ID
+    from storage import preparar_esquema
+
+    client = FakeBigQueryClient(project=PROYECTO, semilla=semilla)
+    gcp_config.configurar_cliente(lambda: client)
+    preparar_esquema()
+    for inicio in range(0, filas, 10_000):
+        client.insert_rows_json(
+            f"{PROYECTO}.{DATASET}.{TABLE_ID}",
+            generar_solicitudes(min(10_000, filas - inicio), semilla=semilla + inicio),
+        )
+    client.latencia, client.tasa_error = latencia, tasa_error
+    return client
+
+
+class _MemoriaPico:
+    """
+    Pico de RSS del proceso mientras dura el bloque, muestreado cada 10 ms de
+    /proc (en otros sistemas, el pico de toda la vida del proceso)
+    """
+
+    def __init__(self):
+        self.pico = self.inicial = self._rss()
+        self._detener = threading.Event()
+
+    @staticmethod
+    def _rss():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            escala = 1 if sys.platform == "darwin" else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * escala
+
+    def _muestrear(self):
+        while not self._detener.wait(0.01):
+            self.pico = max(self.pico, self._rss())
+
+    def __enter__(self):
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+        self.pico = max(self.pico, self._rss())
+
+
+def _percentil(ordenadas, q):
+    return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))]
+
+
+def _resumir(mediciones, segundos):
+    """
+    Agrupa (tipo, segundos, error) por tipo de operación
+
+    Returns:
+        dict: Por tipo, cantidad, errores, throughput y p50/p95/p99 en ms
+    """
+    resumen = {}
+    for tipo in sorted({tipo for tipo, _, _ in mediciones}):
+        latencias = sorted(s for t, s, _ in mediciones if t == tipo)
+        errores = {}
+        for t, _, error in mediciones:
+            if t == tipo and error:
+                errores[error] = errores.get(error, 0) + 1
+        resumen[tipo] = {
+            "cantidad": len(latencias),
+            "errores": sum(errores.values()),
+            "errores_por_tipo": errores,
+            "por_segundo": len(latencias) / segundos,
+            **{f"p{q}_ms": 1000 * _percentil(latencias, q / 100) for q in (50, 95, 99)},
+        }
+    return resumen
+
+
+def _datos_formulario(azar):
+    cedula = f"{azar.randrange(10 ** 11):011d}"
+    return {
+        "nombre": azar.choice(["Ana Pérez", "Juan Rodríguez", "María Gómez", "Pedro Martínez"]),
+        "cedula": cedula,
+        "telefono": f"809{azar.randrange(10 ** 7):07d}",
+        "email": f"socio{azar.randrange(10 ** 6)}@correo.com",
+        "fecha_nacimiento": date(1960 + azar.randrange(40), 1 + azar.randrange(12), 1 + azar.randrange(28)),
+        "ocupacion": "Comerciante",
+        "tipo_prestamo": None,
+        "monto_solicitado": float(azar.randrange(1, 500) * 1000),
+        "plazo_meses": azar.choice(range(6, 121, 6)),
+        "proposito": "Capital de trabajo para el negocio",
+    }
+
+
+# ---------- Escenario directo ----------
+
+def _envio_directo(azar):
+    """
+    Lo que hace app.py al enviar el formulario
+    """
+    import uuid
+    from datetime import datetime
+    from batch_writer import encolar_solicitud
+    from indice_cedulas import verificar_duplicado
+    from schema import TIPOS_PRESTAMO
+    from validacion import validar_solicitud
+
+    datos = _datos_formulario(azar)
+    datos["tipo_prestamo"] = azar.choice(TIPOS_PRESTAMO)
+    valores, errores = validar_solicitud(datos)
+    if errores:
+        raise ValueError(f"Datos generados inválidos: {errores}")
+    if verificar_duplicado(valores["cedula"], valores["tipo_prestamo"]).bloquear:
+        return None
+    solicitud = {
+        "id": str(uuid.uuid4()),
+        "fecha_solicitud": datetime.now().isoformat(),
+        **valores,
+        "fecha_nacimiento": str(valores["fecha_nacimiento"]),
+    }
+    id_ = encolar_solicitud(solicitud)
+    if id_ is None:
+        raise RuntimeError("encolar_solicitud no registró la solicitud")
+    return id_
+
+
+def _listado_directo(azar):
+    """
+    Lo que hace app.py al mostrar una página del listado
+    """
+    from amortizacion import agregar_cuotas
+    from consultas import COLUMNAS_LISTADO, clave_filtros
+    from query_cache import get_query_cache
+    from schema import ESTADOS, TIPOS_PRESTAMO
+    from storage import consultar_solicitudes
+
+    filtros = {
+        "estado": azar.choice([[], [azar.choice(ESTADOS)]]),
+        "tipo_prestamo": azar.choice([[], [azar.choice(TIPOS_PRESTAMO)]]),
+    }
+    tamano = azar.choice([25, 50, 100])
+    clave = (clave_filtros(filtros), tuple(COLUMNAS_LISTADO), tamano)
+    df, _ = get_query_cache().get_or_load(
+        ("solicitudes:pagina", clave, None),
+        lambda: consultar_solicitudes(filtros, COLUMNAS_LISTADO, None, tamano),
+    )
+    agregar_cuotas(df)
+
+
+def _usuario_directo(numero, operaciones, proporcion_envios, semilla):
+    azar = random.Random(semilla + numero)
+    mediciones, enviadas = [], []
+    for _ in range(operaciones):
+        tipo = "envio" if azar.random() < proporcion_envios else "listado"
+        inicio = time.perf_counter()
+        error = None
+        try:
+            if tipo == "envio":
+                id_ = _envio_directo(azar)
+                if id_:
+                    enviadas.append(id_)
+            else:
+                _listado_directo(azar)
+        except Exception as e:
+            error = type(e).__name__
+        mediciones.append((tipo, time.perf_counter() - inicio, error))
+    return mediciones, enviadas
+
+
+# ---------- Escenario AppTest ----------
+
+def _widget(elementos, etiqueta):
+    elemento = next((elemento for elemento in elementos if elemento.label == etiqueta), None)
+    if elemento is None:
+        raise FalloDeLaPrueba(f"No apareció el widget {etiqueta!r}")
+    return elemento
+
+
+def _usuario_apptest(numero, operaciones, proporcion_envios, semilla):
+    from streamlit.testing.v1 import AppTest
+    from schema import ESTADOS
+
+    azar = random.Random(semilla + numero)
+    mediciones, enviadas, fallos = [], [], []
+    app = AppTest.from_file(os.path.join(DIRECTORIO, "app.py"), default_timeout=120)
+
+    def medir(tipo, accion):
+        inicio = time.perf_counter()
+        error = None
+        try:
+            accion()
+            if app.exception:
+                error = "excepcion_en_app"
+            elif app.error:
+                error = "error_en_app"
+        except FalloDeLaPrueba as e:
+            fallos.append((tipo, str(e)))
+            return
+        except Exception as e:
+            error = type(e).__name__
+        mediciones.append((tipo, time.perf_counter() - inicio, error))
+
+    medir("render_inicial", app.run)
+    for _ in range(operaciones):
+        if azar.random() < proporcion_envios:
+            datos = _datos_formulario(azar)
+
+            def enviar():
+                _widget(app.text_input, "Nombre Completo *").input(datos["nombre"])
+                _widget(app.text_input, "Cédula *").input(datos["cedula"])
+                _widget(app.text_input, "Teléfono *").input(datos["telefono"])
+                _widget(app.text_input, "Correo Electrónico").input(datos["email"])
+                _widget(app.date_input, "Fecha de Nacimiento *").set_value(datos["fecha_nacimiento"])
+                _widget(app.text_input, "Ocupación *").input(datos["ocupacion"])
+                _widget(app.text_area, "Propósito del Préstamo *").input(datos["proposito"])
+                _widget(app.button, "📤 Enviar Solicitud").click().run()
+                if "solicitud_enviada" in app.session_state:
+                    enviadas.append(app.session_state["solicitud_enviada"])
+
+            medir("envio", enviar)
+        else:
+            def listar():
+                botones = [boton for boton in app.button if boton.label == "📊 Ver solicitudes"]
+                if botones:
+                    botones[0].click().run()
+                else:
+                    _widget(app.multiselect, "Estado").set_value(azar.choice([[], [azar.choice(ESTADOS)]])).run()
+
+            medir("listado", listar)
+    return mediciones, enviadas, fallos
+
+
+def _proceso_apptest(numero, operaciones, proporcion_envios, semilla, directorio, datos, barrera, resultados):
+    """
+    Un usuario de apptest en su propio proceso: prepara su entorno y datos,
+    espera a los demás, corre y confirma sus envíos
+    """
+    try:
+        _preparar_entorno(directorio)
+        _preparar_datos(datos["filas"], datos["latencia"], datos["tasa_error"], semilla)
+        from batch_writer import CONFIRMADA, estado_envio, get_writer
+    except BaseException:
+        barrera.abort()
+        raise
+    barrera.wait()
+    with _MemoriaPico() as memoria:
+        mediciones, enviadas, fallos = _usuario_apptest(numero, operaciones, proporcion_envios, semilla)
+        # time.monotonic es el mismo reloj en todos los procesos
+        fin = time.monotonic()
+        get_writer().flush(timeout=300)
+        confirmado = time.monotonic()
+    resultados.put({
+        "mediciones": mediciones,
+        "fallos": fallos,
+        "confirmadas": sum(estado_envio(id_).estado == CONFIRMADA for id_ in enviadas),
+        "fin": fin,
+        "confirmado": confirmado,
+        "memoria_inicial": memoria.inicial,
+        "memoria_pico": memoria.pico,
+    })
+
+
+def _ejecutar_apptest(usuarios, operaciones, proporcion_envios, semilla, datos):
+    contexto = multiprocessing.get_context("spawn")
+    barrera = contexto.Barrier(usuarios + 1)
+    resultados = contexto.Queue()
+    with tempfile.TemporaryDirectory() as directorio:
+        procesos = [
+            contexto.Process(
+                target=_proceso_apptest, name=f"apptest-{numero}",
+                args=(numero, operaciones, proporcion_envios, semilla,
+                      os.path.join(directorio, str(numero)), datos, barrera, resultados),
+            )
+            for numero in range(usuarios)
+        ]
+        for proceso in procesos:
+            proceso.start()
+        try:
+            barrera.wait(ESPERA_PROCESOS)
+        except threading.BrokenBarrierError:
+            for proceso in procesos:
+                proceso.terminate()
+            raise FalloDeLaPrueba("Un proceso de apptest no pudo prepararse")
+        inicio = time.monotonic()
+        # Se leen antes del join: un proceso no termina hasta que su resultado sale de la cola
+        por_usuario = []
+        for _ in procesos:
+            por_usuario.append(resultados.get())
+        for proceso in procesos:
+            proceso.join()
+    if any(proceso.exitcode for proceso in procesos):
+        raise FalloDeLaPrueba("Un proceso de apptest terminó con error")
+
+    return {
+        "mediciones": [medicion for r in por_usuario for medicion in r["mediciones"]],
+        "fallos": [fallo for r in por_usuario for fallo in r["fallos"]],
+        "segundos": max(r["fin"] for r in por_usuario) - inicio,
+        "segundos_hasta_confirmar": max(r["confirmado"] for r in por_usuario) - inicio,
+        "confirmadas": sum(r["confirmadas"] for r in por_usuario),
+        "memoria_inicial": max(r["memoria_inicial"] for r in por_usuario),
+        "memoria_pico": max(r["memoria_pico"] for r in por_usuario),
+    }
+
+
+def _ejecutar_directo(usuarios, operaciones, proporcion_envios, semilla):
+    from batch_writer import CONFIRMADA, estado_envio, get_writer
+
+    with _MemoriaPico() as memoria:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=usuarios) as ejecutor:
+            resultados = list(ejecutor.map(
+                lambda numero: _usuario_directo(numero, operaciones, proporcion_envios, semilla), range(usuarios)
+            ))
+        segundos = time.perf_counter() - inicio
+        get_writer().flush(timeout=300)
+        segundos_hasta_confirmar = time.perf_counter() - inicio
+
+    enviadas = [id_ for _, ids in resultados for id_ in ids]
+    return {
+        "mediciones": [medicion for parcial, _ in resultados for medicion in parcial],
+        "fallos": [],
+        "segundos": segundos,
+        "segundos_hasta_confirmar": segundos_hasta_confirmar,
+        "confirmadas": sum(estado_envio(id_).estado == CONFIRMADA for id_ in enviadas),
+        "memoria_inicial": memoria.inicial,
+        "memoria_pico": memoria.pico,
+    }
+
+
+def ejecutar(escenario, usuarios=10, operaciones=20, proporcion_envios=0.5, semilla=0,
+             filas=10_000, latencia=0.05, tasa_error=0.0):
+    """
+    Corre un escenario con `usuarios` simultáneos: hilos en directo, procesos
+    en apptest
+
+    Args:
+        escenario (str): directo o apptest
+        usuarios (int): Usuarios simultáneos
+        operaciones (int): Operaciones por usuario
+        proporcion_envios (float): Fracción de las operaciones que son envíos
+        semilla (int): Semilla de los datos y del orden de operaciones
+        filas (int): Solicitudes iniciales de cada proceso de apptest (en
+            directo se usan las ya preparadas en este proceso)
+        latencia (float): Segundos por llamada al BigQuery falso de apptest
+        tasa_error (float): Tasa de errores del BigQuery falso de apptest
+
+    Returns:
+        dict: Throughput total, resumen por operación, fallos de la prueba,
+            confirmación y memoria
+    """
+    if escenario == "directo":
+        medido = _ejecutar_directo(usuarios, operaciones, proporcion_envios, semilla)
+    else:
+        datos = {"filas": filas, "latencia": latencia, "tasa_error": tasa_error}
+        medido = _ejecutar_apptest(usuarios, operaciones, proporcion_envios, semilla, datos)
+
+    mediciones, segundos = medido["mediciones"], medido["segundos"]
+    fallos = {}
+    for tipo, _ in medido["fallos"]:
+        fallos[tipo] = fallos.get(tipo, 0) + 1
+    return {
+        "usuarios": usuarios,
+        "operaciones": len(mediciones),
+        "segundos": segundos,
+        "operaciones_por_segundo": len(mediciones) / segundos,
+        "por_operacion": _resumir(mediciones, segundos),
+        "fallos_de_la_prueba": fallos,
+        "segundos_hasta_confirmar": medido["segundos_hasta_confirmar"],
+        "confirmadas": medido["confirmadas"],
+        "memoria_inicial_mb": medido["memoria_inicial"] / 1024 ** 2,
+        "memoria_pico_mb": medido["memoria_pico"] / 1024 ** 2,
+    }
+
+
+def comparar(resultado, base, tolerancia=0.2):
+    """
+    Compara una corrida contra otra guardada
+
+    Returns:
+        list: Regresiones en throughput o p95 mayores que la tolerancia
+    """
+    regresiones = []
+    for escenario, actual in resultado["escenarios"].items():
+        anterior = base.get("escenarios", {}).get(escenario)
+        if not anterior:
+            continue
+        if actual["operaciones_por_segundo"] < anterior["operaciones_por_segundo"] * (1 - tolerancia):
+            regresiones.append(
+                f"{escenario}: {actual['operaciones_por_segundo']:.1f} op/s contra "
+                f"{anterior['operaciones_por_segundo']:.1f} op/s"
+            )
+        for tipo, medidas in actual["por_operacion"].items():
+            previo = anterior["por_operacion"].get(tipo)
+            if previo and medidas["p95_ms"] > previo["p95_ms"] * (1 + tolerancia):
+                regresiones.append(
+                    f"{escenario}/{tipo}: p95 {medidas['p95_ms']:.0f} ms contra {previo['p95_ms']:.0f} ms"
+                )
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga sin conexión")
+    parser.add_argument("--escenario", choices=ESCENARIOS + ("todos",), default="todos")
+    parser.add_argument("--usuarios", type=int, default=10)
+    parser.add_argument("--operaciones", type=int, default=20, help="Operaciones por usuario")
+    parser.add_argument("--envios", type=float, default=0.5, help="Fracción de operaciones que son envíos")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Segundos por llamada a BigQuery")
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    parser.add_argument("--filas", type=int, default=10_000, help="Solicitudes ya guardadas")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="JSON donde guardar el resultado (por defecto se imprime)")
+    parser.add_argument("--base", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    escenarios = ESCENARIOS if args.escenario == "todos" else (args.escenario,)
+    with tempfile.TemporaryDirectory() as directorio:
+        _preparar_entorno(directorio)
+        # Los procesos de apptest preparan sus propios datos
+        if "directo" in escenarios:
+            _preparar_datos(args.filas, args.latencia, args.tasa_error, args.semilla)
+        resultado = {
+            "configuracion": {
+                clave: getattr(args, clave)
+                for clave in ("usuarios", "operaciones", "envios", "latencia", "tasa_error", "filas", "semilla")
+            },
+            "escenarios": {},
+        }
+        for escenario in escenarios:
+            print(f"🏃 Escenario {escenario}: {args.usuarios} usuarios × {args.operaciones} operaciones",
+                  file=sys.stderr)
+            medido = ejecutar(escenario, args.usuarios, args.operaciones, args.envios, args.semilla,
+                              args.filas, args.latencia, args.tasa_error)
+            resultado["escenarios"][escenario] = medido
+            print(f"   {medido['operaciones_por_segundo']:.1f} op/s · confirmadas {medido['confirmadas']}"
+                  f" en {medido['segundos_hasta_confirmar']:.1f} s · pico {medido['memoria_pico_mb']:.0f} MB",
+                  file=sys.stderr)
+            for tipo, medidas in medido["por_operacion"].items():
+                print(f"   {tipo:<15} p50 {medidas['p50_ms']:>7.1f} ms · p95 {medidas['p95_ms']:>7.1f} ms"
+                      f" · p99 {medidas['p99_ms']:>7.1f} ms · errores {medidas['errores']}", file=sys.stderr)
+            for tipo, cantidad in medido["fallos_de_la_prueba"].items():
+                print(f"   ⚠️ {tipo}: {cantidad} operaciones que la prueba no pudo hacer (no cuentan como errores)",
+                      file=sys.stderr)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto)
+        print(f"💾 Resultado guardado en {args.salida}", file=sys.stderr)
+    else:
+        print(texto)
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            regresiones = comparar(resultado, json.load(f), args.tolerancia)
+        for regresion in regresiones:
+            print(f"❌ {regresion}", file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+        print("✅ Sin regresiones", file=sys.stderr)
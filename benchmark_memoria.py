@@ -0,0 +1,156 @@
+"""
+Mide la memoria de cargar la tabla de solicitudes completa en un DataFrame.
+
+Compara la forma anterior de leer (SELECT * y to_dataframe(): todas las
+columnas, textos como objetos de Python) con la actual (solo las columnas
+del listado, sin `proposito`, y consultas.arrow_a_dataframe: categorías,
+plazo en int16 y monto en float32).
+
+Las filas se generan una vez en un Parquet temporal, que hace de resultado
+en formato Arrow tal como lo entrega BigQuery. Cada forma de leer corre en un
+proceso nuevo y el pico de RSS se lee de /proc/self/status (VmHWM, Linux),
+que a diferencia de ru_maxrss no hereda el pico del proceso que generó las filas.
+
+Uso:
+    python benchmark_memoria.py
+    python benchmark_memoria.py --filas 200000 --salida memoria.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+MODOS = ("antes", "despues")
+# Los módulos de la app también escriben en stdout; el resultado va en la línea con esta marca
+MARCA = "RESULTADO_MEMORIA "
+
+_MEDICION = f"""
+import json, sys, time
+sys.path.insert(0, {DIRECTORIO!r})
+import pyarrow.parquet as pq
+from consultas import COLUMNAS_LISTADO, arrow_a_dataframe
+
+def rss_kb(campo):
+    with open("/proc/self/status") as f:
+        return next(int(linea.split()[1]) for linea in f if linea.startswith(campo + ":"))
+
+modo, path = sys.argv[1], sys.argv[2]
+base = rss_kb("VmRSS")
+inicio = time.perf_counter()
+if modo == "antes":
+    df = pq.read_table(path).to_pandas()
+else:
+    df = arrow_a_dataframe(pq.read_table(path, columns=COLUMNAS_LISTADO))
+segundos = time.perf_counter() - inicio
+pico = rss_kb("VmHWM")
+print({MARCA!r} + json.dumps({{
+    "filas": len(df),
+    "segundos": segundos,
+    "rss_base_kb": base,
+    "rss_pico_kb": pico,
+    "dataframe_bytes": int(df.memory_usage(deep=True).sum()),
+    "tipos": {{columna: str(tipo) for columna, tipo in df.dtypes.items()}},
+}}))
+"""
+
+
+def generar_parquet(path, filas, semilla=0):
+    """
+    Escribe `filas` solicitudes sintéticas con el esquema de la tabla
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from fake_bigquery import NOMBRES, OCUPACIONES
+    from schema import ESTADOS, TIPOS_PRESTAMO
+
+    azar = np.random.default_rng(semilla)
+    ahora = datetime.now(timezone.utc)
+    cedulas = azar.integers(0, 10 ** 11, filas)
+    telefonos = azar.integers(0, 10 ** 7, filas)
+    tabla = pa.table({
+        "id": [str(uuid.UUID(int=int(x), version=4)) for x in azar.integers(0, 2 ** 63, filas)],
+        "fecha_solicitud": pa.array(
+            [ahora - timedelta(seconds=float(s)) for s in azar.uniform(0, 365 * 86400, filas)],
+            pa.timestamp("us", tz="UTC"),
+        ),
+        "nombre": azar.choice(NOMBRES, filas).tolist(),
+        "cedula": [f"({c // 10 ** 8:03d}) {c // 10 % 10 ** 7:07d}-{c % 10}" for c in cedulas.tolist()],
+        "telefono": [f"(809) {t // 10000:03d}-{t % 10000:04d}" for t in telefonos.tolist()],
+        "email": [f"socio{n}@correo.com" for n in azar.integers(0, 10 ** 6, filas).tolist()],
+        "fecha_nacimiento": pa.array(
+            [ahora.date() - timedelta(days=int(d)) for d in azar.integers(18 * 365, 80 * 365, filas)],
+            pa.date32(),
+        ),
+        "ocupacion": azar.choice(OCUPACIONES, filas).tolist(),
+        "tipo_prestamo": azar.choice(TIPOS_PRESTAMO, filas).tolist(),
+        "monto_solicitado": azar.integers(1, 500, filas).astype("float64") * 1000,
+        "plazo_meses": azar.choice(np.arange(6, 121, 6), filas).astype("int64"),
+        "proposito": [f"Compra de materiales y mejoras para el negocio familiar, solicitud {i}"
+                      for i in range(filas)],
+        "estado": azar.choice(ESTADOS, filas).tolist(),
+    })
+    pq.write_table(tabla, path)
+
+
+def _medir(modo, path):
+    proceso = subprocess.run(
+        [sys.executable, "-c", _MEDICION, modo, path], capture_output=True, text=True, timeout=1800,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"La medición '{modo}' falló:\n{proceso.stderr[-2000:]}")
+    linea = next(linea for linea in proceso.stdout.splitlines() if linea.startswith(MARCA))
+    return json.loads(linea[len(MARCA):])
+
+
+def medir(filas=1_000_000, semilla=0):
+    """
+    Carga las mismas filas de las dos formas, cada una en un proceso nuevo
+
+    Returns:
+        dict: Por modo, segundos, pico e incremento de RSS y memoria del DataFrame
+    """
+    sys.path.insert(0, DIRECTORIO)
+    resultado = {"filas": filas}
+    with tempfile.TemporaryDirectory() as directorio:
+        path = os.path.join(directorio, "solicitudes.parquet")
+        generar_parquet(path, filas, semilla)
+        for modo in MODOS:
+            medido = _medir(modo, path)
+            resultado[modo] = {
+                "segundos": medido["segundos"],
+                "rss_pico_mb": medido["rss_pico_kb"] / 1024,
+                "rss_incremento_mb": (medido["rss_pico_kb"] - medido["rss_base_kb"]) / 1024,
+                "dataframe_mb": medido["dataframe_bytes"] / 1024 ** 2,
+                "tipos": medido["tipos"],
+            }
+    resultado["reduccion_pico"] = 1 - resultado["despues"]["rss_pico_mb"] / resultado["antes"]["rss_pico_mb"]
+    resultado["reduccion_dataframe"] = 1 - resultado["despues"]["dataframe_mb"] / resultado["antes"]["dataframe_mb"]
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memoria de cargar todas las solicitudes")
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="JSON donde guardar el resultado")
+    args = parser.parse_args()
+
+    resultado = medir(args.filas, args.semilla)
+    print(f"🧠 {resultado['filas']:,} solicitudes")
+    for modo, titulo in (("antes", "SELECT * + to_dataframe()"), ("despues", "Columnas del listado, compacto")):
+        medido = resultado[modo]
+        print(f"   {titulo:<31} pico RSS {medido['rss_pico_mb']:>7.0f} MB "
+              f"(+{medido['rss_incremento_mb']:.0f} MB) · DataFrame {medido['dataframe_mb']:>6.0f} MB "
+              f"· {medido['segundos']:.2f} s")
+    print(f"   Reducción: pico {resultado['reduccion_pico']:.0%}, DataFrame {resultado['reduccion_dataframe']:.0%}")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+        print(f"💾 Resultado guardado en {args.salida}")
@@ -0,0 +1,92 @@
+"""
+Mide cuántas solicitudes por segundo valida cada camino de validacion.py.
+
+- Formulario: `validar_solicitud` sobre una lista de dicts, una por una.
+- Importación: `validar_lote` sobre el mismo conjunto como DataFrame de texto,
+  en bloques del tamaño que usa importar_solicitudes.py.
+
+Los datos son sintéticos; un 10% de las filas trae algún campo inválido para
+que también se midan los caminos de error.
+
+Uso:
+    python benchmark_validacion.py
+    python benchmark_validacion.py --registros 200000 --repeticiones 5
+"""
+
+import argparse
+import random
+import time
+import pandas as pd
+from fake_bigquery import generar_solicitudes
+from importar_solicitudes import TAMANO_BLOQUE
+from validacion import validar_solicitud, validar_lote, CAMPOS_VALIDADOS
+
+
+def _datos(cantidad, semilla=0):
+    """
+    Solicitudes como las ingresaría un usuario: cédula y teléfono sin formato
+    y todos los valores como texto; una de cada diez con un error
+    """
+    azar = random.Random(semilla)
+    registros = []
+    for fila in generar_solicitudes(cantidad, semilla=semilla):
+        registro = {campo: "" if fila[campo] is None else str(fila[campo]) for campo in CAMPOS_VALIDADOS}
+        registro["cedula"] = registro["cedula"].replace("(", "").replace(") ", "").replace("-", "")
+        registro["telefono"] = registro["telefono"].replace("(", "").replace(") ", "").replace("-", "")
+        if azar.random() < 0.1:
+            registro[azar.choice(["cedula", "telefono", "nombre", "plazo_meses"])] = "12"
+        registros.append(registro)
+    return registros
+
+
+def _mejor_tiempo(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def medir(registros=50_000, repeticiones=3, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Mide ambos caminos de validación sobre los mismos datos
+
+    Args:
+        registros (int): Solicitudes sintéticas a validar
+        repeticiones (int): Se reporta el mejor de este número de intentos
+        tamano_bloque (int): Filas por DataFrame en el camino por lotes
+
+    Returns:
+        dict: Registros por segundo de cada camino y errores encontrados
+    """
+    datos = _datos(registros)
+    df = pd.DataFrame(datos, columns=CAMPOS_VALIDADOS)
+    bloques = [df.iloc[i:i + tamano_bloque] for i in range(0, len(df), tamano_bloque)]
+
+    errores_registro = sum(bool(validar_solicitud(d)[1]) for d in datos)
+    errores_lote = sum(validar_lote(b)[1]["posicion"].nunique() for b in bloques)
+    if errores_registro != errores_lote:
+        raise AssertionError(f"Los caminos no coinciden: {errores_registro} vs {errores_lote} filas con errores")
+
+    por_registro = _mejor_tiempo(lambda: [validar_solicitud(d) for d in datos], repeticiones)
+    por_lote = _mejor_tiempo(lambda: [validar_lote(b) for b in bloques], repeticiones)
+    return {
+        "registros": registros,
+        "filas_con_errores": errores_lote,
+        "formulario_registros_por_segundo": registros / por_registro,
+        "lote_registros_por_segundo": registros / por_lote,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de validacion.py")
+    parser.add_argument("--registros", type=int, default=50_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="Filas por lote")
+    args = parser.parse_args()
+
+    resultado = medir(args.registros, args.repeticiones, args.bloque)
+    print(f"📊 {resultado['registros']:,} solicitudes ({resultado['filas_con_errores']:,} con errores)")
+    print(f"   Formulario (una a una): {resultado['formulario_registros_por_segundo']:>12,.0f} registros/s")
+    print(f"   Lote (vectorizado):     {resultado['lote_registros_por_segundo']:>12,.0f} registros/s")
@@ -0,0 +1,423 @@
+"""
+Índice local de texto completo sobre nombre, ocupación y propósito.
+
+Buscar con LIKE '%...%' en BigQuery recorre la tabla completa en cada
+búsqueda: segundos de espera y bytes facturados por cada tecla. En su lugar,
+el texto se copia a una base SQLite local (BUSQUEDA_INDICE_PATH) con un índice
+invertido FTS5, y cada búsqueda responde en milisegundos sin tocar el backend.
+
+- El índice se construye una vez, en segundo plano, leyendo la tabla por
+  páginas (storage.iterar_solicitudes) y queda guardado entre reinicios.
+  Mientras se construye, las búsquedas no devuelven resultados.
+- El camino de escritura registra cada solicitud en cuanto se encola o se
+  importa, y una sincronización periódica (en segundo plano, a lo sumo cada
+  BUSQUEDA_SYNC_SEGUNDOS) trae las filas posteriores a la última vista, menos
+  la ventana de solapamiento de la caché local.
+- Las filas borradas de la tabla solo desaparecen al reconstruir el índice.
+
+El texto se normaliza antes de indexarlo y al buscar: minúsculas y sin tildes
+ni diéresis, así "maria", "María" y "MARÍA" son la misma palabra (y "pena"
+encuentra "Peña"). Cada palabra de la búsqueda se trata como prefijo y todas
+deben aparecer; los artículos y preposiciones se ignoran. Los resultados se
+ordenan por BM25, con más peso para el nombre que para la ocupación y el
+propósito.
+
+Uso:
+    python busqueda_solicitudes.py --reconstruir
+    python busqueda_solicitudes.py "maria comerciante"
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import closing
+import pandas as pd
+from configuracion import get_configuracion
+
+_config = get_configuracion()
+INDICE_PATH = _config.busqueda_indice_path
+SYNC_SEGUNDOS = _config.busqueda_sync_segundos
+# Igual que la caché local: las filas que llegan tarde caen dentro de esta ventana
+SOLAPAMIENTO_MINUTOS = _config.solicitudes_cache_overlap_minutes
+
+# Cambia cuando cambian las tablas o la normalización; un índice de otro
+# formato se reconstruye
+FORMATO = 1
+
+# Columnas con texto que se busca, con su peso en el orden BM25
+CAMPOS_TEXTO = {"nombre": 10.0, "ocupacion": 4.0, "proposito": 1.0}
+
+# Columnas que se leen de la tabla y se muestran en los resultados
+COLUMNAS_INDICE = ["id", "fecha_solicitud", "nombre", "cedula", "ocupacion", "tipo_prestamo",
+                   "monto_solicitado", "proposito"]
+
+# Palabras que no sirven para distinguir solicitudes
+PALABRAS_VACIAS = frozenset(
+    "a al con de del el en la las lo los para por que se su sus un una uno y o".split()
+)
+
+LIMITE = 50
+
+
+def normalizar_texto(texto):
+    """
+    Minúsculas y sin tildes ni diéresis ("Peña Núñez" -> "pena nunez")
+    """
+    if texto is None or texto != texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", str(texto))
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def terminos_busqueda(texto):
+    """
+    Palabras normalizadas de una búsqueda, sin las palabras vacías (salvo que
+    la búsqueda tenga solo palabras vacías)
+
+    Returns:
+        list: Términos en el orden escrito, sin repetir
+    """
+    palabras = list(dict.fromkeys(re.findall(r"\w+", normalizar_texto(texto))))
+    utiles = [p for p in palabras if p not in PALABRAS_VACIAS]
+    return utiles or palabras
+
+
+def consulta_fts(terminos):
+    """
+    Expresión MATCH de FTS5: todas las palabras, cada una como prefijo
+    """
+    # Entre comillas, los términos no se interpretan como operadores de FTS5
+    return " ".join(f'"{termino}"*' for termino in terminos)
+
+
+class IndiceBusqueda:
+    """
+    Índice FTS5 de las solicitudes en un archivo SQLite local.
+
+    Args:
+        path (str): Archivo de la base del índice
+        iterar_fn (callable): Sin argumentos; recorre todas las solicitudes en
+            páginas (DataFrames con COLUMNAS_INDICE). Por defecto, el backend.
+        desde_fn (callable): Recibe una fecha y retorna un DataFrame con las
+            solicitudes posteriores. Por defecto, el backend.
+        sync_segundos (float): Mínimo de segundos entre sincronizaciones
+        solapamiento (pandas.Timedelta): Tiempo antes de la última fecha vista
+            que se vuelve a leer al sincronizar
+        clock (callable): Reloj en segundos, inyectable en pruebas
+    """
+
+    def __init__(self, path=INDICE_PATH, iterar_fn=None, desde_fn=None, sync_segundos=SYNC_SEGUNDOS,
+                 solapamiento=pd.Timedelta(minutes=SOLAPAMIENTO_MINUTOS), clock=time.time):
+        if iterar_fn is None or desde_fn is None:
+            from storage import iterar_solicitudes, get_solicitudes_desde
+            iterar_fn = iterar_fn or (lambda: iterar_solicitudes(None, COLUMNAS_INDICE, ventana_dias=0))
+            desde_fn = desde_fn or (lambda desde: get_solicitudes_desde(desde, "", COLUMNAS_INDICE))
+
+        self._path = path
+        self._iterar_fn = iterar_fn
+        self._desde_fn = desde_fn
+        self._sync_segundos = sync_segundos
+        self._solapamiento = solapamiento
+        self._clock = clock
+        self._sync_lock = threading.Lock()
+        self._construido = None
+        self._ultima_sync = 0.0
+        self.stats = {"reconstrucciones": 0, "ultima_reconstruccion_segundos": 0.0, "sincronizaciones": 0,
+                      "busquedas": 0, "ultima_busqueda_ms": 0.0}
+
+    @property
+    def construido(self):
+        if self._construido is None:
+            self._construido = self._leer_meta("formato") == str(FORMATO)
+        return self._construido
+
+    def reconstruir(self):
+        """
+        Construye el índice desde cero en un archivo temporal y lo reemplaza
+        al terminar; las búsquedas siguen usando el anterior mientras tanto
+
+        Returns:
+            int: Solicitudes indexadas
+        """
+        with self._sync_lock:
+            return self._reconstruir()
+
+    def construir_en_segundo_plano(self):
+        """
+        Lanza la construcción en un hilo si el índice no existe ni está en
+        construcción
+
+        Returns:
+            bool: True si se lanzó la construcción
+        """
+        if self.construido or self._sync_lock.locked():
+            return False
+        threading.Thread(target=self._construir_en_segundo_plano, name="indice-busqueda", daemon=True).start()
+        return True
+
+    def sincronizar(self):
+        """
+        Indexa las filas nuevas desde la última sincronización
+
+        Returns:
+            int: Filas leídas (todas si hubo que reconstruir)
+        """
+        with self._sync_lock:
+            if not self.construido:
+                return self._reconstruir()
+            marca = self._leer_meta("marca")
+            desde = pd.Timestamp(marca) - self._solapamiento if marca else pd.Timestamp(0, tz="UTC")
+            nuevas = self._desde_fn(desde.to_pydatetime())
+            with closing(self._conectar()) as conn, conn:
+                self._indexar(conn, nuevas)
+            self._ultima_sync = self._clock()
+            self.stats["sincronizaciones"] += 1
+            return len(nuevas)
+
+    def registrar(self, solicitud):
+        """
+        Agrega al índice una solicitud recién enviada
+
+        Args:
+            solicitud (dict): Fila con las COLUMNAS_INDICE
+        """
+        self.registrar_lote(pd.DataFrame([solicitud]))
+
+    def registrar_lote(self, df):
+        """
+        Agrega al índice un DataFrame de solicitudes recién cargadas
+
+        No mueve la marca de la sincronización: las filas que otros procesos
+        escriban con fechas anteriores también se traerán.
+        """
+        if df.empty or not self.construido:
+            return
+        with closing(self._conectar()) as conn, conn:
+            self._indexar(conn, df, mover_marca=False)
+
+    def buscar(self, texto, limite=LIMITE):
+        """
+        Busca solicitudes por nombre, ocupación o propósito
+
+        Si el índice aún no existe se lanza su construcción en segundo plano
+        y no hay resultados; si está vencido se sincroniza en segundo plano.
+
+        Args:
+            texto (str): Palabras o comienzos de palabras, con o sin tildes
+            limite (int): Máximo de resultados
+
+        Returns:
+            pandas.DataFrame: COLUMNAS_INDICE de las solicitudes encontradas,
+                de la más relevante a la menos relevante
+        """
+        terminos = terminos_busqueda(texto)
+        if not terminos:
+            return pd.DataFrame(columns=COLUMNAS_INDICE)
+
+        if not self.construido:
+            # Construirlo aquí haría esperar la búsqueda (y la página) varios segundos o minutos
+            self.construir_en_segundo_plano()
+            return pd.DataFrame(columns=COLUMNAS_INDICE)
+        if self._clock() - self._ultima_sync > self._sync_segundos and not self._sync_lock.locked():
+            threading.Thread(target=self._sincronizar_en_segundo_plano, daemon=True).start()
+
+        inicio = time.perf_counter()
+        with closing(self._conectar()) as conn:
+            # Primero los mejores rowid dentro de FTS5 y después sus filas: el
+            # JOIN se hace solo para los `limite` resultados, no para cada coincidencia
+            df = pd.read_sql_query(
+                f"SELECT {', '.join('s.' + c for c in COLUMNAS_INDICE)} FROM "
+                f"(SELECT rowid, rank FROM texto WHERE texto MATCH ? ORDER BY rank LIMIT ?) AS mejores "
+                f"JOIN solicitudes AS s ON s.rowid = mejores.rowid ORDER BY mejores.rank",
+                conn, params=(consulta_fts(terminos), limite),
+            )
+        df["fecha_solicitud"] = pd.to_datetime(df["fecha_solicitud"], utc=True, format="ISO8601")
+        self.stats["busquedas"] += 1
+        self.stats["ultima_busqueda_ms"] = (time.perf_counter() - inicio) * 1000
+        return df
+
+    def estadisticas(self):
+        """
+        Retorna el tamaño del índice y sus contadores
+
+        Returns:
+            dict: Solicitudes indexadas, bytes del archivo, marca y contadores
+        """
+        solicitudes = 0
+        if self.construido:
+            with closing(self._conectar()) as conn:
+                solicitudes = conn.execute("SELECT COUNT(*) FROM solicitudes").fetchone()[0]
+        return {
+            "construido": self.construido,
+            "solicitudes": solicitudes,
+            "bytes": os.path.getsize(self._path) if os.path.exists(self._path) else 0,
+            "marca": self._leer_meta("marca"),
+            **self.stats,
+        }
+
+    # ---------- Internos ----------
+
+    def _conectar(self, path=None):
+        conn = sqlite3.connect(path or self._path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _leer_meta(self, clave):
+        if not os.path.exists(self._path):
+            return None
+        try:
+            with closing(self._conectar()) as conn:
+                fila = conn.execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return fila[0] if fila else None
+
+    def _reconstruir(self):
+        # Se llama con _sync_lock tomado
+        inicio = time.perf_counter()
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        temporal = self._path + ".tmp"
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+        total = 0
+        with closing(self._conectar(temporal)) as conn:
+            with conn:
+                self._crear_tablas(conn)
+            for bloque in self._iterar_fn():
+                with conn:
+                    self._indexar(conn, bloque, reemplazar=False)
+                total += len(bloque)
+            with conn:
+                conn.execute("INSERT INTO meta (clave, valor) VALUES ('formato', ?)", (str(FORMATO),))
+                # Compacta los segmentos del índice que dejó la carga por bloques
+                conn.execute("INSERT INTO texto (texto) VALUES ('optimize')")
+            conn.execute("PRAGMA journal_mode=DELETE")
+
+        for sufijo in ("-wal", "-shm"):
+            if os.path.exists(self._path + sufijo):
+                os.remove(self._path + sufijo)
+        os.replace(temporal, self._path)
+        self._construido = True
+        self._ultima_sync = self._clock()
+        self.stats["reconstrucciones"] += 1
+        self.stats["ultima_reconstruccion_segundos"] = time.perf_counter() - inicio
+        print(f"✅ Índice de búsqueda construido: {total} solicitudes en {time.perf_counter() - inicio:.1f} s")
+        return total
+
+    def _construir_en_segundo_plano(self):
+        try:
+            with self._sync_lock:
+                if not self.construido:
+                    self._reconstruir()
+        except Exception as e:
+            print(f"⚠️ No se pudo construir el índice de búsqueda: {e}")
+
+    def _sincronizar_en_segundo_plano(self):
+        try:
+            self.sincronizar()
+        except Exception as e:
+            print(f"⚠️ No se pudo sincronizar el índice de búsqueda: {e}")
+
+    @staticmethod
+    def _crear_tablas(conn):
+        conn.execute(
+            f"CREATE TABLE solicitudes (rowid INTEGER PRIMARY KEY, "
+            f"{', '.join(c + ' TEXT UNIQUE' if c == 'id' else c for c in COLUMNAS_INDICE)})"
+        )
+        # El texto ya llega normalizado; remove_diacritics cubre lo que se escape
+        conn.execute(
+            f"CREATE VIRTUAL TABLE texto USING fts5({', '.join(CAMPOS_TEXTO)}, "
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        # `rank` es BM25 con el peso de cada columna
+        conn.execute(
+            "INSERT INTO texto (texto, rank) VALUES ('rank', ?)",
+            (f"bm25({', '.join(str(peso) for peso in CAMPOS_TEXTO.values())})",),
+        )
+        conn.execute("CREATE TABLE meta (clave TEXT PRIMARY KEY, valor TEXT)")
+
+    @staticmethod
+    def _indexar(conn, df, mover_marca=True, reemplazar=True):
+        """
+        Agrega o reemplaza filas por id, en la transacción de `conn`
+
+        Al reconstruir, `reemplazar=False` omite la búsqueda de filas
+        anteriores: la tabla está vacía y cada id se lee una sola vez.
+        """
+        if df.empty:
+            return
+        fechas = pd.to_datetime(df["fecha_solicitud"], utc=True, format="mixed")
+        filas = pd.DataFrame({
+            columna: df[columna].astype(object).where(df[columna].notna(), None) if columna in df else None
+            for columna in COLUMNAS_INDICE
+        })
+        filas["fecha_solicitud"] = fechas.map(lambda fecha: fecha.isoformat())
+        filas["monto_solicitado"] = pd.to_numeric(filas["monto_solicitado"]).astype(float)
+
+        if reemplazar:
+            # Las filas repetidas (solapamiento, registro desde la escritura) se reemplazan
+            ids = [(id_,) for id_ in filas["id"].astype(str)]
+            conn.executemany(
+                "DELETE FROM texto WHERE rowid IN (SELECT rowid FROM solicitudes WHERE id = ?)", ids
+            )
+            conn.executemany("DELETE FROM solicitudes WHERE id = ?", ids)
+        # El rowid une cada fila con su texto en FTS5
+        primero = conn.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM solicitudes").fetchone()[0]
+        rowids = range(primero, primero + len(filas))
+        conn.executemany(
+            f"INSERT INTO solicitudes (rowid, {', '.join(COLUMNAS_INDICE)}) "
+            f"VALUES ({', '.join('?' * (len(COLUMNAS_INDICE) + 1))})",
+            ((rowid, *fila) for rowid, fila in zip(rowids, filas.itertuples(index=False, name=None))),
+        )
+        conn.executemany(
+            f"INSERT INTO texto (rowid, {', '.join(CAMPOS_TEXTO)}) VALUES (?, {', '.join('?' for _ in CAMPOS_TEXTO)})",
+            zip(rowids, *(filas[campo].map(normalizar_texto) for campo in CAMPOS_TEXTO)),
+        )
+        if mover_marca:
+            marca = fechas.max().isoformat()
+            conn.execute(
+                "INSERT INTO meta (clave, valor) VALUES ('marca', ?) "
+                "ON CONFLICT (clave) DO UPDATE SET valor = MAX(valor, excluded.valor)",
+                (marca,),
+            )
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def get_indice_busqueda():
+    """
+    Retorna el índice de búsqueda compartido por el proceso (sin construirlo)
+    """
+    global _indice
+    with _indice_lock:
+        if _indice is None:
+            _indice = IndiceBusqueda()
+        return _indice
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye el índice de búsqueda o busca solicitudes")
+    parser.add_argument("texto", nargs="?", help="Búsqueda por nombre, ocupación o propósito")
+    parser.add_argument("--reconstruir", action="store_true", help="Construye el índice desde cero")
+    parser.add_argument("--limite", type=int, default=LIMITE)
+    args = parser.parse_args()
+
+    indice = get_indice_busqueda()
+    if args.reconstruir:
+        indice.reconstruir()
+    elif indice.construido:
+        indice.sincronizar()
+    if args.texto:
+        resultados = indice.buscar(args.texto, args.limite)
+        print(f"🔎 {len(resultados)} resultados en {indice.stats['ultima_busqueda_ms']:.1f} ms")
+        if len(resultados):
+            print(resultados[["fecha_solicitud", "nombre", "cedula", "ocupacion", "tipo_prestamo"]].to_string(index=False))
+    for clave, valor in indice.estadisticas().items():
+        print(f"   {clave}: {valor}")
@@ -0,0 +1,156 @@
+"""
+Configuración de la aplicación, leída una sola vez del entorno y del `.env`.
+
+Cada ajuste se declara una sola vez en AJUSTES con su variable de entorno,
+su tipo y su valor por defecto (y, si aplica, los valores permitidos o el
+mínimo). La primera llamada a get_configuracion() carga el `.env`, convierte
+y valida todos los ajustes juntos y guarda el resultado: un objeto inmutable
+que comparten todos los módulos del proceso. Si algún valor es inválido se
+lanza ConfiguracionInvalida con la lista completa de errores, en lugar de
+fallar más tarde en el módulo que lo usa.
+
+Una variable vacía se trata como no definida.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+# Ajuste: `tipo` es texto, entero, decimal, booleano u opcion (texto en minúsculas
+# que debe estar en `permitidos`)
+Ajuste = namedtuple("Ajuste", ["nombre", "variable", "tipo", "defecto", "permitidos", "minimo"],
+                    defaults=(None, None))
+
+AJUSTES = [
+    # BigQuery
+    Ajuste("gcp_project_id", "GCP_PROJECT_ID", "texto", None),
+    Ajuste("bigquery_dataset", "BIGQUERY_DATASET", "texto", None),
+    Ajuste("credenciales_path", "GOOGLE_APPLICATION_CREDENTIALS", "texto", None),
+    Ajuste("bigquery_healthcheck_ttl", "BIGQUERY_HEALTHCHECK_TTL", "decimal", 300.0, minimo=0),
+    # Almacenamiento
+    Ajuste("storage_backend", "STORAGE_BACKEND", "opcion", "bigquery", ("bigquery", "sqlite")),
+    Ajuste("sqlite_path", "SQLITE_PATH", "texto", "./data/solicitudes.db"),
+    # Escritor de lotes
+    Ajuste("spool_path", "SOLICITUDES_SPOOL_PATH", "texto", "./spool/solicitudes.jsonl"),
+    Ajuste("rechazadas_path", "SOLICITUDES_RECHAZADAS_PATH", "texto", "./spool/rechazadas.jsonl"),
+    Ajuste("spool_compactar_filas", "SOLICITUDES_SPOOL_COMPACTAR_FILAS", "entero", 1000, minimo=1),
+    Ajuste("spool_compactar_mb", "SOLICITUDES_SPOOL_COMPACTAR_MB", "decimal", 16.0, minimo=0),
+    Ajuste("batch_writer_size", "BATCH_WRITER_SIZE", "entero", 50, minimo=1),
+    Ajuste("batch_writer_window", "BATCH_WRITER_WINDOW", "decimal", 2.0, minimo=0),
+    Ajuste("batch_writer_retry_delay", "BATCH_WRITER_RETRY_DELAY", "decimal", 5.0, minimo=0),
+    Ajuste("batch_writer_retry_delay_max", "BATCH_WRITER_RETRY_DELAY_MAX", "decimal", 300.0, minimo=0),
+    Ajuste("batch_writer_max_pendientes", "BATCH_WRITER_MAX_PENDIENTES", "entero", 5000, minimo=1),
+    Ajuste("batch_writer_espera_cola", "BATCH_WRITER_ESPERA_COLA", "decimal", 2.0, minimo=0),
+    Ajuste("batch_writer_pausa_path", "BATCH_WRITER_PAUSA_PATH", "texto", "./spool/pausa"),
+    # Cachés
+    Ajuste("solicitudes_cache_dir", "SOLICITUDES_CACHE_DIR", "texto", "./.cache/solicitudes"),
+    Ajuste("solicitudes_cache_overlap_minutes", "SOLICITUDES_CACHE_OVERLAP_MINUTES", "decimal", 10.0, minimo=0),
+    Ajuste("query_cache_ttl", "QUERY_CACHE_TTL", "decimal", 300.0, minimo=0),
+    Ajuste("query_cache_max_entries", "QUERY_CACHE_MAX_ENTRIES", "entero", 32, minimo=1),
+    Ajuste("query_cache_max_mb", "QUERY_CACHE_MAX_MB", "decimal", 256.0, minimo=0),
+    # Listado
+    Ajuste("listado_ventana_dias", "LISTADO_VENTANA_DIAS", "entero", 365, minimo=0),
+    # Duplicados
+    Ajuste("duplicados_politica", "DUPLICADOS_POLITICA", "opcion", "advertir", ("advertir", "bloquear", "dias")),
+    Ajuste("duplicados_dias", "DUPLICADOS_DIAS", "entero", 30, minimo=0),
+    Ajuste("indice_cedulas_sync_segundos", "INDICE_CEDULAS_SYNC_SEGUNDOS", "decimal", 60.0, minimo=0),
+    Ajuste("indice_cedulas_bloom", "INDICE_CEDULAS_BLOOM", "booleano", False),
+    # Búsqueda de texto
+    Ajuste("busqueda_indice_path", "BUSQUEDA_INDICE_PATH", "texto", "./.cache/busqueda.db"),
+    Ajuste("busqueda_sync_segundos", "BUSQUEDA_SYNC_SEGUNDOS", "decimal", 60.0, minimo=0),
+    # Tablero de la cartera
+    Ajuste("resumen_actualizar_segundos", "RESUMEN_ACTUALIZAR_SEGUNDOS", "decimal", 300.0, minimo=0),
+    # Amortización
+    Ajuste("amortizacion_metodo", "AMORTIZACION_METODO", "opcion", "frances", ("frances", "aleman")),
+    # Evaluación de crédito
+    Ajuste("scoring_procesos", "SCORING_PROCESOS", "entero", 0, minimo=0),
+    Ajuste("scoring_bloque", "SCORING_BLOQUE", "entero", 20000, minimo=1),
+    Ajuste("scoring_modelo_path", "SCORING_MODELO_PATH", "texto", None),
+    # Métricas de acceso a datos
+    Ajuste("metricas_activas", "METRICAS_ACTIVAS", "booleano", True),
+    Ajuste("metricas_log", "METRICAS_LOG", "booleano", False),
+    Ajuste("metricas_archivo", "METRICAS_ARCHIVO", "texto", None),
+    Ajuste("metricas_intervalo", "METRICAS_INTERVALO", "decimal", 15.0, minimo=1),
+    Ajuste("metricas_puerto", "METRICAS_PUERTO", "entero", 0, minimo=0),
+]
+
+Configuracion = namedtuple("Configuracion", [ajuste.nombre for ajuste in AJUSTES])
+
+_VERDADEROS = ("1", "true", "si", "sí", "yes")
+_FALSOS = ("0", "false", "no")
+
+
+class ConfiguracionInvalida(ValueError):
+    """
+    Uno o más ajustes del entorno tienen un valor inválido
+    """
+
+
+def _convertir(ajuste, texto):
+    if ajuste.tipo == "texto":
+        return texto
+    if ajuste.tipo == "entero":
+        valor = int(texto)
+    elif ajuste.tipo == "decimal":
+        valor = float(texto)
+    elif ajuste.tipo == "booleano":
+        if texto.lower() not in _VERDADEROS + _FALSOS:
+            raise ValueError(f"se esperaba true o false, se recibió {texto!r}")
+        return texto.lower() in _VERDADEROS
+    else:
+        valor = texto.lower()
+        if valor not in ajuste.permitidos:
+            raise ValueError(f"debe ser uno de {', '.join(ajuste.permitidos)}, se recibió {texto!r}")
+        return valor
+    if ajuste.minimo is not None and valor < ajuste.minimo:
+        raise ValueError(f"debe ser al menos {ajuste.minimo}, se recibió {texto!r}")
+    return valor
+
+
+def cargar_configuracion(entorno=None):
+    """
+    Lee, convierte y valida todos los ajustes
+
+    Args:
+        entorno (dict): Variables a usar; por defecto os.environ (después de cargar el .env)
+
+    Returns:
+        Configuracion: Un atributo por ajuste
+
+    Raises:
+        ConfiguracionInvalida: Con todos los ajustes inválidos
+    """
+    if entorno is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        entorno = os.environ
+
+    valores, errores = {}, []
+    for ajuste in AJUSTES:
+        texto = (entorno.get(ajuste.variable) or "").strip()
+        if not texto:
+            valores[ajuste.nombre] = ajuste.defecto
+            continue
+        try:
+            valores[ajuste.nombre] = _convertir(ajuste, texto)
+        except ValueError as e:
+            errores.append(f"{ajuste.variable}: {e}")
+    if errores:
+        raise ConfiguracionInvalida("Configuración inválida:\n  " + "\n  ".join(errores))
+    return Configuracion(**valores)
+
+
+_configuracion = None
+_configuracion_lock = threading.Lock()
+
+
+def get_configuracion():
+    """
+    Retorna la configuración del proceso, cargándola la primera vez
+    """
+    global _configuracion
+    if _configuracion is None:
+        with _configuracion_lock:
+            if _configuracion is None:
+                _configuracion = cargar_configuracion()
+    return _configuracion
@@ -0,0 +1,349 @@
+"""
+Construcción de consultas paginadas y filtradas sobre solicitudes_prestamo.
+
+Los filtros se traducen a condiciones SQL con parámetros nombrados, nunca
+concatenando valores, y la paginación es por cursor (keyset) sobre
+(fecha_solicitud, id): cada página continúa donde terminó la anterior, así
+que su costo no depende de cuántas páginas se hayan recorrido.
+
+Filtros admitidos (todos opcionales):
+    estado, tipo_prestamo   -> valor o lista de valores
+    fecha_desde, fecha_hasta -> date, rango inclusivo sobre fecha_solicitud
+    monto_min, monto_max     -> rango inclusivo sobre monto_solicitado
+    cedula                   -> coincidencia exacta
+
+La tabla está particionada por fecha_solicitud. Para que BigQuery descarte
+particiones, los predicados sobre esa columna van siempre como condiciones
+AND de primer nivel, y si no se pide un rango de fechas se limita la consulta
+a los últimos LISTADO_VENTANA_DIAS días. La excepción es el filtro por cédula,
+que busca el historial completo de la persona: recorre todas las particiones,
+pero solo con las columnas pedidas.
+
+Los resultados se entregan con tipos compactos (compactar): categorías para
+las columnas de pocos valores distintos, plazo_meses en int16 y el monto en
+float32 cuando no se pierde precisión. `proposito` solo se lee si se pide.
+
+También arma las piezas de SQL del resumen de la cartera (resumen_cartera.py)
+que comparten BigQuery y SQLite: la banda de monto y los rangos de meses a
+recalcular.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+import pandas as pd
+from configuracion import get_configuracion
+from schema import COLUMNAS, ESTADOS, TIPOS_PRESTAMO, BANDAS_MONTO
+
+# Días hacia atrás que se leen cuando no hay filtro de fecha (0 = sin límite)
+VENTANA_DIAS = get_configuracion().listado_ventana_dias
+
+# Columnas del listado: todo menos el texto largo de `proposito`
+COLUMNAS_LISTADO = [columna for columna in COLUMNAS if columna != "proposito"]
+
+# Columnas con pocos valores distintos, que se guardan como categorías. Las
+# categorías fijas se conservan aunque no aparezcan en el resultado, así dos
+# resultados se pueden concatenar sin que la columna vuelva a ser de objetos
+COLUMNAS_CATEGORICAS = {"tipo_prestamo": TIPOS_PRESTAMO, "estado": ESTADOS, "ocupacion": []}
+
+# Columnas que el cursor necesita en cada página
+_COLUMNAS_CURSOR = ["fecha_solicitud", "id"]
+
+
+def columnas_proyectadas(columnas=None):
+    """
+    Valida la lista de columnas pedidas y agrega las que necesita el cursor
+
+    Args:
+        columnas (list): Columnas pedidas; None usa COLUMNAS_LISTADO
+
+    Returns:
+        list: Columnas a seleccionar, en el orden del esquema
+    """
+    pedidas = set(columnas or COLUMNAS_LISTADO)
+    desconocidas = pedidas - set(COLUMNAS)
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {', '.join(sorted(desconocidas))}")
+    pedidas.update(_COLUMNAS_CURSOR)
+    return [columna for columna in COLUMNAS if columna in pedidas]
+
+
+def _inicio_del_dia(dia):
+    return datetime.combine(dia, time.min, tzinfo=timezone.utc)
+
+
+def construir_where(filtros=None, cursor=None, prefijo="@", ventana_dias=VENTANA_DIAS):
+    """
+    Traduce filtros y cursor a una cláusula WHERE con parámetros nombrados
+
+    Args:
+        filtros (dict): Filtros a aplicar (ver docstring del módulo)
+        cursor (tuple): (fecha_solicitud, id) de la última fila de la página anterior
+        prefijo (str): "@" para BigQuery, ":" para SQLite
+        ventana_dias (int): Días hacia atrás a leer si no hay fecha_desde ni
+            cédula (0 = todos)
+
+    Returns:
+        tuple: (cláusula WHERE o cadena vacía, dict nombre -> (tipo BigQuery, valor))
+    """
+    filtros = filtros or {}
+    condiciones = []
+    parametros = {}
+
+    def agregar(condicion, **valores):
+        condiciones.append(condicion)
+        parametros.update(valores)
+
+    for campo in ("estado", "tipo_prestamo"):
+        valores = filtros.get(campo)
+        if not valores:
+            continue
+        if isinstance(valores, str):
+            valores = [valores]
+        nombres = [f"{campo}_{i}" for i in range(len(valores))]
+        condiciones.append(f"{campo} IN ({', '.join(prefijo + n for n in nombres)})")
+        parametros.update({n: ("STRING", v) for n, v in zip(nombres, valores)})
+
+    fecha_desde = filtros.get("fecha_desde")
+    if not fecha_desde and ventana_dias and not filtros.get("cedula"):
+        fecha_desde = datetime.now(timezone.utc).date() - timedelta(days=ventana_dias)
+    if fecha_desde:
+        agregar(f"fecha_solicitud >= {prefijo}fecha_desde",
+                fecha_desde=("TIMESTAMP", _inicio_del_dia(fecha_desde)))
+    if filtros.get("fecha_hasta"):
+        agregar(f"fecha_solicitud < {prefijo}fecha_hasta",
+                fecha_hasta=("TIMESTAMP", _inicio_del_dia(filtros["fecha_hasta"] + timedelta(days=1))))
+    if filtros.get("monto_min") is not None:
+        agregar(f"monto_solicitado >= {prefijo}monto_min", monto_min=("FLOAT64", float(filtros["monto_min"])))
+    if filtros.get("monto_max") is not None:
+        agregar(f"monto_solicitado <= {prefijo}monto_max", monto_max=("FLOAT64", float(filtros["monto_max"])))
+    if filtros.get("cedula"):
+        agregar(f"cedula = {prefijo}cedula", cedula=("STRING", filtros["cedula"]))
+
+    if cursor is not None:
+        cursor_fecha, cursor_id = cursor
+        # El `<=` de primer nivel permite descartar particiones; el OR desempata
+        agregar(
+            f"fecha_solicitud <= {prefijo}cursor_fecha"
+            f" AND (fecha_solicitud < {prefijo}cursor_fecha OR id < {prefijo}cursor_id)",
+            cursor_fecha=("TIMESTAMP", cursor_fecha),
+            cursor_id=("STRING", cursor_id),
+        )
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return where, parametros
+
+
+def separar_pagina(df, limite):
+    """
+    Recorta la fila extra pedida para saber si hay otra página
+
+    Args:
+        df (pandas.DataFrame): Resultado de una consulta con LIMIT limite + 1
+        limite (int): Tamaño de página
+
+    Returns:
+        tuple: (DataFrame de la página, cursor de la siguiente página o None)
+    """
+    if len(df) <= limite:
+        return df, None
+    pagina = df.iloc[:limite]
+    ultima = pagina.iloc[-1]
+    return pagina, (ultima["fecha_solicitud"].to_pydatetime(), ultima["id"])
+
+
+def clave_filtros(filtros):
+    """
+    Convierte los filtros en una tupla ordenada, útil como clave de caché
+    """
+    clave = []
+    for campo, valor in sorted((filtros or {}).items()):
+        if isinstance(valor, (list, tuple, set)):
+            valor = tuple(sorted(valor))
+        elif isinstance(valor, date):
+            valor = valor.isoformat()
+        clave.append((campo, valor))
+    return tuple(clave)
+
+
+def compactar(df):
+    """
+    Reduce la memoria de un resultado de solicitudes, en el mismo DataFrame
+
+    Las columnas de COLUMNAS_CATEGORICAS pasan a categorías (los valores que no
+    están entre las fijas se agregan al final), plazo_meses a int16 y
+    monto_solicitado a float32 si todos los montos se representan exactos.
+
+    Returns:
+        pandas.DataFrame: El mismo DataFrame
+    """
+    for columna, fijas in COLUMNAS_CATEGORICAS.items():
+        if columna in df:
+            valores = df[columna]
+            presentes = (valores.cat.categories if isinstance(valores.dtype, pd.CategoricalDtype)
+                         else valores.dropna().unique())
+            extra = sorted(set(presentes) - set(fijas))
+            df[columna] = pd.Categorical(valores, categories=list(fijas) + extra)
+    if "plazo_meses" in df and df["plazo_meses"].notna().all():
+        df["plazo_meses"] = df["plazo_meses"].astype("int16", copy=False)
+    if "monto_solicitado" in df and df["monto_solicitado"].dtype != "float32":
+        montos = df["monto_solicitado"].astype("float64")
+        reducidos = montos.astype("float32")
+        if ((reducidos.astype("float64") == montos) | montos.isna()).all():
+            df["monto_solicitado"] = reducidos
+    return df
+
+
+def arrow_a_dataframe(tabla):
+    """
+    Convierte un resultado en formato Arrow en un DataFrame compacto
+
+    Las columnas categóricas se codifican como diccionario y plazo_meses y
+    monto_solicitado se reducen antes de pasar a pandas, así nunca se crea un
+    str de Python por fila ni una segunda copia de las columnas numéricas. La
+    tabla se consume en la conversión (self_destruct): no se puede volver a usar.
+
+    Args:
+        tabla (pyarrow.Table | pyarrow.RecordBatch): Resultado de la consulta,
+            o una página de él
+
+    Returns:
+        pandas.DataFrame: Resultado con los tipos de compactar()
+    """
+    import pyarrow as pa
+
+    if isinstance(tabla, pa.RecordBatch):
+        tabla = pa.Table.from_batches([tabla])
+    for columna in COLUMNAS_CATEGORICAS:
+        indice = tabla.schema.get_field_index(columna)
+        if indice >= 0 and not pa.types.is_dictionary(tabla.schema.field(indice).type):
+            tabla = tabla.set_column(indice, columna, tabla.column(indice).dictionary_encode())
+    for columna, reducir in (("plazo_meses", _reducir_plazo), ("monto_solicitado", _reducir_monto)):
+        indice = tabla.schema.get_field_index(columna)
+        if indice >= 0:
+            reducida = reducir(tabla.column(indice))
+            if reducida is not None:
+                tabla = tabla.set_column(indice, columna, reducida)
+    # split_blocks deja cada columna en su propio bloque (sin consolidar en una
+    # matriz nueva) y self_destruct libera cada columna de Arrow apenas pasa a
+    # pandas; sin otra referencia a la tabla, el pico no suma las dos copias
+    df = tabla.to_pandas(split_blocks=True, self_destruct=True)
+    del tabla
+    return compactar(df)
+
+
+def _reducir_plazo(columna):
+    # Mismo criterio que compactar(): int16 si no hay nulos (y los valores caben)
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if columna.null_count or not pa.types.is_integer(columna.type) or len(columna) == 0:
+        return None
+    extremos = pc.min_max(columna)
+    if extremos["min"].as_py() < -2 ** 15 or extremos["max"].as_py() >= 2 ** 15:
+        return None
+    return columna.cast(pa.int16())
+
+
+def _reducir_monto(columna):
+    # float32 solo si todos los montos se representan exactos
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not pa.types.is_floating(columna.type) or columna.type == pa.float32():
+        return None
+    reducida = columna.cast(pa.float32(), safe=False)
+    if pc.all(pc.equal(reducida.cast(pa.float64()), columna)).as_py() is False:
+        return None
+    return reducida
+
+
+# ---------- Resumen de la cartera ----------
+
+# Columnas por las que se agrupa el resumen en el tablero
+DIMENSIONES_RESUMEN = ("mes", "tipo_prestamo", "estado", "banda_monto")
+
+
+def validar_dimension(dimension):
+    """
+    Verifica que la dimensión sea una de DIMENSIONES_RESUMEN (va en el SQL)
+    """
+    if dimension not in DIMENSIONES_RESUMEN:
+        raise ValueError(f"Dimensión desconocida: {dimension} (use {', '.join(DIMENSIONES_RESUMEN)})")
+    return dimension
+
+
+def sql_banda_monto(columna="monto_solicitado"):
+    """
+    Expresión CASE que asigna la etiqueta de BANDAS_MONTO a cada monto
+
+    Returns:
+        str: SQL estándar, válido en BigQuery y en SQLite
+    """
+    casos = " ".join(
+        f"WHEN {columna} <= {limite} THEN '{etiqueta}'" for limite, etiqueta in BANDAS_MONTO if limite is not None
+    )
+    return f"CASE {casos} ELSE '{BANDAS_MONTO[-1][1]}' END"
+
+
+def mes_de(fecha):
+    """
+    Retorna el mes AAAA-MM (UTC) de una fecha
+    """
+    fecha = pd.Timestamp(fecha)
+    fecha = fecha.tz_localize("UTC") if fecha.tzinfo is None else fecha.tz_convert("UTC")
+    return fecha.strftime("%Y-%m")
+
+
+def inicio_del_mes(mes):
+    """
+    Retorna el primer instante (UTC) de un mes AAAA-MM
+    """
+    anio, numero = map(int, mes.split("-"))
+    return datetime(anio, numero, 1, tzinfo=timezone.utc)
+
+
+def meses_entre(desde, hasta):
+    """
+    Meses AAAA-MM desde el de `desde` hasta el de `hasta`, ambos incluidos
+    """
+    return [str(periodo) for periodo in pd.period_range(mes_de(desde), mes_de(hasta), freq="M")]
+
+
+def condicion_meses(meses, prefijo="@"):
+    """
+    Condiciones para recalcular un conjunto de meses del resumen
+
+    Los meses consecutivos se juntan en un solo rango sobre fecha_solicitud,
+    así BigQuery lee solo las particiones de esos meses.
+
+    Args:
+        meses (iterable): Meses AAAA-MM
+        prefijo (str): "@" para BigQuery, ":" para SQLite
+
+    Returns:
+        tuple: (condición sobre fecha_solicitud de la tabla de solicitudes,
+                condición sobre `mes` del resumen,
+                dict nombre -> (tipo BigQuery, valor))
+    """
+    meses = sorted(set(meses))
+    rangos = []
+    for mes in meses:
+        inicio = inicio_del_mes(mes)
+        fin = inicio_del_mes(str(pd.Period(mes, freq="M") + 1))
+        if rangos and rangos[-1][1] == inicio:
+            rangos[-1][1] = fin
+        else:
+            rangos.append([inicio, fin])
+
+    parametros = {}
+    fechas = []
+    for i, (inicio, fin) in enumerate(rangos):
+        fechas.append(f"(fecha_solicitud >= {prefijo}rango_desde_{i} AND fecha_solicitud < {prefijo}rango_hasta_{i})")
+        parametros[f"rango_desde_{i}"] = ("TIMESTAMP", inicio)
+        parametros[f"rango_hasta_{i}"] = ("TIMESTAMP", fin)
+    nombres = [f"mes_{i}" for i in range(len(meses))]
+    parametros.update({nombre: ("STRING", mes) for nombre, mes in zip(nombres, meses)})
+    return (
+        " OR ".join(fechas),
+        f"mes IN ({', '.join(prefijo + nombre for nombre in nombres)})",
+        parametros,
+    )
@@ -0,0 +1,127 @@
+"""
+Flujo de estados de las solicitudes.
+
+    Pendiente -> En revisión -> Aprobada
+                             -> Rechazada
+
+Los cambios se aplican por lotes: el oficial selecciona varias solicitudes y
+les aplica una misma transición. Cada lote se valida contra TRANSICIONES y se
+aplica con una sola sentencia (MERGE en BigQuery) desde una tabla temporal.
+
+Concurrencia optimista: cada solicitud lleva el estado que el oficial vio en
+pantalla, y solo se cambia si sigue en ese estado. Si otra persona la cambió
+mientras tanto, queda como conflicto y no se toca. Cada cambio aplicado se
+anota en la tabla historial_estados.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timezone
+import pandas as pd
+from schema import ESTADOS, COLUMNAS_HISTORIAL
+
+# Estados a los que se puede pasar desde cada estado
+TRANSICIONES = {
+    "Pendiente": ("En revisión",),
+    "En revisión": ("Aprobada", "Rechazada"),
+    "Aprobada": (),
+    "Rechazada": (),
+}
+
+# Resultado de un lote: cantidad aplicada y DataFrames (id, estado, motivo)
+# de las solicitudes rechazadas por conflicto o por transición inválida
+ResultadoCambio = namedtuple("ResultadoCambio", ["aplicadas", "conflictos", "invalidas"])
+
+
+def transiciones_permitidas(estado):
+    """
+    Estados a los que puede pasar una solicitud
+
+    Args:
+        estado (str): Estado actual
+
+    Returns:
+        tuple: Estados destino permitidos (vacía si es un estado final)
+    """
+    return TRANSICIONES.get(estado, ())
+
+
+def validar_transicion(estado_actual, estado_nuevo):
+    """
+    Comprueba una transición
+
+    Returns:
+        str: Motivo por el que no se permite, o None si es válida
+    """
+    if estado_nuevo not in ESTADOS:
+        return f"Estado desconocido: {estado_nuevo}"
+    if estado_nuevo not in transiciones_permitidas(estado_actual):
+        return f"No se puede pasar de {estado_actual} a {estado_nuevo}"
+    return None
+
+
+def cambiar_estado(solicitudes, estado_nuevo, usuario=None, comentario=None, fecha=None):
+    """
+    Aplica una transición a un lote de solicitudes
+
+    Args:
+        solicitudes (pandas.DataFrame): Columnas id y estado (el estado que
+            el oficial vio; se usa como condición de concurrencia)
+        estado_nuevo (str): Estado destino
+        usuario (str): Quién hace el cambio
+        comentario (str): Nota que queda en el historial
+        fecha (datetime): Momento del cambio; por defecto, ahora
+
+    Returns:
+        ResultadoCambio: Aplicadas, conflictos e inválidas
+    """
+    from storage import aplicar_transiciones
+
+    solicitudes = solicitudes[["id", "estado"]].drop_duplicates("id")
+    motivos = solicitudes["estado"].map(lambda estado: validar_transicion(estado, estado_nuevo))
+    invalidas = solicitudes[motivos.notna()].assign(motivo=motivos[motivos.notna()])
+    validas = solicitudes[motivos.isna()]
+
+    conflictos = pd.DataFrame(columns=["id", "estado", "motivo"])
+    if not validas.empty:
+        lote = pd.DataFrame({
+            "id": validas["id"].to_numpy(),
+            "estado_anterior": validas["estado"].to_numpy(),
+            "estado_nuevo": estado_nuevo,
+            "usuario": usuario or None,
+            "comentario": comentario or None,
+            "fecha_cambio": pd.Timestamp(fecha or datetime.now(timezone.utc)),
+        }, columns=COLUMNAS_HISTORIAL)
+        encontrados = aplicar_transiciones(lote)
+        if not encontrados.empty:
+            conflictos = pd.DataFrame({
+                "id": encontrados["id"].to_numpy(),
+                "estado": encontrados["estado_actual"].to_numpy(),
+                "motivo": [
+                    f"Ahora está en {estado}" if pd.notna(estado) else "La solicitud no existe"
+                    for estado in encontrados["estado_actual"]
+                ],
+            })
+        aplicadas = validas.loc[~validas["id"].isin(conflictos["id"]), "id"].tolist()
+        if aplicadas:
+            _actualizar_copias_locales(aplicadas, estado_nuevo)
+
+    return ResultadoCambio(
+        aplicadas=len(validas) - len(conflictos),
+        conflictos=conflictos,
+        invalidas=invalidas.reset_index(drop=True),
+    )
+
+
+def _actualizar_copias_locales(ids, estado_nuevo):
+    # El índice de cédulas y la caché local ven el cambio sin esperar a sincronizarse;
+    # si no, una solicitud ya cerrada seguiría contando como abierta al verificar duplicados
+    try:
+        from indice_cedulas import get_indice_cedulas
+        get_indice_cedulas().actualizar_estado(ids, estado_nuevo)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el estado en el índice de cédulas: {e}")
+    try:
+        from solicitudes_cache import get_solicitudes_cache
+        get_solicitudes_cache().actualizar_estado(ids, estado_nuevo)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el estado en la caché local: {e}")
@@ -0,0 +1,290 @@
+"""
+Evaluación de crédito por lotes de las solicitudes pendientes.
+
+Pensado para correr como tarea programada (cron, Cloud Scheduler):
+
+1. Cuenta una sola vez las solicitudes de cada cédula en toda la tabla.
+2. Lee las solicitudes pendientes sin evaluación con una sola consulta,
+   por bloques.
+3. Reparte los bloques entre un pool de procesos. Cada proceso calcula las
+   variables (edad, relación cuota/monto, plazo, tipo de préstamo y
+   solicitudes previas de la cédula) y aplica el modelo de forma vectorizada.
+4. Guarda cada bloque evaluado con una sola sentencia (MERGE en BigQuery,
+   upsert en SQLite) en la tabla evaluaciones_credito.
+
+El modelo combina una tarjeta de puntaje (puntos por tramo de cada variable)
+con reglas que fuerzan la recomendación. Los códigos de motivo son las dos
+variables que más puntos le restaron a la solicitud, más las reglas que se
+activaron. El modelo por defecto está en MODELO y se puede reemplazar con un
+JSON de la misma forma (--modelo o SCORING_MODELO_PATH).
+
+La evaluación no cambia el estado de la solicitud; solo deja la recomendación
+para el comité.
+
+Uso:
+    python evaluacion_credito.py
+    python evaluacion_credito.py --procesos 8 --bloque 50000
+    python evaluacion_credito.py --modelo modelo.json --sin-guardar
+"""
+
+import argparse
+import copy
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+import numpy as np
+import pandas as pd
+from configuracion import get_configuracion
+from amortizacion import resumen_cuotas, tasas_mensuales
+from schema import COLUMNAS_EVALUACIONES
+
+_config = get_configuracion()
+TAMANO_BLOQUE = _config.scoring_bloque
+PROCESOS = _config.scoring_procesos or os.cpu_count() or 1
+MODELO_PATH = _config.scoring_modelo_path
+
+RECOMENDACIONES = ("Aprobar", "Revisar", "Rechazar")
+
+# Tarjeta de puntaje: `limites` parte la variable en tramos y `puntos` tiene un
+# valor por tramo (uno más que los límites); las variables categóricas usan
+# `categorias` y `otros`. Las reglas son expresiones de DataFrame.eval.
+MODELO = {
+    "version": "tarjeta-base-1",
+    "puntaje_base": 600,
+    "corte_aprobar": 650,
+    "corte_revisar": 580,
+    "tarjeta": {
+        "edad": {
+            "codigo": "EDAD", "limites": [21, 25, 35, 55, 70], "puntos": [-40, -15, 10, 25, 10, -25],
+        },
+        "relacion_cuota_monto": {
+            "codigo": "CUOTA_ALTA", "limites": [0.03, 0.06, 0.12], "puntos": [20, 10, -10, -35],
+        },
+        "plazo_meses": {
+            "codigo": "PLAZO_LARGO", "limites": [25, 61, 97], "puntos": [15, 5, -5, -20],
+        },
+        "solicitudes_previas": {
+            "codigo": "SOLICITUDES_PREVIAS", "limites": [1, 2, 4], "puntos": [10, 0, -25, -60],
+        },
+        "tipo_prestamo": {
+            "codigo": "TIPO_PRESTAMO",
+            "categorias": {"Hipotecario": 20, "Vehicular": 10, "Educativo": 10, "Personal": 0, "Emergencia": -15},
+            "otros": -15,
+        },
+    },
+    "reglas": [
+        {"codigo": "MENOR_DE_EDAD", "condicion": "edad < 18", "recomendacion": "Rechazar"},
+        {"codigo": "SOLICITUDES_EXCESIVAS", "condicion": "solicitudes_previas >= 5", "recomendacion": "Rechazar"},
+        {"codigo": "MONTO_ALTO_JOVEN", "condicion": "edad < 25 and monto_solicitado > 1000000",
+         "recomendacion": "Revisar"},
+    ],
+}
+
+
+def cargar_modelo(path=MODELO_PATH):
+    """
+    Carga el modelo desde un JSON o retorna una copia del modelo por defecto
+    """
+    if not path:
+        return copy.deepcopy(MODELO)
+    with open(path, encoding="utf-8") as f:
+        modelo = json.load(f)
+    for regla in modelo.get("reglas", []):
+        if regla["recomendacion"] not in RECOMENDACIONES:
+            raise ValueError(f"Recomendación desconocida en la regla {regla['codigo']}: {regla['recomendacion']}")
+    return modelo
+
+
+def calcular_variables(df, hoy=None):
+    """
+    Deriva las variables del modelo para un bloque de solicitudes
+
+    Args:
+        df (pandas.DataFrame): Solicitudes con fecha_nacimiento, tipo_prestamo,
+            monto_solicitado, plazo_meses y solicitudes_cedula (total de
+            solicitudes de la cédula, incluida esta)
+        hoy (date): Fecha de referencia para la edad
+
+    Returns:
+        pandas.DataFrame: Una columna por variable, mismo índice que `df`
+    """
+    hoy = pd.Timestamp(hoy or date.today())
+    nacimiento = pd.to_datetime(df["fecha_nacimiento"], errors="coerce")
+    monto = df["monto_solicitado"].to_numpy(dtype="float64")
+    plazo = df["plazo_meses"].to_numpy(dtype="float64")
+    cuota = resumen_cuotas(monto, plazo, tasas_mensuales(df["tipo_prestamo"].to_numpy()))["primera_cuota"]
+    return pd.DataFrame({
+        "edad": ((hoy - nacimiento).dt.days / 365.25).to_numpy(),
+        "relacion_cuota_monto": cuota / monto,
+        "plazo_meses": plazo,
+        "tipo_prestamo": df["tipo_prestamo"].to_numpy(),
+        "solicitudes_previas": df["solicitudes_cedula"].to_numpy(dtype="float64") - 1,
+        "monto_solicitado": monto,
+    }, index=df.index)
+
+
+def _puntos_variable(valores, tramo):
+    """
+    Puntos de cada fila para una variable y el máximo posible de esa variable
+    """
+    if "categorias" in tramo:
+        puntos = valores.map(tramo["categorias"]).fillna(tramo.get("otros", 0)).to_numpy(dtype="float64")
+        return puntos, max(tramo["categorias"].values())
+    tabla = np.asarray(tramo["puntos"], dtype="float64")
+    valores = valores.to_numpy(dtype="float64")
+    puntos = tabla[np.digitize(np.nan_to_num(valores), tramo["limites"])]
+    # Un dato faltante recibe el peor puntaje de la variable
+    return np.where(np.isnan(valores), tabla.min(), puntos), tabla.max()
+
+
+def _unir_codigos(partes):
+    """
+    Une columnas de códigos (cadenas vacías = sin código) separándolas con comas
+    """
+    resultado = np.full(len(partes[0]) if partes else 0, "", dtype=object)
+    for parte in partes:
+        resultado = np.where(
+            parte == "", resultado, np.where(resultado == "", parte, resultado + "," + parte)
+        )
+    return resultado
+
+
+def evaluar_bloque(df, modelo, hoy=None, fecha_evaluacion=None, codigos_por_fila=2):
+    """
+    Aplica el modelo a un bloque de solicitudes
+
+    Args:
+        df (pandas.DataFrame): Ver calcular_variables; además necesita `id`
+        modelo (dict): Modelo con la forma de MODELO
+        hoy (date): Fecha de referencia para la edad
+        fecha_evaluacion (datetime): Momento que se anota en cada resultado
+        codigos_por_fila (int): Variables con más puntos perdidos que se
+            reportan como motivo
+
+    Returns:
+        pandas.DataFrame: Columnas de la tabla evaluaciones_credito
+    """
+    variables = calcular_variables(df, hoy)
+    n = len(df)
+    puntaje = np.full(n, float(modelo["puntaje_base"]))
+    perdidos, codigos = [], []
+    for variable, tramo in modelo["tarjeta"].items():
+        puntos, maximo = _puntos_variable(variables[variable], tramo)
+        puntaje += puntos
+        perdidos.append(maximo - puntos)
+        codigos.append(tramo["codigo"])
+
+    # Motivos: las variables que más puntos restaron respecto a su máximo
+    partes = []
+    if perdidos and codigos_por_fila:
+        perdidos = np.column_stack(perdidos)
+        orden = np.argsort(-perdidos, axis=1, kind="stable")[:, :codigos_por_fila]
+        codigos = np.asarray(codigos, dtype=object)
+        for k in range(orden.shape[1]):
+            perdida = np.take_along_axis(perdidos, orden[:, k:k + 1], axis=1)[:, 0]
+            partes.append(np.where(perdida > 0, codigos[orden[:, k]], ""))
+
+    recomendacion = np.select(
+        [puntaje >= modelo["corte_aprobar"], puntaje >= modelo["corte_revisar"]],
+        ["Aprobar", "Revisar"], "Rechazar",
+    ).astype(object)
+    for regla in modelo.get("reglas", []):
+        activa = variables.eval(regla["condicion"]).fillna(False).to_numpy(dtype=bool)
+        if regla["recomendacion"] == "Rechazar":
+            recomendacion[activa] = "Rechazar"
+        elif regla["recomendacion"] == "Revisar":
+            recomendacion[activa & (recomendacion == "Aprobar")] = "Revisar"
+        partes.append(np.where(activa, regla["codigo"], ""))
+
+    codigos_motivo = _unir_codigos(partes)
+    return pd.DataFrame({
+        "id": df["id"].to_numpy(),
+        "puntaje": np.round(puntaje).astype("int64"),
+        "recomendacion": recomendacion,
+        "codigos_motivo": np.where(codigos_motivo == "", None, codigos_motivo),
+        "version_modelo": modelo["version"],
+        "fecha_evaluacion": pd.Timestamp(fecha_evaluacion or datetime.now(timezone.utc)),
+    }, columns=COLUMNAS_EVALUACIONES)
+
+
+def evaluar_pendientes(procesos=PROCESOS, tamano_bloque=TAMANO_BLOQUE, modelo=None, guardar=True, progreso=None):
+    """
+    Evalúa todas las solicitudes pendientes sin evaluación
+
+    La lectura y la escritura se hacen en este proceso; el cálculo se reparte
+    entre `procesos` procesos, con a lo sumo dos bloques por proceso en vuelo
+    para que la memoria no crezca con el tamaño de la cartera.
+
+    Args:
+        procesos (int): Procesos de cálculo (1 = todo en este proceso)
+        tamano_bloque (int): Solicitudes por bloque
+        modelo (dict): Modelo a aplicar; por defecto cargar_modelo()
+        guardar (bool): Si es False solo calcula y resume
+        progreso (callable): Se llama con el resumen parcial después de cada bloque
+
+    Returns:
+        dict: Solicitudes evaluadas, guardadas, conteo por recomendación,
+            bloques, segundos y solicitudes por segundo
+    """
+    from storage import contar_solicitudes_por_cedula, iterar_pendientes_sin_evaluar, guardar_evaluaciones
+
+    modelo = modelo or cargar_modelo()
+    inicio = time.perf_counter()
+    hoy = date.today()
+    fecha_evaluacion = datetime.now(timezone.utc)
+    resumen = {"evaluadas": 0, "guardadas": 0, "bloques": 0, "segundos": 0.0, "por_segundo": 0.0,
+               **{r: 0 for r in RECOMENDACIONES}}
+
+    conteos = contar_solicitudes_por_cedula()
+
+    def terminar(resultado):
+        if guardar:
+            resumen["guardadas"] += guardar_evaluaciones(resultado)
+        resumen["evaluadas"] += len(resultado)
+        resumen["bloques"] += 1
+        for recomendacion, cantidad in resultado["recomendacion"].value_counts().items():
+            resumen[recomendacion] += int(cantidad)
+        resumen["segundos"] = time.perf_counter() - inicio
+        resumen["por_segundo"] = resumen["evaluadas"] / resumen["segundos"] if resumen["segundos"] else 0.0
+        if progreso:
+            progreso(dict(resumen))
+
+    bloques = (
+        bloque.assign(solicitudes_cedula=bloque["cedula"].map(conteos).fillna(1).to_numpy())
+        for bloque in iterar_pendientes_sin_evaluar(tamano_bloque)
+    )
+    if procesos <= 1:
+        for bloque in bloques:
+            terminar(evaluar_bloque(bloque, modelo, hoy, fecha_evaluacion))
+        return resumen
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        en_vuelo = deque()
+        for bloque in bloques:
+            en_vuelo.append(pool.submit(evaluar_bloque, bloque, modelo, hoy, fecha_evaluacion))
+            while len(en_vuelo) >= 2 * procesos:
+                terminar(en_vuelo.popleft().result())
+        while en_vuelo:
+            terminar(en_vuelo.popleft().result())
+    return resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evalúa en lote las solicitudes pendientes")
+    parser.add_argument("--procesos", type=int, default=PROCESOS, help="Procesos de cálculo")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="Solicitudes por bloque")
+    parser.add_argument("--modelo", default=MODELO_PATH, help="JSON con el modelo (por defecto, MODELO)")
+    parser.add_argument("--sin-guardar", action="store_true", help="Solo calcula y muestra el resumen")
+    args = parser.parse_args()
+
+    resumen = evaluar_pendientes(
+        procesos=args.procesos, tamano_bloque=args.bloque, modelo=cargar_modelo(args.modelo),
+        guardar=not args.sin_guardar,
+        progreso=lambda r: print(f"🔄 Bloque {r['bloques']}: {r['evaluadas']:,} evaluadas ({r['por_segundo']:,.0f}/s)"),
+    )
+    print(f"\n✅ {resumen['evaluadas']:,} solicitudes evaluadas en {resumen['segundos']:.1f} s "
+          f"({resumen['por_segundo']:,.0f}/s), {resumen['guardadas']:,} guardadas")
+    print("   " + "  ".join(f"{r}: {resumen[r]:,}" for r in RECOMENDACIONES))
@@ -0,0 +1,219 @@
+"""
+Exportación de solicitudes a CSV o Parquet para auditorías y reguladores.
+
+Las filas se leen del backend por páginas (storage.iterar_solicitudes, una
+sola consulta), pasan por un generador que opcionalmente enmascara los datos
+personales y se escriben en bloques: el CSV se va agregando al archivo y en
+Parquet cada página es un row group. La memoria usada depende del tamaño del
+bloque, no del número de filas exportadas.
+
+Se aplican los mismos filtros del listado (ver consultas.py). Sin rango de
+fechas se exporta toda la tabla, salvo que se pida una ventana de días.
+
+Con el enmascarado, cédula y teléfono conservan solo sus últimos 4 dígitos y
+el email solo su primera letra y el dominio.
+
+Uso:
+    python exportar_solicitudes.py solicitudes.parquet
+    python exportar_solicitudes.py aprobadas.csv --estado Aprobada --desde 2024-01-01 --enmascarar
+    python exportar_solicitudes.py cartera.csv --tipo Personal --tipo Vehicular --bloque 50000
+"""
+
+import argparse
+import csv
+import os
+import time
+from datetime import date
+from schema import COLUMNAS, SCHEMA_SOLICITUDES
+from consultas import columnas_proyectadas
+
+TAMANO_BLOQUE = 10000
+
+FORMATOS = ("csv", "parquet")
+
+MIME = {"csv": "text/csv", "parquet": "application/octet-stream"}
+
+COLUMNAS_PII = ("cedula", "telefono", "email")
+
+# Cada dígito que tenga al menos otros 4 después
+_DIGITO_OCULTO = r"\d(?=(?:\D*\d){4})"
+
+
+def enmascarar_pii(df):
+    """
+    Oculta los datos personales de un bloque, en el mismo DataFrame
+
+    Returns:
+        pandas.DataFrame: El mismo DataFrame
+    """
+    for columna in ("cedula", "telefono"):
+        if columna in df:
+            df[columna] = df[columna].str.replace(_DIGITO_OCULTO, "*", regex=True)
+    if "email" in df:
+        df["email"] = df["email"].str.replace(r"^([^@])[^@]*@", r"\1***@", regex=True)
+    return df
+
+
+class EscritorCSV:
+    """
+    Agrega bloques a un CSV; el encabezado se escribe al abrir, así un
+    resultado vacío también produce un archivo válido
+    """
+
+    def __init__(self, path, columnas):
+        self._archivo = open(path, "w", newline="", encoding="utf-8")
+        csv.writer(self._archivo).writerow(columnas)
+
+    def escribir(self, df):
+        df.to_csv(self._archivo, header=False, index=False)
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class EscritorParquet:
+    """
+    Escribe cada bloque como un row group de un Parquet
+
+    El esquema sale de SCHEMA_SOLICITUDES y no del primer bloque: compactar()
+    puede elegir tipos distintos en cada página (float32 o float64 para el
+    monto, categorías con más o menos valores), y todas tienen que coincidir.
+    """
+
+    def __init__(self, path, columnas):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tipos = {
+            "STRING": pa.string(),
+            "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+            "DATE": pa.date32(),
+            "FLOAT64": pa.float64(),
+            "INTEGER": pa.int64(),
+        }
+        self._pa = pa
+        self._schema = pa.schema([
+            pa.field(c.name, tipos[c.field_type], nullable=c.mode != "REQUIRED")
+            for c in SCHEMA_SOLICITUDES if c.name in columnas
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def escribir(self, df):
+        tabla = self._pa.Table.from_pandas(df, preserve_index=False)
+        self._writer.write_table(tabla.select(self._schema.names).cast(self._schema))
+
+    def cerrar(self):
+        self._writer.close()
+
+
+ESCRITORES = {"csv": EscritorCSV, "parquet": EscritorParquet}
+
+
+def formato_de(path):
+    """
+    Deduce el formato por la extensión del archivo
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension not in FORMATOS:
+        raise ValueError(f"Formato no admitido: '{extension}' (use {', '.join(FORMATOS)})")
+    return extension
+
+
+def iterar_bloques(filtros=None, columnas=None, enmascarar=False, tamano_bloque=TAMANO_BLOQUE,
+                   ventana_dias=0, iterar_fn=None):
+    """
+    Bloques de solicitudes listos para escribir
+
+    Yields:
+        pandas.DataFrame: Página leída del backend, enmascarada si se pidió
+    """
+    if iterar_fn is None:
+        from storage import iterar_solicitudes
+        iterar_fn = iterar_solicitudes
+    for bloque in iterar_fn(filtros, columnas, tamano_bloque, ventana_dias):
+        yield enmascarar_pii(bloque) if enmascarar else bloque
+
+
+def exportar(path, formato=None, filtros=None, columnas=None, enmascarar=False, tamano_bloque=TAMANO_BLOQUE,
+             ventana_dias=0, iterar_fn=None, progreso=None):
+    """
+    Exporta las solicitudes que cumplen los filtros a un archivo
+
+    Args:
+        path (str): Archivo de destino
+        formato (str): "csv" o "parquet"; por defecto, según la extensión
+        filtros (dict): Mismos filtros que el listado
+        columnas (list): Columnas a exportar (por defecto todas)
+        enmascarar (bool): Ocultar cédula, teléfono y email
+        tamano_bloque (int): Filas por página leída y por bloque escrito
+        ventana_dias (int): Días hacia atrás si no hay fecha_desde (0 = toda la tabla)
+        iterar_fn (callable): Fuente de las páginas; por defecto el backend
+            configurado en storage
+        progreso (callable): Se llama con el resumen parcial después de cada bloque
+
+    Returns:
+        dict: Filas y bloques escritos, bytes del archivo, segundos y filas/segundo
+    """
+    formato = formato or formato_de(path)
+    columnas = columnas_proyectadas(columnas or COLUMNAS)
+    resumen = {"filas": 0, "bloques": 0, "bytes": 0, "segundos": 0.0, "filas_por_segundo": 0.0,
+               "path": path, "formato": formato, "enmascarado": enmascarar}
+    inicio = time.perf_counter()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    escritor = ESCRITORES[formato](path, columnas)
+    try:
+        for bloque in iterar_bloques(filtros, columnas, enmascarar, tamano_bloque, ventana_dias, iterar_fn):
+            escritor.escribir(bloque)
+            resumen["filas"] += len(bloque)
+            resumen["bloques"] += 1
+            resumen["segundos"] = time.perf_counter() - inicio
+            resumen["filas_por_segundo"] = resumen["filas"] / resumen["segundos"] if resumen["segundos"] else 0.0
+            if progreso:
+                progreso(dict(resumen))
+    finally:
+        escritor.cerrar()
+
+    resumen["bytes"] = os.path.getsize(path)
+    resumen["segundos"] = time.perf_counter() - inicio
+    resumen["filas_por_segundo"] = resumen["filas"] / resumen["segundos"] if resumen["segundos"] else 0.0
+    return resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta solicitudes de préstamo a CSV o Parquet")
+    parser.add_argument("archivo", help="Archivo .csv o .parquet de destino")
+    parser.add_argument("--formato", choices=FORMATOS, help="Por defecto, según la extensión del archivo")
+    parser.add_argument("--estado", action="append", help="Se puede repetir")
+    parser.add_argument("--tipo", action="append", help="Tipo de préstamo; se puede repetir")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Fecha de solicitud inicial (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="Fecha de solicitud final (AAAA-MM-DD)")
+    parser.add_argument("--monto-min", type=float)
+    parser.add_argument("--monto-max", type=float)
+    parser.add_argument("--cedula")
+    parser.add_argument("--columnas", help="Lista separada por comas (por defecto todas)")
+    parser.add_argument("--enmascarar", action="store_true", help="Oculta cédula, teléfono y email")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="Filas por bloque")
+    args = parser.parse_args()
+
+    from validacion import formatear_cedula
+
+    filtros = {
+        "estado": args.estado,
+        "tipo_prestamo": args.tipo,
+        "fecha_desde": args.desde,
+        "fecha_hasta": args.hasta,
+        "monto_min": args.monto_min,
+        "monto_max": args.monto_max,
+        "cedula": formatear_cedula(args.cedula) if args.cedula else None,
+    }
+    resumen = exportar(
+        args.archivo, args.formato, filtros,
+        columnas=args.columnas.split(",") if args.columnas else None,
+        enmascarar=args.enmascarar, tamano_bloque=args.bloque,
+        progreso=lambda r: print(f"🔄 Bloque {r['bloques']}: {r['filas']:,} filas ({r['filas_por_segundo']:,.0f} filas/s)"),
+    )
+    print(f"\n✅ {resumen['filas']:,} solicitudes exportadas en {resumen['segundos']:.1f} s "
+          f"({resumen['filas_por_segundo']:,.0f} filas/s)")
+    print(f"   Archivo: {resumen['path']} ({resumen['bytes'] / 1024 ** 2:.1f} MB)"
+          f"{' · datos personales enmascarados' if resumen['enmascarado'] else ''}")
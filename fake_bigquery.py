@@ -0,0 +1,546 @@
+"""
+Cliente falso de BigQuery respaldado por SQLite en memoria.
+
+Implementa el subconjunto de `bigquery.Client` que usa esta aplicación
+(query, insert_rows_json, load_table_from_dataframe, get_table, create_table,
+update_table, delete_table, copy_table)
+para poder medir y probar el código sin un proyecto de GCP. Las consultas se
+traducen al dialecto de SQLite, así que solo funcionan las que escribimos en
+SQL estándar (más FORMAT_TIMESTAMP, que se registra como función, y la vista
+INFORMATION_SCHEMA.PARTITIONS, que se arma con los conteos por día); los MERGE
+de la forma que arma gcp_config.sql_merge se traducen a un UPDATE ... FROM
+más un INSERT ... SELECT. Los scripts de varias sentencias separadas por `;`
+(con BEGIN/COMMIT TRANSACTION) se ejecutan en orden y retornan el resultado
+de la última.
+
+Las consultas en modo dry-run estiman los bytes procesados con las reglas de
+facturación de BigQuery (2 bytes + largo UTF-8 por STRING, 8 bytes por los
+demás tipos) sobre las columnas referenciadas, y en tablas particionadas solo
+cuentan las particiones que sobreviven a los filtros sobre el campo de
+partición.
+
+Para pruebas de carga, cada llamada puede esperar una latencia simulada
+(`latencia` segundos, ±50 %) y fallar con ServiceUnavailable con
+probabilidad `tasa_error`. La espera ocurre fuera del lock, así que las
+llamadas concurrentes se solapan como lo harían contra la red.
+
+Uso:
+    from fake_bigquery import FakeBigQueryClient, generar_solicitudes
+    client = FakeBigQueryClient()
+    gcp_config.configurar_cliente(lambda: client)
+"""
+
+import copy
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from google.api_core import exceptions
+from storage import timestamp_utc
+from schema import TIPOS_PRESTAMO
+
+_TABLA_RE = re.compile(r"`([\w-]+)\.(\w+)\.(\w+)`")
+_PARTICIONES_RE = re.compile(r"`([\w-]+)\.(\w+)\.INFORMATION_SCHEMA\.PARTITIONS`", re.IGNORECASE)
+
+_TIPOS_SQLITE = {"STRING": "TEXT", "TIMESTAMP": "TEXT", "DATE": "TEXT", "FLOAT64": "REAL",
+                 "FLOAT": "REAL", "INTEGER": "INTEGER", "INT64": "INTEGER", "BOOLEAN": "INTEGER"}
+
+
+def _id_completo(table, project):
+    """
+    Normaliza Table, TableReference o "proyecto.dataset.tabla" a texto
+    """
+    if isinstance(table, str):
+        partes = table.replace(":", ".").split(".")
+        return ".".join([project] + partes if len(partes) == 2 else partes)
+    return f"{table.project}.{table.dataset_id}.{table.table_id}"
+
+
+def _nombre_sqlite(id_completo):
+    return "t_" + re.sub(r"\W", "_", id_completo)
+
+
+def _a_sqlite(valor, tipo):
+    if valor is None:
+        return None
+    if tipo == "TIMESTAMP":
+        return timestamp_utc(valor)
+    if tipo == "DATE":
+        return str(valor)
+    return valor
+
+
+def _format_timestamp(formato, valor):
+    # Funciones de BigQuery que SQLite no tiene; los TIMESTAMP se guardan como texto ISO en UTC
+    if valor is None:
+        return None
+    return datetime.fromisoformat(valor).strftime(formato)
+
+
+class FakeTable:
+    """
+    Metadatos de una tabla falsa, con los mismos atributos que bigquery.Table
+    """
+
+    def __init__(self, id_completo, schema, time_partitioning=None, clustering_fields=None):
+        self.project, self.dataset_id, self.table_id = id_completo.split(".")
+        self.full_table_id = id_completo
+        self.schema = list(schema)
+        self.time_partitioning = time_partitioning
+        self.clustering_fields = list(clustering_fields) if clustering_fields else None
+        self.created = self.modified = datetime.now(timezone.utc)
+        self.num_rows = 0
+
+    @property
+    def tipos(self):
+        return {campo.name: campo.field_type for campo in self.schema}
+
+
+class FakeQueryJob:
+    """
+    Resultado de una consulta con la interfaz de bigquery.QueryJob
+    """
+
+    def __init__(self, df, total_bytes_processed=0, num_dml_affected_rows=None):
+        self._df = df
+        self.total_bytes_processed = total_bytes_processed
+        self.total_bytes_billed = 0 if not total_bytes_processed else max(
+            10 * 1024 * 1024, -(-total_bytes_processed // (1024 * 1024)) * 1024 * 1024
+        )
+        self.num_dml_affected_rows = num_dml_affected_rows
+        self.slot_millis = 0
+        self.cache_hit = False
+
+    def result(self, *args, page_size=None, **kwargs):
+        return _FakeRowIterator(self._df, page_size)
+
+    def to_dataframe(self, *args, **kwargs):
+        return self._df.copy()
+
+    def to_arrow(self, *args, **kwargs):
+        import pyarrow as pa
+        return pa.Table.from_pandas(self._df, preserve_index=False)
+
+
+class _FakeRowIterator(list):
+    """
+    Filas de un resultado, con la lectura por páginas de bigquery.table.RowIterator
+    """
+
+    def __init__(self, df, page_size=None):
+        super().__init__(tuple(fila) for fila in df.itertuples(index=False))
+        self._df = df
+        self._page_size = page_size or max(len(df), 1)
+
+    def to_dataframe_iterable(self, *args, **kwargs):
+        for inicio in range(0, len(self._df), self._page_size):
+            yield self._df.iloc[inicio:inicio + self._page_size].reset_index(drop=True)
+
+    def to_arrow_iterable(self, *args, **kwargs):
+        import pyarrow as pa
+        for pagina in self.to_dataframe_iterable():
+            yield pa.RecordBatch.from_pandas(pagina, preserve_index=False)
+
+
+class _FakeCopyJob:
+    def result(self, *args, **kwargs):
+        return self
+
+
+class _FakeLoadJob:
+    def __init__(self, output_rows):
+        self.output_rows = output_rows
+
+    def result(self, *args, **kwargs):
+        return self
+
+
+class FakeBigQueryClient:
+    """
+    Cliente falso en memoria.
+
+    Args:
+        project (str): Proyecto que se asume en los ids de tabla sin proyecto
+        latencia (float): Segundos que tarda en promedio cada llamada
+        tasa_error (float): Probabilidad (0-1) de que una llamada falle
+        semilla (int): Semilla de la latencia y los errores simulados
+
+    `latencia` y `tasa_error` se pueden cambiar después, por ejemplo para
+    cargar los datos iniciales sin demora.
+    """
+
+    def __init__(self, project="proyecto-falso", latencia=0.0, tasa_error=0.0, semilla=None):
+        self.project = project
+        self.latencia = latencia
+        self.tasa_error = tasa_error
+        self._azar = random.Random(semilla)
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.create_function("FORMAT_TIMESTAMP", 2, _format_timestamp, deterministic=True)
+        self._lock = threading.RLock()
+        self._tablas = {}
+        self.llamadas = {"query": 0, "insert_rows_json": 0, "get_table": 0, "create_table": 0}
+
+    def _simular_red(self):
+        if self.latencia:
+            time.sleep(self.latencia * self._azar.uniform(0.5, 1.5))
+        if self.tasa_error and self._azar.random() < self.tasa_error:
+            raise exceptions.ServiceUnavailable("Error simulado por FakeBigQueryClient")
+
+    # ---------- Tablas ----------
+
+    def _tabla(self, table):
+        id_completo = _id_completo(table, self.project)
+        if id_completo not in self._tablas:
+            raise exceptions.NotFound(f"Not found: Table {id_completo}")
+        return self._tablas[id_completo]
+
+    def get_table(self, table, **kwargs):
+        self._simular_red()
+        self.llamadas["get_table"] += 1
+        with self._lock:
+            tabla = self._tabla(table)
+            tabla.num_rows = self._conn.execute(
+                f"SELECT COUNT(*) FROM {_nombre_sqlite(tabla.full_table_id)}"
+            ).fetchone()[0]
+            # Como BigQuery, una copia: cambiarla no cambia la tabla hasta update_table
+            copia = copy.copy(tabla)
+            copia.schema = list(tabla.schema)
+            return copia
+
+    def create_table(self, table, exists_ok=False, **kwargs):
+        self._simular_red()
+        self.llamadas["create_table"] += 1
+        id_completo = _id_completo(table, self.project)
+        with self._lock:
+            if id_completo in self._tablas:
+                if exists_ok:
+                    return self._tablas[id_completo]
+                raise exceptions.Conflict(f"Already Exists: Table {id_completo}")
+            tabla = FakeTable(id_completo, table.schema, getattr(table, "time_partitioning", None),
+                              getattr(table, "clustering_fields", None))
+            columnas = ", ".join(f"{c.name} {_TIPOS_SQLITE.get(c.field_type, 'TEXT')}" for c in tabla.schema)
+            self._conn.execute(f"CREATE TABLE {_nombre_sqlite(id_completo)} ({columnas})")
+            self._tablas[id_completo] = tabla
+            return tabla
+
+    def update_table(self, table, fields, **kwargs):
+        """
+        Actualiza los metadatos de una tabla; en el esquema solo se admiten
+        columnas nuevas al final, como en BigQuery
+        """
+        self._simular_red()
+        with self._lock:
+            tabla = self._tabla(table)
+            if "schema" in fields:
+                actuales = [campo.name for campo in tabla.schema]
+                nuevo = list(table.schema)
+                if [campo.name for campo in nuevo[:len(actuales)]] != actuales:
+                    raise exceptions.BadRequest("Solo se pueden agregar columnas al final del esquema")
+                for campo in nuevo[len(actuales):]:
+                    if campo.mode == "REQUIRED":
+                        raise exceptions.BadRequest(f"No se puede agregar la columna REQUIRED {campo.name}")
+                    self._conn.execute(
+                        f"ALTER TABLE {_nombre_sqlite(tabla.full_table_id)} "
+                        f"ADD COLUMN {campo.name} {_TIPOS_SQLITE.get(campo.field_type, 'TEXT')}"
+                    )
+                tabla.schema = nuevo
+            for campo in fields:
+                if campo != "schema":
+                    setattr(tabla, campo, getattr(table, campo))
+            tabla.modified = datetime.now(timezone.utc)
+            return tabla
+
+    def delete_table(self, table, not_found_ok=False, **kwargs):
+        self._simular_red()
+        id_completo = _id_completo(table, self.project)
+        with self._lock:
+            if id_completo not in self._tablas:
+                if not_found_ok:
+                    return
+                raise exceptions.NotFound(f"Not found: Table {id_completo}")
+            self._conn.execute(f"DROP TABLE {_nombre_sqlite(id_completo)}")
+            del self._tablas[id_completo]
+
+    def copy_table(self, sources, destination, **kwargs):
+        """
+        Copia una tabla conservando su esquema, particionado y clustering
+        """
+        self._simular_red()
+        with self._lock:
+            origen = self._tabla(sources)
+            copia = FakeTable(_id_completo(destination, self.project), origen.schema)
+            copia.time_partitioning = origen.time_partitioning
+            copia.clustering_fields = origen.clustering_fields
+            self.create_table(copia)
+            self._conn.execute(
+                f"INSERT INTO {_nombre_sqlite(copia.full_table_id)} "
+                f"SELECT * FROM {_nombre_sqlite(origen.full_table_id)}"
+            )
+            return _FakeCopyJob()
+
+    def insert_rows_json(self, table, json_rows, row_ids=None, **kwargs):
+        self._simular_red()
+        self.llamadas["insert_rows_json"] += 1
+        with self._lock:
+            tabla = self._tabla(table)
+            self._insertar(tabla, json_rows)
+        return []
+
+    def _insertar(self, tabla, filas):
+        tipos = tabla.tipos
+        columnas = list(tipos)
+        self._conn.executemany(
+            f"INSERT INTO {_nombre_sqlite(tabla.full_table_id)} ({', '.join(columnas)}) "
+            f"VALUES ({', '.join('?' for _ in columnas)})",
+            [tuple(_a_sqlite(fila.get(c), tipos[c]) for c in columnas) for fila in filas],
+        )
+        tabla.modified = datetime.now(timezone.utc)
+
+    def load_table_from_dataframe(self, dataframe, destination, job_config=None, **kwargs):
+        self._simular_red()
+        with self._lock:
+            tabla = self._tabla(destination)
+            filas = dataframe.astype(object).where(dataframe.notna(), None).to_dict("records")
+            self._insertar(tabla, filas)
+        return _FakeLoadJob(len(filas))
+
+    # ---------- Consultas ----------
+
+    def query(self, query, job_config=None, **kwargs):
+        self._simular_red()
+        self.llamadas["query"] += 1
+        with self._lock:
+            sentencias = [sentencia for sentencia in query.split(";") if sentencia.strip()]
+            if len(sentencias) > 1:
+                return self._script(sentencias, job_config)
+            return self._consulta(query, job_config)
+
+    def _script(self, sentencias, job_config):
+        """
+        Ejecuta un script de varias sentencias y retorna el resultado de la
+        última, como BigQuery. Si una sentencia falla dentro de BEGIN/COMMIT
+        TRANSACTION, se deshacen las anteriores de la transacción.
+        """
+        resultado = None
+        en_transaccion = False
+        try:
+            for sentencia in sentencias:
+                control = re.match(r"\s*(BEGIN|COMMIT|ROLLBACK)\b", sentencia, re.IGNORECASE)
+                if control:
+                    # La conexión deja las escrituras previas en una transacción implícita
+                    # que nunca se confirma; se confirma aquí para no deshacerlas
+                    if control.group(1).upper() == "ROLLBACK":
+                        self._conn.rollback()
+                    else:
+                        self._conn.commit()
+                    en_transaccion = control.group(1).upper() == "BEGIN"
+                    continue
+                resultado = self._consulta(sentencia, job_config)
+        except Exception:
+            if en_transaccion:
+                self._conn.rollback()
+            raise
+        return resultado
+
+    def _consulta(self, query, job_config):
+        query = _PARTICIONES_RE.sub(lambda m: self._vista_particiones(*m.groups()), query)
+        tablas = [self._tabla(".".join(m)) for m in _TABLA_RE.findall(query)]
+        sql = _TABLA_RE.sub(lambda m: _nombre_sqlite(".".join(m.groups())), query)
+        sql = re.sub(r"@(\w+)", r":\1", sql)
+        parametros = {
+            p.name: _a_sqlite(p.value, p.type_)
+            for p in (getattr(job_config, "query_parameters", None) or [])
+        }
+
+        if job_config is not None and job_config.dry_run:
+            return FakeQueryJob(pd.DataFrame(), self._estimar_bytes(sql, parametros, tablas))
+
+        bytes_procesados = self._estimar_bytes(sql, parametros, tablas)
+        if re.match(r"\s*MERGE\b", sql, re.IGNORECASE):
+            afectadas = sum(self._conn.execute(sentencia, parametros).rowcount for sentencia in _traducir_merge(sql))
+            tablas[0].modified = datetime.now(timezone.utc)
+            return FakeQueryJob(pd.DataFrame(), bytes_procesados, afectadas)
+
+        cursor = self._conn.execute(sql, parametros)
+        if cursor.description is None:
+            for tabla in tablas:
+                tabla.modified = datetime.now(timezone.utc)
+            return FakeQueryJob(pd.DataFrame(), bytes_procesados, cursor.rowcount)
+
+        df = pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+        df = self._convertir_tipos(df, tablas)
+
+        destino = getattr(job_config, "destination", None) if job_config is not None else None
+        if destino is not None:
+            tabla_destino = self._tabla(destino)
+            if job_config.write_disposition == "WRITE_TRUNCATE":
+                self._conn.execute(f"DELETE FROM {_nombre_sqlite(tabla_destino.full_table_id)}")
+            self._insertar(tabla_destino, df.to_dict("records"))
+        return FakeQueryJob(df, bytes_procesados)
+
+    def _vista_particiones(self, project, dataset):
+        """
+        Subconsulta con las columnas table_name, partition_id y total_rows de
+        INFORMATION_SCHEMA.PARTITIONS para las tablas de un dataset
+        """
+        partes = ["SELECT NULL AS table_name, NULL AS partition_id, 0 AS total_rows WHERE 0"]
+        for tabla in self._tablas.values():
+            if (tabla.project, tabla.dataset_id) != (project, dataset):
+                continue
+            nombre = _nombre_sqlite(tabla.full_table_id)
+            particion = tabla.time_partitioning
+            if particion is not None and particion.field:
+                # Particiones diarias (AAAAMMDD) sobre el TIMESTAMP guardado como texto ISO en UTC
+                partes.append(
+                    f"SELECT '{tabla.table_id}', replace(substr({particion.field}, 1, 10), '-', ''), COUNT(*) "
+                    f"FROM {nombre} GROUP BY 2"
+                )
+            else:
+                partes.append(f"SELECT '{tabla.table_id}', NULL, COUNT(*) FROM {nombre}")
+        return f"({' UNION ALL '.join(partes)})"
+
+    @staticmethod
+    def _convertir_tipos(df, tablas):
+        tipos = {}
+        for tabla in tablas:
+            tipos.update(tabla.tipos)
+        for columna in df.columns:
+            if tipos.get(columna) == "TIMESTAMP":
+                df[columna] = pd.to_datetime(df[columna], utc=True, format="ISO8601")
+            elif tipos.get(columna) == "DATE":
+                df[columna] = pd.to_datetime(df[columna]).dt.date
+        return df
+
+    def _estimar_bytes(self, sql, parametros, tablas):
+        if len(tablas) != 1:
+            # Para varias tablas se cuenta cada una completa
+            return sum(self._bytes_tabla(t, sql, "1", {}) for t in tablas)
+        tabla = tablas[0]
+        where = "1"
+        particion = tabla.time_partitioning
+        if particion is not None and particion.field:
+            condiciones = [c for c in _condiciones_where(sql) if re.search(rf"\b{particion.field}\b", c)]
+            if condiciones:
+                nombre = _nombre_sqlite(tabla.full_table_id)
+                # Se leen completas las particiones (días) con alguna fila que cumpla
+                where = (
+                    f"substr({particion.field}, 1, 10) IN (SELECT DISTINCT substr({particion.field}, 1, 10) "
+                    f"FROM {nombre} WHERE {' AND '.join(condiciones)})"
+                )
+        return self._bytes_tabla(tabla, sql, where, parametros)
+
+    def _bytes_tabla(self, tabla, sql, where, parametros):
+        if re.search(r"SELECT\s+\*", sql, re.IGNORECASE):
+            columnas = tabla.schema
+        else:
+            columnas = [c for c in tabla.schema if re.search(rf"\b{c.name}\b", sql)]
+        if not columnas:
+            return 0
+        expresiones = [
+            f"COALESCE(2 + length(CAST({c.name} AS BLOB)), 0)" if c.field_type == "STRING"
+            else f"(CASE WHEN {c.name} IS NULL THEN 0 ELSE 8 END)"
+            for c in columnas
+        ]
+        total = self._conn.execute(
+            f"SELECT SUM({' + '.join(expresiones)}) FROM {_nombre_sqlite(tabla.full_table_id)} WHERE {where}",
+            {k: v for k, v in parametros.items() if f":{k}" in where},
+        ).fetchone()[0]
+        return int(total or 0)
+
+
+_MERGE_RE = re.compile(
+    r"\s*MERGE\s+(?:INTO\s+)?(?P<destino>\w+)\s+(?:AS\s+)?(?P<t>\w+)"
+    r"\s+USING\s+(?P<origen>\w+)\s+(?:AS\s+)?(?P<s>\w+)"
+    r"\s+ON\s+(?P<on>.*?)"
+    r"\s+WHEN\s+MATCHED(?:\s+AND\s+(?P<condicion>.*?))?\s+THEN\s+UPDATE\s+SET\s+(?P<set>.*?)"
+    r"(?:\s+WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s*\((?P<columnas>[^)]*)\)\s*VALUES\s*\((?P<valores>[^)]*)\))?"
+    r"\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def _traducir_merge(sql):
+    """
+    Traduce un MERGE sobre tablas (no subconsultas) a sentencias de SQLite
+    """
+    m = _MERGE_RE.match(sql)
+    if not m:
+        raise exceptions.BadRequest(f"MERGE no soportado por el cliente falso: {sql}")
+    destino, t, origen, s = m.group("destino", "t", "origen", "s")
+    condicion = m.group("on") + (f" AND ({m.group('condicion')})" if m.group("condicion") else "")
+    # El UPDATE va primero para no tocar las filas que inserta el mismo MERGE
+    sentencias = [f"UPDATE {destino} AS {t} SET {m.group('set')} FROM {origen} AS {s} WHERE {condicion}"]
+    if m.group("columnas"):
+        sentencias.append(
+            f"INSERT INTO {destino} ({m.group('columnas')}) SELECT {m.group('valores')} FROM {origen} AS {s} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {destino} AS {t} WHERE {m.group('on')})"
+        )
+    return sentencias
+
+
+def _condiciones_where(sql):
+    """
+    Separa la cláusula WHERE en sus condiciones AND de primer nivel
+    """
+    coincidencia = re.search(r"\bWHERE\b(.*?)(\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)", sql,
+                             re.IGNORECASE | re.DOTALL)
+    if not coincidencia:
+        return []
+    texto, condiciones, nivel, inicio = coincidencia.group(1), [], 0, 0
+    for m in re.finditer(r"\(|\)|\bAND\b", texto, re.IGNORECASE):
+        if m.group() == "(":
+            nivel += 1
+        elif m.group() == ")":
+            nivel -= 1
+        elif nivel == 0:
+            condiciones.append(texto[inicio:m.start()].strip())
+            inicio = m.end()
+    condiciones.append(texto[inicio:].strip())
+    return [c for c in condiciones if c]
+
+
+# ---------- Datos sintéticos ----------
+
+OCUPACIONES = ["Contador", "Ingeniero", "Docente", "Comerciante", "Enfermera", "Chofer", "Abogado"]
+NOMBRES = ["Juan Pérez", "María Rodríguez", "José Martínez", "Ana García", "Luis Fernández", "Carmen Gómez"]
+
+
+def generar_solicitudes(cantidad, dias=365, hasta=None, semilla=None):
+    """
+    Genera solicitudes sintéticas repartidas en los últimos `dias` días
+
+    Args:
+        cantidad (int): Número de filas a generar
+        dias (int): Días hacia atrás sobre los que se reparten las fechas
+        hasta (datetime): Fecha de la solicitud más reciente (por defecto ahora)
+        semilla (int): Semilla para que los datos sean reproducibles
+
+    Returns:
+        list: Filas con el formato de `insert_rows_json`
+    """
+    azar = random.Random(semilla)
+    hasta = hasta or datetime.now(timezone.utc)
+    filas = []
+    for _ in range(cantidad):
+        cedula = f"{azar.randrange(10**11):011d}"
+        telefono = f"809{azar.randrange(10**7):07d}"
+        filas.append({
+            "id": str(uuid.UUID(int=azar.getrandbits(128), version=4)),
+            "fecha_solicitud": (hasta - timedelta(seconds=azar.uniform(0, dias * 86400))).isoformat(),
+            "nombre": azar.choice(NOMBRES),
+            "cedula": f"({cedula[:3]}) {cedula[3:10]}-{cedula[10:]}",
+            "telefono": f"({telefono[:3]}) {telefono[3:6]}-{telefono[6:]}",
+            "email": None if azar.random() < 0.3 else f"socio{azar.randrange(10**6)}@correo.com",
+            "fecha_nacimiento": str(datetime(1950, 1, 1).date() + timedelta(days=azar.randrange(20000))),
+            "ocupacion": azar.choice(OCUPACIONES),
+            "tipo_prestamo": azar.choice(TIPOS_PRESTAMO),
+            "monto_solicitado": float(azar.randrange(1, 500) * 1000),
+            "plazo_meses": azar.choice(range(6, 121, 6)),
+            "proposito": "Compra de materiales y mejoras para el negocio familiar",
+            "estado": "Pendiente",
+        })
+    return filas
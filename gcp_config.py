@@ -1,84 +1,511 @@
 from google.cloud import bigquery
 from google.oauth2 import service_account
+from google.auth import exceptions as google_auth_exceptions
+from google.api_core import exceptions as google_api_exceptions
 import os
-from dotenv import load_dotenv
-from datetime import datetime
+import threading
+import time
+import weakref
+from configuracion import get_configuracion
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from schema import (
+    TABLE_ID, SCHEMA_SOLICITUDES, CAMPO_PARTICION, CAMPOS_CLUSTERING,
+    EVALUACIONES_TABLE_ID, SCHEMA_EVALUACIONES, HISTORIAL_TABLE_ID, SCHEMA_HISTORIAL,
+    RESUMEN_TABLE_ID, SCHEMA_RESUMEN, COLUMNAS_RESUMEN, ResultadoEsquema, schema_fingerprint, comparar_esquemas,
+)
+from consultas import (
+    construir_where, columnas_proyectadas, separar_pagina, arrow_a_dataframe,
+    validar_dimension, sql_banda_monto, condicion_meses, mes_de,
+)
+from metricas import get_registro, como_operacion, operacion_actual
 
-load_dotenv()
+# Conexión a BigQuery (ver configuracion.py)
+_config = get_configuracion()
+PROJECT_ID = _config.gcp_project_id
+DATASET_ID = _config.bigquery_dataset
+CREDENTIALS_PATH = _config.credenciales_path
 
-# Cargar variables de entorno
-PROJECT_ID = os.getenv("GCP_PROJECT_ID")
-DATASET_ID = os.getenv("BIGQUERY_DATASET")
-TABLE_ID = "solicitudes_prestamo"
-CREDENTIALS_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+HEALTHCHECK_TTL = _config.bigquery_healthcheck_ttl
 
-def get_bigquery_client():
+# Errores que indican que el cliente ya no sirve (credenciales vencidas o
+# conexión caída) y que obligan a reconstruirlo
+ERRORES_DE_CONEXION = (
+    google_auth_exceptions.RefreshError,
+    google_auth_exceptions.TransportError,
+    google_api_exceptions.Unauthenticated,
+    google_api_exceptions.ServiceUnavailable,
+    ConnectionError,
+)
+
+# Registro de métricas del proceso (None si METRICAS_ACTIVAS=false)
+_registro = get_registro()
+
+
+def _medir(operacion, metodo):
+    return _registro.medir(operacion, metodo) if _registro is not None else nullcontext()
+
+
+def _estadisticas_job(job):
+    return {
+        "bytes_procesados": getattr(job, "total_bytes_processed", None),
+        "bytes_facturados": getattr(job, "total_bytes_billed", None),
+        "slot_ms": getattr(job, "slot_millis", None),
+        "cache_aciertos": getattr(job, "cache_hit", None),
+    }
+
+
+def _filas_resultado(job, resultado):
+    for filas in (getattr(job, "num_dml_affected_rows", None), getattr(job, "output_rows", None),
+                  getattr(resultado, "total_rows", None)):
+        if filas is not None:
+            return filas
+    return len(resultado) if hasattr(resultado, "__len__") else None
+
+
+def _registrar_sin_esperar(job, operacion, metodo, inicio):
+    # Sin consultar a BigQuery: la latencia es hasta que se soltó el job y los
+    # costos, los que el job ya conozca
+    _registro.registrar(operacion, metodo, time.perf_counter() - inicio, **_estadisticas_job(job))
+
+
+class _TrabajoMedido:
     """
-    Crea y retorna un cliente de BigQuery autenticado
+    Envuelve un job de BigQuery y registra la llamada cuando termina
+    (result() o to_dataframe()): latencia desde que se lanzó, filas y las
+    estadísticas de costo del job. Un job que nadie espera se registra
+    cuando se suelta.
     """
-    try:
-        if CREDENTIALS_PATH and os.path.exists(CREDENTIALS_PATH):
-            print(f"📁 Usando credenciales de: {CREDENTIALS_PATH}")
-            credentials = service_account.Credentials.from_service_account_file(
-                CREDENTIALS_PATH,
-                scopes=["https://www.googleapis.com/auth/cloud-platform"],
-            )
-            client = bigquery.Client(credentials=credentials, project=PROJECT_ID)
-        else:
-            print("⚠️ No se encontraron credenciales, intentando con las por defecto")
-            client = bigquery.Client(project=PROJECT_ID)
-        
-        # Verificar que el cliente funcione
-        client.query("SELECT 1").result()
+
+    def __init__(self, job, operacion, metodo, inicio, filas=None):
+        self._job = job
+        self._operacion = operacion
+        self._metodo = metodo
+        self._inicio = inicio
+        self._filas = filas
+        self._sin_esperar = weakref.finalize(self, _registrar_sin_esperar, job, operacion, metodo, inicio)
+        self._sin_esperar.atexit = False
+
+    def __getattr__(self, nombre):
+        return getattr(self._job, nombre)
+
+    def result(self, *args, **kwargs):
+        return self._esperar(self._job.result, args, kwargs)
+
+    def to_dataframe(self, *args, **kwargs):
+        return self._esperar(self._job.to_dataframe, args, kwargs)
+
+    def to_arrow(self, *args, **kwargs):
+        return self._esperar(self._job.to_arrow, args, kwargs)
+
+    def _esperar(self, funcion, args, kwargs):
+        if not self._sin_esperar.alive:
+            return funcion(*args, **kwargs)
+        self._sin_esperar.detach()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception as e:
+            _registro.registrar(self._operacion, self._metodo, time.perf_counter() - self._inicio, error=e)
+            raise
+        _registro.registrar(
+            self._operacion, self._metodo, time.perf_counter() - self._inicio,
+            filas=self._filas if self._filas is not None else _filas_resultado(self._job, resultado),
+            **_estadisticas_job(self._job),
+        )
+        return resultado
+
+
+class _ClienteMedido:
+    """
+    Envuelve el cliente de BigQuery y registra cada llamada en metricas.
+
+    La operación es la declarada en curso (metricas.operacion_actual): cada
+    función de este módulo que usa el cliente lleva @como_operacion. Los
+    métodos que no se miden pasan directo al cliente.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, nombre):
+        return getattr(self._client, nombre)
+
+    def _llamar(self, metodo, args, kwargs, filas=None):
+        with _registro.medir(operacion_actual(), metodo) as valores:
+            resultado = getattr(self._client, metodo)(*args, **kwargs)
+            valores["filas"] = filas
+        return resultado
+
+    def _trabajo(self, metodo, args, kwargs, filas=None):
+        operacion = operacion_actual()
+        inicio = time.perf_counter()
+        try:
+            job = getattr(self._client, metodo)(*args, **kwargs)
+        except Exception as e:
+            _registro.registrar(operacion, metodo, time.perf_counter() - inicio, error=e)
+            raise
+        return _TrabajoMedido(job, operacion, metodo, inicio, filas)
+
+    def query(self, query, job_config=None, **kwargs):
+        if job_config is not None and job_config.dry_run:
+            # La estimación no ejecuta nada: se registra al volver, con los bytes estimados
+            with _registro.medir(operacion_actual(), "query_dry_run") as valores:
+                job = self._client.query(query, job_config=job_config, **kwargs)
+                valores["bytes_procesados"] = job.total_bytes_processed
+            return job
+        return self._trabajo("query", (query,), dict(kwargs, job_config=job_config))
+
+    def load_table_from_dataframe(self, dataframe, destination, *args, **kwargs):
+        return self._trabajo("load_table_from_dataframe", (dataframe, destination) + args, kwargs, len(dataframe))
+
+    def copy_table(self, *args, **kwargs):
+        return self._trabajo("copy_table", args, kwargs)
+
+    def insert_rows_json(self, table, json_rows, *args, **kwargs):
+        return self._llamar("insert_rows_json", (table, json_rows) + args, kwargs, len(json_rows))
+
+    def get_table(self, *args, **kwargs):
+        return self._llamar("get_table", args, kwargs)
+
+    def create_table(self, *args, **kwargs):
+        return self._llamar("create_table", args, kwargs)
+
+    def update_table(self, *args, **kwargs):
+        return self._llamar("update_table", args, kwargs)
+
+    def delete_table(self, *args, **kwargs):
+        return self._llamar("delete_table", args, kwargs)
+
+    def get_dataset(self, *args, **kwargs):
+        return self._llamar("get_dataset", args, kwargs)
+
+
+def _crear_cliente_bigquery():
+    """
+    Crea un cliente de BigQuery autenticado a partir de las credenciales configuradas
+    """
+    if CREDENTIALS_PATH and os.path.exists(CREDENTIALS_PATH):
+        print(f"📁 Usando credenciales de: {CREDENTIALS_PATH}")
+        credentials = service_account.Credentials.from_service_account_file(
+            CREDENTIALS_PATH,
+            scopes=["https://www.googleapis.com/auth/cloud-platform"],
+        )
+        return bigquery.Client(credentials=credentials, project=PROJECT_ID)
+
+    print("⚠️ No se encontraron credenciales, intentando con las por defecto")
+    return bigquery.Client(project=PROJECT_ID)
+
+
+class BigQueryClientManager:
+    """
+    Mantiene un único cliente de BigQuery por proceso.
+
+    El cliente se crea de forma perezosa y segura entre hilos, la verificación
+    con `SELECT 1` solo se repite cuando vence el TTL, y el cliente se
+    reconstruye automáticamente después de un error de autenticación o de red.
+
+    Args:
+        factory (callable): Función sin argumentos que construye el cliente.
+            Permite inyectar un cliente falso en pruebas.
+        healthcheck_ttl (float): Segundos durante los cuales un cliente
+            verificado se reutiliza sin volver a comprobarlo.
+        clock (callable): Reloj monotónico, inyectable en pruebas.
+    """
+
+    def __init__(self, factory=None, healthcheck_ttl=HEALTHCHECK_TTL, clock=time.monotonic):
+        self._factory = factory or _crear_cliente_bigquery
+        self._healthcheck_ttl = healthcheck_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._client = None
+        self._verificado_en = None
+        self.stats = {"reutilizado": 0, "creado": 0, "reconstruido": 0, "verificaciones": 0}
+
+    def get_client(self):
+        """
+        Retorna el cliente compartido, creándolo o verificándolo si hace falta
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = self._construir()
+                return self._client
+
+            if self._clock() - self._verificado_en < self._healthcheck_ttl:
+                self.stats["reutilizado"] += 1
+                return self._client
+
+            try:
+                self._verificar(self._client)
+                self.stats["reutilizado"] += 1
+            except Exception as e:
+                print(f"⚠️ El cliente de BigQuery no respondió ({e}), reconstruyendo...")
+                self._client = self._construir()
+            return self._client
+
+    def reportar_error(self, error):
+        """
+        Descarta el cliente si el error indica credenciales o conexión inválidas
+
+        Args:
+            error (Exception): Excepción producida al usar el cliente
+
+        Returns:
+            bool: True si el cliente fue descartado
+        """
+        if not isinstance(error, ERRORES_DE_CONEXION):
+            return False
+        with self._lock:
+            if self._client is not None:
+                print(f"♻️ Descartando cliente de BigQuery tras {type(error).__name__}")
+            self._client = None
+            self._verificado_en = None
+        return True
+
+    def reset(self):
+        """
+        Olvida el cliente actual y reinicia los contadores
+        """
+        with self._lock:
+            self._client = None
+            self._verificado_en = None
+            for clave in self.stats:
+                self.stats[clave] = 0
+
+    def _verificar(self, client):
+        with _medir("verificar_cliente", "query"):
+            client.query("SELECT 1").result()
+        self.stats["verificaciones"] += 1
+        self._verificado_en = self._clock()
+
+    def _construir(self):
+        try:
+            with _medir("crear_cliente", "cliente"):
+                client = self._factory()
+            self._verificar(client)
+        except Exception as e:
+            print(f"❌ Error al conectar con BigQuery: {e}")
+            raise
+        self.stats["reconstruido" if self.stats["creado"] else "creado"] += 1
         print("✅ Cliente de BigQuery conectado exitosamente")
         return client
-        
+
+
+_client_manager = BigQueryClientManager()
+
+
+def get_bigquery_client():
+    """
+    Retorna el cliente de BigQuery compartido por el proceso, envuelto para
+    registrar métricas si están activas
+    """
+    client = _client_manager.get_client()
+    return client if _registro is None else _ClienteMedido(client)
+
+
+def configurar_cliente(factory, healthcheck_ttl=HEALTHCHECK_TTL):
+    """
+    Reemplaza la fábrica del cliente compartido, por ejemplo por un cliente falso
+    
+    Args:
+        factory (callable): Función sin argumentos que construye el cliente
+    """
+    global _client_manager
+    _client_manager = BigQueryClientManager(factory, healthcheck_ttl)
+
+
+def get_client_stats():
+    """
+    Retorna los contadores de reutilización y reconstrucción del cliente
+    """
+    return dict(_client_manager.stats)
+
+def aplicar_particionado(table):
+    """
+    Configura el particionado diario por fecha_solicitud y el clustering de la tabla
+    
+    Args:
+        table (bigquery.Table): Tabla aún no creada
+    
+    Returns:
+        bigquery.Table: La misma tabla, para encadenar
+    """
+    table.time_partitioning = bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY,
+        field=CAMPO_PARTICION,
+    )
+    table.clustering_fields = CAMPOS_CLUSTERING
+    return table
+
+def esta_particionada(table):
+    """
+    Indica si la tabla ya tiene el particionado y clustering esperados
+    """
+    particion = table.time_partitioning
+    return (
+        particion is not None
+        and particion.field == CAMPO_PARTICION
+        and list(table.clustering_fields or []) == CAMPOS_CLUSTERING
+    )
+
+def _tabla_solicitudes():
+    return aplicar_particionado(
+        bigquery.Table(f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}", schema=_schema_bigquery(SCHEMA_SOLICITUDES))
+    )
+
+def _tabla_evaluaciones():
+    table = bigquery.Table(
+        f"{PROJECT_ID}.{DATASET_ID}.{EVALUACIONES_TABLE_ID}", schema=_schema_bigquery(SCHEMA_EVALUACIONES)
+    )
+    # El MERGE de cada lote busca por id
+    table.clustering_fields = ["id"]
+    return table
+
+def _tabla_historial():
+    table = bigquery.Table(
+        f"{PROJECT_ID}.{DATASET_ID}.{HISTORIAL_TABLE_ID}", schema=_schema_bigquery(SCHEMA_HISTORIAL)
+    )
+    table.time_partitioning = bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY, field="fecha_cambio"
+    )
+    table.clustering_fields = ["id"]
+    return table
+
+def _tabla_resumen():
+    # Unas pocas filas por mes: no necesita particiones ni clustering
+    return bigquery.Table(f"{PROJECT_ID}.{DATASET_ID}.{RESUMEN_TABLE_ID}", schema=_schema_bigquery(SCHEMA_RESUMEN))
+
+# Tablas de la aplicación: nombre, esquema declarado y cómo se crean
+TABLAS = [
+    (TABLE_ID, SCHEMA_SOLICITUDES, _tabla_solicitudes),
+    (EVALUACIONES_TABLE_ID, SCHEMA_EVALUACIONES, _tabla_evaluaciones),
+    (HISTORIAL_TABLE_ID, SCHEMA_HISTORIAL, _tabla_historial),
+    (RESUMEN_TABLE_ID, SCHEMA_RESUMEN, _tabla_resumen),
+]
+
+def _crear_tabla(construir, descripcion):
+    try:
+        get_bigquery_client().create_table(construir(), exists_ok=True)
+        return True
     except Exception as e:
-        print(f"❌ Error al conectar con BigQuery: {e}")
-        raise e
+        _client_manager.reportar_error(e)
+        print(f"❌ Error al crear la tabla de {descripcion}: {e}")
+        return False
 
+@como_operacion
 def create_table_if_not_exists():
     """
     Crea la tabla de solicitudes_prestamo si no existe
+    
+    Returns:
+        bool: True si la tabla existe o fue creada, False si hubo error
+    """
+    return _crear_tabla(_tabla_solicitudes, "solicitudes")
+
+@como_operacion
+def asegurar_esquema():
+    """
+    Deja las tablas de la aplicación de acuerdo con el esquema declarado
+    
+    Crea las tablas que no existen. En las que existen compara la huella del
+    esquema con la declarada y, si difieren, agrega las columnas NULLABLE
+    nuevas (el único cambio que BigQuery aplica sin reescribir la tabla).
+    Las demás diferencias se reportan pero no se tocan.
+    
+    Returns:
+        dict: ResultadoEsquema de cada tabla, por nombre
     """
+    client = get_bigquery_client()
+    resultados = {}
     try:
-        client = get_bigquery_client()
-        table_id = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
-        
-        schema = [
-            bigquery.SchemaField("id", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("fecha_solicitud", "TIMESTAMP", mode="REQUIRED"),
-            bigquery.SchemaField("nombre", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("cedula", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("telefono", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("email", "STRING", mode="NULLABLE"),
-            bigquery.SchemaField("fecha_nacimiento", "DATE", mode="REQUIRED"),
-            bigquery.SchemaField("ocupacion", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("tipo_prestamo", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("monto_solicitado", "FLOAT64", mode="REQUIRED"),
-            bigquery.SchemaField("plazo_meses", "INTEGER", mode="REQUIRED"),
-            bigquery.SchemaField("proposito", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("estado", "STRING", mode="REQUIRED"),
-        ]
-        
-        table = bigquery.Table(table_id, schema=schema)
-        
-        try:
-            table = client.create_table(table)
-            print(f"✅ Tabla {table_id} creada exitosamente.")
-            return True
-        except Exception as e:
-            if "Already Exists" in str(e):
-                print(f"ℹ️  La tabla {table_id} ya existe.")
-                return True
-            else:
-                print(f"❌ Error al crear la tabla: {e}")
-                raise e
-                
-    except Exception as e:
-        print(f"❌ Error en create_table_if_not_exists: {e}")
-        return False
+        for nombre, declarado, construir in TABLAS:
+            try:
+                tabla = client.get_table(f"{PROJECT_ID}.{DATASET_ID}.{nombre}")
+            except google_api_exceptions.NotFound:
+                client.create_table(construir(), exists_ok=True)
+                resultados[nombre] = ResultadoEsquema("creada", [], [])
+                continue
+            if schema_fingerprint(tabla.schema) == schema_fingerprint(declarado):
+                resultados[nombre] = ResultadoEsquema("al_dia", [], [])
+                continue
+            agregables, incompatibles = comparar_esquemas(tabla.schema, declarado)
+            if agregables:
+                tabla.schema = list(tabla.schema) + _schema_bigquery(agregables)
+                client.update_table(tabla, ["schema"])
+            resultados[nombre] = ResultadoEsquema(
+                "actualizada" if agregables else "al_dia", [c.name for c in agregables], incompatibles
+            )
+        return resultados
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def insertar_lote_solicitudes(filas):
+    """
+    Inserta un lote de solicitudes en BigQuery con una sola llamada de streaming
+    
+    El `id` de cada solicitud se envía como insertId, de modo que reintentar el
+    mismo lote no duplica filas. Las excepciones se propagan para que quien
+    llama decida si reintentar.
+    
+    Args:
+        filas (list): Lista de diccionarios con los datos de las solicitudes
+    
+    Returns:
+        list: Errores por fila reportados por BigQuery (vacía si todo se guardó)
+    """
+    client = get_bigquery_client()
+    
+    # Asegurarse de que las fechas sean string antes de insertar
+    for fila in filas:
+        if isinstance(fila['fecha_solicitud'], datetime):
+            fila['fecha_solicitud'] = fila['fecha_solicitud'].isoformat()
+    
+    # insert_rows_json no necesita el esquema, así que se evita el get_table
+    try:
+        return client.insert_rows_json(
+            f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}",
+            filas,
+            row_ids=[fila['id'] for fila in filas],
+        )
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
 
+@como_operacion
+def cargar_lote_solicitudes(df):
+    """
+    Carga un DataFrame de solicitudes con un load job en lugar de streaming
+    
+    Los load jobs no tienen costo por fila ni cuota de streaming, así que son
+    la vía adecuada para importaciones masivas.
+    
+    Args:
+        df (pandas.DataFrame): Solicitudes con las columnas del esquema
+    
+    Returns:
+        int: Número de filas cargadas
+    """
+    client = get_bigquery_client()
+    job_config = bigquery.LoadJobConfig(
+        schema=[
+            bigquery.SchemaField(columna.name, columna.field_type, mode=columna.mode)
+            for columna in SCHEMA_SOLICITUDES
+        ],
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+    )
+    try:
+        job = client.load_table_from_dataframe(
+            df, f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}", job_config=job_config
+        )
+        job.result()
+        return job.output_rows
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
 def insert_solicitud(solicitud_data):
     """
     Inserta una solicitud en BigQuery
@@ -91,20 +518,7 @@ def insert_solicitud(solicitud_data):
     """
     try:
         print("🔄 Iniciando inserción en BigQuery...")
-        client = get_bigquery_client()
-        
-        # IMPORTANTE: Obtener la referencia de la tabla como objeto, no string
-        table_ref = client.dataset(DATASET_ID).table(TABLE_ID)
-        table = client.get_table(table_ref)
-        
-        # Convertir fecha_solicitud de string ISO a datetime si es necesario
-        # Asegurarse de que sea string antes de insertar
-        if isinstance(solicitud_data['fecha_solicitud'], datetime):
-            solicitud_data['fecha_solicitud'] = solicitud_data['fecha_solicitud'].isoformat()
-
-        
-        # Insertar la fila usando el objeto tabla
-        errors = client.insert_rows_json(table, [solicitud_data])
+        errors = insertar_lote_solicitudes([solicitud_data])
         
         if errors:
             print(f"❌ Errores al insertar datos: {errors}")
@@ -118,10 +532,27 @@ def insert_solicitud(solicitud_data):
         print(f"   Detalles del error: {type(e).__name__}: {str(e)}")
         return False
 
-def get_all_solicitudes():
+def _leer(job):
+    """
+    Resultado de una consulta como DataFrame compacto (ver consultas.compactar)
+
+    Se baja en formato Arrow, con la BigQuery Storage API si el paquete
+    google-cloud-bigquery-storage está instalado (si no, por la API REST).
+    """
+    return arrow_a_dataframe(job.to_arrow(create_bqstorage_client=True))
+
+@como_operacion
+def get_all_solicitudes(columnas=None):
     """
     Obtiene todas las solicitudes de BigQuery
     
+    Lee todas las particiones a propósito: es la lectura de la tabla completa.
+    El listado y la caché local usan consultar_solicitudes y
+    get_solicitudes_desde, que sí filtran por fecha_solicitud.
+    
+    Args:
+        columnas (list): Columnas a leer (por defecto todas menos `proposito`)
+    
     Returns:
         pandas.DataFrame: DataFrame con todas las solicitudes
     """
@@ -130,20 +561,670 @@ def get_all_solicitudes():
         client = get_bigquery_client()
         
         query = f"""
-            SELECT *
+            SELECT {", ".join(columnas_proyectadas(columnas))}
             FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
             ORDER BY fecha_solicitud DESC
         """
         
-        print(f"📊 Ejecutando query: {query}")
-        df = client.query(query).to_dataframe()
+        df = _leer(client.query(query))
         print(f"✅ Se obtuvieron {len(df)} solicitudes")
         return df
         
     except Exception as e:
+        _client_manager.reportar_error(e)
         print(f"❌ Error al leer de BigQuery: {e}")
         return None
 
+@como_operacion
+def get_table_metadata():
+    """
+    Obtiene los metadatos de la tabla de solicitudes (esquema, creación y última modificación)
+    
+    Returns:
+        google.cloud.bigquery.Table: Tabla con sus metadatos
+    """
+    try:
+        client = get_bigquery_client()
+        return client.get_table(f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}")
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def get_solicitudes_desde(desde, desde_id="", columnas=None):
+    """
+    Obtiene las solicitudes posteriores a una marca de agua (fecha_solicitud, id)
+    
+    Args:
+        desde (datetime): fecha_solicitud de la marca de agua
+        desde_id (str): id de la marca de agua, desempata filas con la misma fecha
+        columnas (list): Columnas a leer (por defecto todas menos `proposito`)
+    
+    Returns:
+        pandas.DataFrame: DataFrame con las solicitudes nuevas
+    """
+    try:
+        print(f"🔄 Consultando solicitudes posteriores a {desde}...")
+        client = get_bigquery_client()
+        
+        query = f"""
+            SELECT {", ".join(columnas_proyectadas(columnas))}
+            FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+            WHERE fecha_solicitud >= @desde
+              AND (fecha_solicitud > @desde OR id > @desde_id)
+            ORDER BY fecha_solicitud DESC
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("desde", "TIMESTAMP", desde),
+                bigquery.ScalarQueryParameter("desde_id", "STRING", desde_id),
+            ]
+        )
+        df = _leer(client.query(query, job_config=job_config))
+        print(f"✅ Se obtuvieron {len(df)} solicitudes nuevas")
+        return df
+        
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        print(f"❌ Error al leer de BigQuery: {e}")
+        raise
+
+@como_operacion
+def consultar_solicitudes(filtros=None, columnas=None, cursor=None, limite=50):
+    """
+    Obtiene una página de solicitudes filtrada en el servidor
+    
+    Los filtros se envían como parámetros de la consulta y solo se leen las
+    columnas pedidas, así que los bytes procesados no dependen del texto de
+    `proposito` ni del número de páginas ya recorridas.
+    
+    Args:
+        filtros (dict): estado, tipo_prestamo, fecha_desde, fecha_hasta,
+            monto_min, monto_max y/o cedula
+        columnas (list): Columnas a leer (por defecto todas menos `proposito`)
+        cursor (tuple): (fecha_solicitud, id) devuelto por la página anterior
+        limite (int): Tamaño de página
+    
+    Returns:
+        tuple: (pandas.DataFrame con la página, cursor de la siguiente o None)
+    """
+    try:
+        client = get_bigquery_client()
+        query, job_config = construir_consulta_solicitudes(filtros, columnas, cursor, limite + 1)
+        df = _leer(client.query(query, job_config=job_config))
+        return separar_pagina(df, limite)
+        
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        print(f"❌ Error al consultar solicitudes: {e}")
+        raise
+
+def construir_consulta_solicitudes(filtros=None, columnas=None, cursor=None, limite=50, tabla=None):
+    """
+    Arma la consulta parametrizada del listado sin ejecutarla
+    
+    Args:
+        tabla (str): Tabla completa a consultar (por defecto la de solicitudes)
+    
+    Returns:
+        tuple: (texto SQL, bigquery.QueryJobConfig con los parámetros)
+    """
+    where, parametros = construir_where(filtros, cursor)
+    query = f"""
+        SELECT {', '.join(columnas_proyectadas(columnas))}
+        FROM `{tabla or f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"}`
+        {where}
+        ORDER BY fecha_solicitud DESC, id DESC
+        LIMIT @limite
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=_parametros(parametros) + [bigquery.ScalarQueryParameter("limite", "INT64", limite)]
+    )
+    return query, job_config
+
+def _parametros(parametros):
+    return [bigquery.ScalarQueryParameter(nombre, tipo, valor) for nombre, (tipo, valor) in parametros.items()]
+
+@como_operacion
+def iterar_solicitudes(filtros=None, columnas=None, tamano_bloque=10000, ventana_dias=0):
+    """
+    Recorre todas las solicitudes que cumplen los filtros del listado
+    
+    Se ejecuta una sola consulta, sin LIMIT, y el resultado se lee por páginas
+    en formato Arrow: en memoria queda una página a la vez, sin importar
+    cuántas filas tenga el resultado.
+    
+    Args:
+        filtros (dict): Mismos filtros que consultar_solicitudes
+        columnas (list): Columnas a leer (por defecto todas menos `proposito`)
+        tamano_bloque (int): Filas por página
+        ventana_dias (int): Días hacia atrás a leer si no hay fecha_desde (0 = todos)
+    
+    Yields:
+        pandas.DataFrame: Página de solicitudes con tipos compactos, de la más
+            reciente a la más antigua
+    """
+    where, parametros = construir_where(filtros, ventana_dias=ventana_dias)
+    query = f"""
+        SELECT {', '.join(columnas_proyectadas(columnas))}
+        FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+        {where}
+        ORDER BY fecha_solicitud DESC, id DESC
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=_parametros(parametros))
+    try:
+        filas = get_bigquery_client().query(query, job_config=job_config).result(page_size=tamano_bloque)
+        for pagina in filas.to_arrow_iterable():
+            yield arrow_a_dataframe(pagina)
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def estimar_bytes(query, job_config=None):
+    """
+    Ejecuta la consulta en modo dry-run para saber cuántos bytes procesaría
+    
+    Returns:
+        int: Bytes que BigQuery procesaría (y facturaría) al ejecutarla
+    """
+    job_config = job_config or bigquery.QueryJobConfig()
+    job_config.dry_run = True
+    job_config.use_query_cache = False
+    try:
+        return get_bigquery_client().query(query, job_config=job_config).total_bytes_processed
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+def _schema_bigquery(schema):
+    return [bigquery.SchemaField(columna.name, columna.field_type, mode=columna.mode) for columna in schema]
+
+# Sin @como_operacion: el decorador envolvería el generador y las excepciones
+# del bloque no llegarían al try de adentro. Lo etiquetan quienes lo usan
+@contextmanager
+def tabla_staging(tabla_id, schema, df):
+    """
+    Sube un lote a una tabla temporal junto a `tabla_id` y la borra al salir
+    
+    El lote se carga con un load job (sin costo) y la tabla expira sola en una
+    hora por si el proceso muere antes de borrarla.
+    
+    Args:
+        tabla_id (str): Tabla destino completa; la de staging queda en su dataset
+        schema (list): Columnas del lote (Columna o SchemaField)
+        df (pandas.DataFrame): Filas del lote
+    
+    Yields:
+        str: Id completo de la tabla de staging (los errores dentro del bloque
+            también se reportan al administrador del cliente)
+    """
+    client = get_bigquery_client()
+    staging_id = f"{tabla_id}__staging_{uuid.uuid4().hex}"
+    staging = bigquery.Table(staging_id, schema=_schema_bigquery(schema))
+    staging.expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    try:
+        client.create_table(staging)
+        try:
+            client.load_table_from_dataframe(
+                df[[columna.name for columna in schema]], staging_id,
+                job_config=bigquery.LoadJobConfig(schema=staging.schema, write_disposition="WRITE_APPEND"),
+            ).result()
+            yield staging_id
+        finally:
+            client.delete_table(staging_id, not_found_ok=True)
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+def sql_merge(tabla_id, staging_id, actualizar, condicion=None, insertar=None):
+    """
+    Arma un MERGE por `id` desde una tabla de staging
+    
+    Args:
+        tabla_id (str): Tabla destino completa (alias t)
+        staging_id (str): Tabla de staging completa (alias s)
+        actualizar (list | dict): Columnas a actualizar con la columna del mismo
+            nombre en el lote, o {columna destino: columna del lote}
+        condicion (str): Condición adicional para actualizar, con alias t y s
+        insertar (list): Columnas a insertar cuando el `id` no existe en el
+            destino; None no inserta
+    
+    Returns:
+        str: Sentencia MERGE
+    """
+    if not isinstance(actualizar, dict):
+        actualizar = {c: c for c in actualizar}
+    merge = f"""
+        MERGE `{tabla_id}` AS t
+        USING `{staging_id}` AS s
+        ON t.id = s.id
+        WHEN MATCHED{f" AND {condicion}" if condicion else ""} THEN
+          UPDATE SET {', '.join(f"{destino} = s.{origen}" for destino, origen in actualizar.items())}
+    """
+    if insertar:
+        merge += f"""
+        WHEN NOT MATCHED THEN
+          INSERT ({', '.join(insertar)}) VALUES ({', '.join(f"s.{c}" for c in insertar)})
+        """
+    return merge
+
+@como_operacion
+def merge_desde_staging(tabla_id, schema, df, actualizar, condicion=None, insertar=True):
+    """
+    Aplica un lote a una tabla con un solo MERGE desde una tabla temporal
+    
+    Args:
+        tabla_id (str): Tabla destino completa
+        schema (list): Columnas del lote (Columna o SchemaField), incluido `id`
+        df (pandas.DataFrame): Filas del lote
+        actualizar (list | dict): Ver sql_merge
+        condicion (str): Condición adicional para actualizar, con alias t
+            (destino) y s (lote)
+        insertar (bool): Inserta los `id` que no existen en el destino
+    
+    Returns:
+        int: Filas insertadas o actualizadas
+    """
+    with tabla_staging(tabla_id, schema, df) as staging_id:
+        merge = sql_merge(
+            tabla_id, staging_id, actualizar, condicion,
+            [columna.name for columna in schema] if insertar else None,
+        )
+        job = get_bigquery_client().query(merge)
+        job.result()
+        return job.num_dml_affected_rows or 0
+
+@como_operacion
+def create_evaluaciones_table_if_not_exists():
+    """
+    Crea la tabla de resultados de la evaluación de crédito si no existe
+    
+    Returns:
+        bool: True si la tabla existe o fue creada, False si hubo error
+    """
+    return _crear_tabla(_tabla_evaluaciones, "evaluaciones")
+
+@como_operacion
+def contar_solicitudes_por_cedula():
+    """
+    Cuenta cuántas solicitudes tiene cada cédula en toda la tabla
+    
+    Recorre todas las particiones a propósito: la evaluación de crédito
+    cuenta las solicitudes previas de todo el historial, no de una ventana.
+    Solo lee la columna cedula.
+    
+    Returns:
+        pandas.Series: Número de solicitudes, indexado por cédula
+    """
+    try:
+        query = f"""
+            SELECT cedula, COUNT(*) AS solicitudes
+            FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+            GROUP BY cedula
+        """
+        df = get_bigquery_client().query(query).to_dataframe()
+        return df.set_index("cedula")["solicitudes"]
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def iterar_pendientes_sin_evaluar(tamano_bloque=10000):
+    """
+    Recorre las solicitudes pendientes que aún no tienen evaluación
+    
+    Se ejecuta una sola consulta y el resultado se lee por páginas, así que
+    la tabla se escanea una vez sin importar cuántos bloques haya.
+    
+    Args:
+        tamano_bloque (int): Filas por página
+    
+    Yields:
+        pandas.DataFrame: id, cedula, fecha_nacimiento, tipo_prestamo,
+            monto_solicitado y plazo_meses de cada solicitud
+    """
+    query = f"""
+        SELECT s.id, s.cedula, s.fecha_nacimiento, s.tipo_prestamo, s.monto_solicitado, s.plazo_meses
+        FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}` AS s
+        LEFT JOIN `{PROJECT_ID}.{DATASET_ID}.{EVALUACIONES_TABLE_ID}` AS e ON e.id = s.id
+        WHERE s.estado = 'Pendiente' AND e.id IS NULL
+    """
+    try:
+        filas = get_bigquery_client().query(query).result(page_size=tamano_bloque)
+        yield from filas.to_dataframe_iterable()
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def guardar_evaluaciones(df):
+    """
+    Guarda un lote de evaluaciones con un solo MERGE (reemplaza las anteriores)
+    
+    Returns:
+        int: Filas insertadas o actualizadas
+    """
+    return merge_desde_staging(
+        f"{PROJECT_ID}.{DATASET_ID}.{EVALUACIONES_TABLE_ID}",
+        SCHEMA_EVALUACIONES,
+        df,
+        actualizar=[columna.name for columna in SCHEMA_EVALUACIONES if columna.name != "id"],
+    )
+
+@como_operacion
+def create_historial_table_if_not_exists():
+    """
+    Crea la tabla del historial de cambios de estado si no existe
+    
+    Returns:
+        bool: True si la tabla existe o fue creada, False si hubo error
+    """
+    return _crear_tabla(_tabla_historial, "historial")
+
+@como_operacion
+def aplicar_transiciones(df):
+    """
+    Cambia el estado de un lote de solicitudes con un solo MERGE
+    
+    Concurrencia optimista: cada fila solo se actualiza si la solicitud sigue
+    en `estado_anterior`; si alguien la cambió mientras tanto queda como
+    conflicto. Los cambios aplicados se anotan en el historial.
+    
+    BigQuery no permite UPDATE/MERGE sobre filas que siguen en el buffer de
+    streaming (insertadas con insert_rows_json hace menos de ~90 minutos);
+    en ese caso la consulta falla y no se aplica ningún cambio del lote. Lo
+    mismo pasa si otra transacción modifica la tabla al mismo tiempo.
+    
+    Args:
+        df (pandas.DataFrame): Columnas de SCHEMA_HISTORIAL, una fila por solicitud
+    
+    Returns:
+        pandas.DataFrame: Conflictos, con id y estado_actual (None si la
+            solicitud no existe)
+    """
+    tabla_id = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
+    historial_id = f"{PROJECT_ID}.{DATASET_ID}.{HISTORIAL_TABLE_ID}"
+    columnas = [columna.name for columna in SCHEMA_HISTORIAL]
+    with tabla_staging(historial_id, SCHEMA_HISTORIAL, df) as staging_id:
+        # Dentro de la transacción ambas sentencias ven la misma foto de la
+        # tabla: el historial recibe exactamente las filas que cambia el MERGE.
+        # Las que no quedaron en el historial con la fecha del lote son conflictos.
+        script = f"""
+            BEGIN TRANSACTION;
+            INSERT INTO `{historial_id}` ({', '.join(columnas)})
+            SELECT {', '.join(f's.{c}' for c in columnas)}
+            FROM `{staging_id}` AS s
+            JOIN `{tabla_id}` AS t ON t.id = s.id
+            WHERE t.estado = s.estado_anterior;
+            {sql_merge(tabla_id, staging_id, {"estado": "estado_nuevo"}, "t.estado = s.estado_anterior")};
+            COMMIT TRANSACTION;
+            SELECT s.id, t.estado AS estado_actual
+            FROM `{staging_id}` AS s
+            LEFT JOIN `{tabla_id}` AS t ON t.id = s.id
+            LEFT JOIN `{historial_id}` AS h ON h.id = s.id AND h.fecha_cambio = s.fecha_cambio
+            WHERE h.id IS NULL;
+        """
+        return get_bigquery_client().query(script).to_dataframe()
+
+@como_operacion
+def get_historial_estados(solicitud_id):
+    """
+    Obtiene los cambios de estado de una solicitud, del más reciente al más antiguo
+    
+    Returns:
+        pandas.DataFrame: Filas del historial
+    """
+    try:
+        query = f"""
+            SELECT *
+            FROM `{PROJECT_ID}.{DATASET_ID}.{HISTORIAL_TABLE_ID}`
+            WHERE id = @id
+            ORDER BY fecha_cambio DESC
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("id", "STRING", solicitud_id)]
+        )
+        return get_bigquery_client().query(query, job_config=job_config).to_dataframe()
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def get_cambios_de_estado(desde):
+    """
+    Cambios de estado registrados desde una fecha, del más antiguo al más reciente
+    
+    El historial está particionado por fecha_cambio, así que solo se leen los
+    días desde `desde`.
+    
+    Returns:
+        pandas.DataFrame: id, estado (el nuevo) y fecha_cambio
+    """
+    try:
+        query = f"""
+            SELECT id, estado_nuevo AS estado, fecha_cambio
+            FROM `{PROJECT_ID}.{DATASET_ID}.{HISTORIAL_TABLE_ID}`
+            WHERE fecha_cambio >= @desde
+            ORDER BY fecha_cambio
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("desde", "TIMESTAMP", desde)]
+        )
+        return get_bigquery_client().query(query, job_config=job_config).to_dataframe()
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def contar_solicitudes_hasta(hasta):
+    """
+    Cuenta las solicitudes con fecha_solicitud hasta una fecha (incluida)
+    
+    Solo lee la columna fecha_solicitud de las particiones hasta `hasta`.
+    
+    Returns:
+        int: Cantidad de solicitudes
+    """
+    try:
+        query = f"""
+            SELECT COUNT(*) AS filas
+            FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+            WHERE fecha_solicitud <= @hasta
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("hasta", "TIMESTAMP", hasta)]
+        )
+        return int(get_bigquery_client().query(query, job_config=job_config).to_dataframe()["filas"].iloc[0])
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def create_resumen_table_if_not_exists():
+    """
+    Crea la tabla del resumen de la cartera si no existe
+    
+    Returns:
+        bool: True si la tabla existe o fue creada, False si hubo error
+    """
+    return _crear_tabla(_tabla_resumen, "resumen")
+
+@como_operacion
+def ultima_actualizacion_resumen():
+    """
+    Momento del último recálculo del resumen de la cartera
+    
+    Returns:
+        datetime: Mayor `actualizado` del resumen, o None si está vacío
+    """
+    try:
+        query = f"""
+            SELECT COUNT(*) AS filas, MAX(actualizado) AS actualizado
+            FROM `{PROJECT_ID}.{DATASET_ID}.{RESUMEN_TABLE_ID}`
+        """
+        fila = get_bigquery_client().query(query).to_dataframe().iloc[0]
+        return fila["actualizado"].to_pydatetime() if fila["filas"] else None
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def meses_con_cambios_de_estado(desde):
+    """
+    Meses (de fecha_solicitud) de las solicitudes que cambiaron de estado desde una fecha
+    
+    El historial está particionado por fecha_cambio, así que solo se leen los
+    días desde `desde`; de la tabla de solicitudes se leen id y fecha_solicitud.
+    
+    Returns:
+        list: Meses AAAA-MM
+    """
+    try:
+        query = f"""
+            SELECT DISTINCT FORMAT_TIMESTAMP('%Y-%m', s.fecha_solicitud) AS mes
+            FROM `{PROJECT_ID}.{DATASET_ID}.{HISTORIAL_TABLE_ID}` AS h
+            JOIN `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}` AS s ON s.id = h.id
+            WHERE h.fecha_cambio >= @desde
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("desde", "TIMESTAMP", desde)]
+        )
+        return get_bigquery_client().query(query, job_config=job_config).to_dataframe()["mes"].tolist()
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def reagregar_resumen(meses=None, actualizado=None):
+    """
+    Recalcula los meses pedidos del resumen de la cartera en una transacción
+    
+    Las filas de esos meses se borran y se vuelven a agregar desde la tabla de
+    solicitudes, leyendo solo sus particiones. Sin meses se recalcula todo.
+    
+    Args:
+        meses (iterable): Meses AAAA-MM a recalcular (None = todo el historial)
+        actualizado (datetime): Valor de `actualizado` de las filas nuevas
+    """
+    resumen_id = f"{PROJECT_ID}.{DATASET_ID}.{RESUMEN_TABLE_ID}"
+    if meses is None:
+        condicion_fecha, condicion_mes, parametros = "TRUE", "TRUE", {}
+    else:
+        if not meses:
+            return
+        condicion_fecha, condicion_mes, parametros = condicion_meses(meses)
+    parametros["actualizado"] = ("TIMESTAMP", actualizado or datetime.now(timezone.utc))
+    script = f"""
+        BEGIN TRANSACTION;
+        DELETE FROM `{resumen_id}` WHERE {condicion_mes};
+        INSERT INTO `{resumen_id}` ({', '.join(COLUMNAS_RESUMEN)})
+        SELECT
+            FORMAT_TIMESTAMP('%Y-%m', fecha_solicitud) AS mes,
+            tipo_prestamo,
+            estado,
+            {sql_banda_monto()} AS banda_monto,
+            COUNT(*) AS solicitudes,
+            SUM(monto_solicitado) AS monto_total,
+            @actualizado AS actualizado
+        FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+        WHERE {condicion_fecha}
+        GROUP BY mes, tipo_prestamo, estado, banda_monto;
+        COMMIT TRANSACTION;
+    """
+    try:
+        job_config = bigquery.QueryJobConfig(query_parameters=_parametros(parametros))
+        get_bigquery_client().query(script, job_config=job_config).result()
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def contar_resumen(antes_de):
+    """
+    Cuenta las solicitudes anteriores a una fecha en la tabla y en el resumen
+    
+    Si no coinciden, hay filas que el recálculo incremental no vio (cargadas
+    con una fecha_solicitud atrasada, o borradas). En la tabla se suman los
+    conteos por partición de INFORMATION_SCHEMA.PARTITIONS, que son metadatos:
+    no se lee ninguna fila. Solo si la tabla aún no está particionada (antes de
+    migrar_tabla.py) se cuentan las filas con COUNT(*).
+    
+    Args:
+        antes_de (datetime): Inicio de un mes (UTC, el límite de las particiones)
+    
+    Returns:
+        tuple: (solicitudes en la tabla, solicitudes en el resumen)
+    """
+    particion = antes_de.astimezone(timezone.utc).strftime("%Y%m%d")
+    try:
+        # Las particiones diarias se llaman AAAAMMDD; __UNPARTITIONED__ (el buffer
+        # de streaming) y __NULL__ quedan fuera de la comparación de texto
+        query = f"""
+            SELECT
+                (SELECT COALESCE(SUM(CASE WHEN partition_id < @particion THEN total_rows ELSE 0 END), 0)
+                 FROM `{PROJECT_ID}.{DATASET_ID}.INFORMATION_SCHEMA.PARTITIONS`
+                 WHERE table_name = @tabla) AS filas_tabla,
+                (SELECT COUNT(*) FROM `{PROJECT_ID}.{DATASET_ID}.INFORMATION_SCHEMA.PARTITIONS`
+                 WHERE table_name = @tabla AND partition_id IS NULL) AS sin_particionar,
+                (SELECT COALESCE(SUM(solicitudes), 0) FROM `{PROJECT_ID}.{DATASET_ID}.{RESUMEN_TABLE_ID}`
+                 WHERE mes < @mes) AS filas_resumen
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("tabla", "STRING", TABLE_ID),
+                bigquery.ScalarQueryParameter("particion", "STRING", particion),
+                bigquery.ScalarQueryParameter("mes", "STRING", mes_de(antes_de)),
+            ]
+        )
+        fila = get_bigquery_client().query(query, job_config=job_config).to_dataframe().iloc[0]
+        filas_tabla = int(fila["filas_tabla"])
+        if int(fila["sin_particionar"]):
+            query = f"""
+                SELECT COUNT(*) AS filas_tabla FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+                WHERE fecha_solicitud < @antes_de
+            """
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ScalarQueryParameter("antes_de", "TIMESTAMP", antes_de)]
+            )
+            filas_tabla = int(get_bigquery_client().query(query, job_config=job_config).to_dataframe().iloc[0, 0])
+        return filas_tabla, int(fila["filas_resumen"])
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
+def consultar_resumen(dimension, desde_mes=None):
+    """
+    Totales del resumen de la cartera agrupados por una dimensión
+    
+    Lee la tabla de resumen (unas pocas filas por mes), nunca la de solicitudes.
+    
+    Args:
+        dimension (str): mes, tipo_prestamo, estado o banda_monto
+        desde_mes (str): Primer mes AAAA-MM a incluir (None = todo el historial)
+    
+    Returns:
+        pandas.DataFrame: dimension, solicitudes y monto_total
+    """
+    validar_dimension(dimension)
+    try:
+        query = f"""
+            SELECT {dimension}, SUM(solicitudes) AS solicitudes, SUM(monto_total) AS monto_total
+            FROM `{PROJECT_ID}.{DATASET_ID}.{RESUMEN_TABLE_ID}`
+            {"WHERE mes >= @desde_mes" if desde_mes else ""}
+            GROUP BY {dimension}
+            ORDER BY {dimension}
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("desde_mes", "STRING", desde_mes)] if desde_mes else []
+        )
+        return get_bigquery_client().query(query, job_config=job_config).to_dataframe()
+    except Exception as e:
+        _client_manager.reportar_error(e)
+        raise
+
+@como_operacion
 def verificar_configuracion():
     """
     Función de utilidad para verificar que todo esté configurado correctamente
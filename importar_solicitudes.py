@@ -0,0 +1,228 @@
+"""
+Importación masiva de solicitudes desde archivos CSV o Excel.
+
+El archivo se lee por bloques, cada bloque se valida con las mismas reglas del
+formulario (la versión vectorizada de validacion.py), las filas rechazadas se
+anotan en un reporte CSV (fila, campo, motivo) y las aceptadas se cargan con un
+solo load job por bloque. La memoria usada depende del tamaño del bloque, no
+del tamaño del archivo. Mientras migrar_tabla.py copia la tabla, la carga
+espera a que termine.
+
+Columnas esperadas (mismos nombres que la tabla):
+    nombre, cedula, telefono, email, fecha_nacimiento, ocupacion,
+    tipo_prestamo, monto_solicitado, plazo_meses, proposito
+Opcionales: fecha_solicitud (por defecto, el momento de la importación) y
+estado (por defecto, Pendiente).
+
+Uso:
+    python importar_solicitudes.py cartera.csv
+    python importar_solicitudes.py cartera.xlsx --bloque 10000 --rechazos rechazos.csv
+    python importar_solicitudes.py cartera.csv --validar   # Solo valida, no carga
+"""
+
+import argparse
+import csv
+import os
+import time
+import uuid
+import pandas as pd
+from schema import COLUMNAS
+from validacion import validar_lote
+
+TAMANO_BLOQUE = 5000
+
+# Segundos entre intentos mientras la tabla está en mantenimiento (migrar_tabla.py)
+ESPERA_MANTENIMIENTO = 5.0
+
+COLUMNAS_REQUERIDAS = [
+    "nombre", "cedula", "telefono", "email", "fecha_nacimiento", "ocupacion",
+    "tipo_prestamo", "monto_solicitado", "plazo_meses", "proposito",
+]
+
+COLUMNAS_RECHAZOS = ["fila", "campo", "motivo"]
+
+
+def leer_por_bloques(archivo, nombre=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Lee un CSV o Excel en bloques de filas como texto
+
+    Args:
+        archivo (str | file): Ruta o archivo abierto en modo binario
+        nombre (str): Nombre del archivo, para deducir el formato si `archivo`
+            no es una ruta
+        tamano_bloque (int): Filas por bloque
+
+    Yields:
+        pandas.DataFrame: Bloque de filas con todas las columnas como texto
+    """
+    nombre = (nombre or str(archivo)).lower()
+    if nombre.endswith((".xlsx", ".xlsm")):
+        yield from _leer_excel_por_bloques(archivo, tamano_bloque)
+    else:
+        yield from pd.read_csv(archivo, dtype=str, keep_default_na=False, chunksize=tamano_bloque)
+
+
+def _leer_excel_por_bloques(archivo, tamano_bloque):
+    # pandas.read_excel no lee por bloques; openpyxl en modo read_only sí
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = [str(c).strip() if c is not None else "" for c in next(filas, [])]
+        bloque = []
+        for fila in filas:
+            bloque.append(["" if v is None else v for v in fila])
+            if len(bloque) == tamano_bloque:
+                yield pd.DataFrame(bloque, columns=encabezado).astype(str)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=encabezado).astype(str)
+    finally:
+        libro.close()
+
+
+def _texto(df, columna):
+    return df[columna].fillna("").astype(str).str.strip()
+
+
+def validar_bloque(df, primera_fila=2, hoy=None):
+    """
+    Valida un bloque de solicitudes con las reglas del formulario
+
+    Args:
+        df (pandas.DataFrame): Bloque leído del archivo (columnas como texto)
+        primera_fila (int): Número de fila en el archivo de la primera fila del
+            bloque (2 si la fila 1 es el encabezado)
+        hoy (date): Fecha de referencia para la edad mínima
+
+    Returns:
+        tuple: (DataFrame de solicitudes válidas listo para cargar,
+                DataFrame de rechazos con columnas fila, campo, motivo)
+    """
+    valores, errores = validar_lote(df, hoy)
+    rechazos = pd.DataFrame({
+        "fila": errores["posicion"].to_numpy(dtype="int64") + primera_fila,
+        "campo": errores["campo"].to_numpy(),
+        "motivo": errores["motivo"].to_numpy(),
+    }, columns=COLUMNAS_RECHAZOS)
+
+    validas = ~valores.index.isin(errores["posicion"])
+    aceptadas = valores[validas].reset_index(drop=True)
+
+    if "fecha_solicitud" in df and _texto(df, "fecha_solicitud").ne("").any():
+        fecha_solicitud = pd.to_datetime(_texto(df, "fecha_solicitud"), errors="coerce", utc=True, format="mixed")
+        fecha_solicitud = fecha_solicitud.fillna(pd.Timestamp.now(tz="UTC")).to_numpy()[validas]
+    else:
+        fecha_solicitud = pd.Timestamp.now(tz="UTC")
+
+    aceptadas["id"] = [str(uuid.uuid4()) for _ in range(len(aceptadas))]
+    aceptadas["fecha_solicitud"] = pd.to_datetime(pd.Series(fecha_solicitud, index=aceptadas.index), utc=True)
+    aceptadas["fecha_nacimiento"] = aceptadas["fecha_nacimiento"].dt.date
+    aceptadas["monto_solicitado"] = aceptadas["monto_solicitado"].astype("float64")
+    aceptadas["plazo_meses"] = aceptadas["plazo_meses"].astype("int64")
+    return aceptadas[COLUMNAS], rechazos
+
+
+def _cargar(cargar_fn, aceptadas):
+    # Un bloque rechazado por mantenimiento no se cargó: se espera y se repite
+    # el mismo, en lugar de cortar la importación a la mitad
+    from storage import TablaEnMantenimiento
+
+    avisado = False
+    while True:
+        try:
+            return cargar_fn(aceptadas)
+        except TablaEnMantenimiento as e:
+            if not avisado:
+                print(f"⏸️ {e}; la importación sigue cuando termine")
+                avisado = True
+            time.sleep(ESPERA_MANTENIMIENTO)
+
+
+def importar(archivo, nombre=None, tamano_bloque=TAMANO_BLOQUE, rechazos_path=None,
+             cargar=True, cargar_fn=None, progreso=None):
+    """
+    Importa un archivo de solicitudes por bloques
+
+    Args:
+        archivo (str | file): Ruta o archivo abierto en modo binario
+        nombre (str): Nombre original del archivo (para archivos subidos)
+        tamano_bloque (int): Filas por bloque
+        rechazos_path (str): CSV donde se anotan las filas rechazadas
+        cargar (bool): Si es False solo valida
+        cargar_fn (callable): Recibe un DataFrame y lo carga; por defecto el
+            backend configurado en storage
+        progreso (callable): Se llama con el resumen parcial después de cada bloque
+
+    Returns:
+        dict: Filas leídas, aceptadas, rechazadas, cargadas, bloques y filas/segundo
+    """
+    if cargar and cargar_fn is None:
+        from storage import cargar_solicitudes
+        cargar_fn = cargar_solicitudes
+    if cargar:
+        from indice_cedulas import get_indice_cedulas
+        from busqueda_solicitudes import get_indice_busqueda
+
+    resumen = {"leidas": 0, "aceptadas": 0, "rechazadas": 0, "cargadas": 0, "bloques": 0,
+               "segundos": 0.0, "filas_por_segundo": 0.0, "rechazos_path": rechazos_path}
+    inicio = time.perf_counter()
+    rechazos_archivo = None
+    try:
+        if rechazos_path:
+            os.makedirs(os.path.dirname(rechazos_path) or ".", exist_ok=True)
+            rechazos_archivo = open(rechazos_path, "w", newline="", encoding="utf-8")
+            csv.writer(rechazos_archivo).writerow(COLUMNAS_RECHAZOS)
+
+        for bloque in leer_por_bloques(archivo, nombre, tamano_bloque):
+            if resumen["bloques"] == 0:
+                faltantes = [c for c in COLUMNAS_REQUERIDAS if c not in bloque.columns]
+                if faltantes:
+                    raise ValueError(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+
+            aceptadas, rechazos = validar_bloque(bloque, primera_fila=resumen["leidas"] + 2)
+            resumen["leidas"] += len(bloque)
+            resumen["aceptadas"] += len(aceptadas)
+            resumen["rechazadas"] += rechazos["fila"].nunique()
+            resumen["bloques"] += 1
+
+            if rechazos_archivo is not None and len(rechazos):
+                rechazos.to_csv(rechazos_archivo, header=False, index=False)
+            if cargar and len(aceptadas):
+                resumen["cargadas"] += _cargar(cargar_fn, aceptadas)
+                get_indice_cedulas().registrar_lote(aceptadas)
+                get_indice_busqueda().registrar_lote(aceptadas)
+
+            resumen["segundos"] = time.perf_counter() - inicio
+            resumen["filas_por_segundo"] = resumen["leidas"] / resumen["segundos"] if resumen["segundos"] else 0.0
+            if progreso:
+                progreso(dict(resumen))
+    finally:
+        if rechazos_archivo is not None:
+            rechazos_archivo.close()
+
+    if cargar and resumen["cargadas"]:
+        from query_cache import get_query_cache
+        get_query_cache().invalidate()
+    return resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa solicitudes de préstamo desde CSV o Excel")
+    parser.add_argument("archivo", help="Archivo .csv o .xlsx")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="Filas por bloque")
+    parser.add_argument("--rechazos", help="CSV para el reporte de rechazos (por defecto <archivo>.rechazos.csv)")
+    parser.add_argument("--validar", action="store_true", help="Solo valida, no carga nada")
+    args = parser.parse_args()
+
+    rechazos_path = args.rechazos or os.path.splitext(args.archivo)[0] + ".rechazos.csv"
+    resumen = importar(
+        args.archivo, tamano_bloque=args.bloque, rechazos_path=rechazos_path, cargar=not args.validar,
+        progreso=lambda r: print(f"🔄 Bloque {r['bloques']}: {r['leidas']} filas leídas, {r['rechazadas']} rechazadas"),
+    )
+    print(f"\n✅ {resumen['leidas']} filas leídas en {resumen['segundos']:.1f} s "
+          f"({resumen['filas_por_segundo']:,.0f} filas/s)")
+    print(f"   Aceptadas: {resumen['aceptadas']}  Cargadas: {resumen['cargadas']}  Rechazadas: {resumen['rechazadas']}")
+    if resumen["rechazadas"]:
+        print(f"   Reporte de rechazos: {rechazos_path}")
@@ -0,0 +1,497 @@
+"""
+Índice en memoria de solicitudes por cédula para detectar duplicados.
+
+Buscar duplicados con una consulta a BigQuery en cada envío agregaría segundos
+de espera. En su lugar, el índice se construye una vez por proceso a partir de
+la caché local de la tabla (solicitudes_cache.py), en segundo plano al abrir
+la app, y se mantiene al día. Mientras se construye, los envíos no se
+verifican (no se bloquea a nadie por no tener el índice listo).
+
+- El camino de escritura registra cada solicitud en cuanto se encola o se
+  importa, así que un segundo envío inmediato ya la encuentra.
+- Los cambios de estado (estados.py) se aplican al índice en cuanto se
+  confirman, para que una solicitud ya cerrada no siga contando como abierta.
+- Una sincronización periódica (en segundo plano, a lo sumo cada
+  INDICE_CEDULAS_SYNC_SEGUNDOS) aplica las filas nuevas que trae el
+  refresco incremental de la caché y los cambios de estado que la caché
+  aplicó desde la sincronización anterior, aunque sean de solicitudes
+  antiguas o los haya hecho otro proceso. Si la caché tuvo que bajar la
+  tabla completa, o ya no conserva todos esos cambios, el índice se
+  reconstruye.
+
+La clave es la cédula normalizada (solo dígitos, como entero). Opcionalmente
+un filtro de Bloom va delante del diccionario: las cédulas que nunca han
+solicitado, que son la mayoría de los envíos, se descartan sin tocarlo.
+
+Políticas (DUPLICADOS_POLITICA) para una solicitud del mismo tipo de préstamo
+que otra ya registrada con la misma cédula:
+    advertir -> se avisa y se permite el envío
+    bloquear -> se rechaza el envío
+    dias     -> se rechaza si la anterior sigue abierta o tiene menos de
+                DUPLICADOS_DIAS días; si es más antigua solo se avisa
+"""
+
+import argparse
+import hashlib
+import math
+import sys
+import threading
+import time
+from collections import namedtuple
+import pandas as pd
+from configuracion import get_configuracion
+from validacion import solo_digitos
+
+_config = get_configuracion()
+POLITICA = _config.duplicados_politica
+DIAS = _config.duplicados_dias
+SYNC_SEGUNDOS = _config.indice_cedulas_sync_segundos
+# Igual que la caché local: las filas que llegan tarde caen dentro de esta ventana
+SOLAPAMIENTO_SEGUNDOS = 60 * _config.solicitudes_cache_overlap_minutes
+USAR_BLOOM = _config.indice_cedulas_bloom
+
+POLITICAS = ("advertir", "bloquear", "dias")
+
+# Estados en los que una solicitud sigue abierta
+ESTADOS_ABIERTOS = ("Pendiente", "En revisión")
+
+_EPOCA = pd.Timestamp("1970-01-01", tz="UTC")
+
+# Resultado de verificar una solicitud contra el índice
+Verificacion = namedtuple("Verificacion", ["duplicada", "bloquear", "mensaje", "previas"])
+
+# Solicitud previa de la misma cédula: (id, tipo_prestamo, fecha en segundos UTC, estado)
+Previa = namedtuple("Previa", ["id", "tipo_prestamo", "fecha", "estado"])
+
+
+def normalizar_cedula(cedula):
+    """
+    Convierte una cédula con o sin formato en la clave del índice
+
+    Returns:
+        int: Dígitos de la cédula como entero, o None si no tiene dígitos
+    """
+    digitos = solo_digitos(str(cedula) if cedula is not None else "")
+    return int(digitos) if digitos else None
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre enteros: sin falsos negativos, con una tasa de
+    falsos positivos cercana a `tasa_error` mientras no supere `capacidad`.
+    """
+
+    def __init__(self, capacidad, tasa_error=0.01):
+        capacidad = max(capacidad, 1000)
+        # Fórmulas estándar: m = -n ln p / (ln 2)^2, k = m/n ln 2
+        self._bits = max(8, int(-capacidad * math.log(tasa_error) / (math.log(2) ** 2)))
+        self._hashes = max(1, round(self._bits / capacidad * math.log(2)))
+        self._tabla = bytearray((self._bits + 7) // 8)
+
+    @property
+    def bytes(self):
+        return len(self._tabla)
+
+    def _posiciones(self, clave):
+        resumen = hashlib.blake2b(clave.to_bytes(8, "little"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(resumen[:8], "little"), int.from_bytes(resumen[8:], "little")
+        return ((h1 + i * h2) % self._bits for i in range(self._hashes))
+
+    def add(self, clave):
+        for posicion in self._posiciones(clave):
+            self._tabla[posicion >> 3] |= 1 << (posicion & 7)
+
+    def __contains__(self, clave):
+        return all(self._tabla[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(clave))
+
+
+class IndiceCedulas:
+    """
+    Índice cédula -> solicitudes previas, con consulta O(1) al enviar.
+
+    Args:
+        fuente_fn (callable): Sin argumentos; retorna un DataFrame con todas
+            las solicitudes (al menos id, cedula, tipo_prestamo,
+            fecha_solicitud y estado). Por defecto, el refresco de la caché local.
+        reconstrucciones_fn (callable): Retorna un contador que aumenta cada vez
+            que la fuente tuvo que bajar la tabla completa
+        cambios_fn (callable): Recibe una versión (o None) y retorna
+            (versión actual, DataFrame id, estado con los cambios de estado
+            posteriores en orden, o None si ya no se conservan); ver
+            SolicitudesCache.estados_cambiados
+        politica (str): advertir, bloquear o dias
+        dias (int): Días de la política `dias`
+        usar_bloom (bool): Pone un filtro de Bloom delante del diccionario
+        sync_segundos (float): Mínimo de segundos entre sincronizaciones
+        solapamiento (float): Segundos antes de la última fecha vista que se
+            vuelven a aplicar al sincronizar
+        clock (callable): Reloj en segundos desde la época, inyectable en pruebas
+    """
+
+    def __init__(self, fuente_fn=None, reconstrucciones_fn=None, cambios_fn=None, politica=POLITICA, dias=DIAS,
+                 usar_bloom=USAR_BLOOM, sync_segundos=SYNC_SEGUNDOS,
+                 solapamiento=SOLAPAMIENTO_SEGUNDOS, clock=time.time):
+        if politica not in POLITICAS:
+            raise ValueError(f"Política de duplicados desconocida: {politica} (use {', '.join(POLITICAS)})")
+        if fuente_fn is None:
+            from solicitudes_cache import get_solicitudes_cache
+            cache = get_solicitudes_cache()
+            fuente_fn = cache.refresh
+            reconstrucciones_fn = reconstrucciones_fn or (lambda: cache.stats["resincronizaciones"])
+            cambios_fn = cambios_fn or cache.estados_cambiados
+
+        self._fuente_fn = fuente_fn
+        self._reconstrucciones_fn = reconstrucciones_fn or (lambda: 0)
+        self._cambios_fn = cambios_fn or (lambda desde: (0, pd.DataFrame(columns=["id", "estado"])))
+        self._politica = politica
+        self._dias = dias
+        self._usar_bloom = usar_bloom
+        self._sync_segundos = sync_segundos
+        self._solapamiento = solapamiento
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._por_cedula = None
+        # id -> cédula, para cambiar el estado de una solicitud sin recorrer el índice
+        self._cedula_por_id = None
+        # Solicitudes registradas mientras se construye el índice; se agregan al terminar
+        self._registros_en_construccion = None
+        self._bloom = None
+        self._fuente_reconstrucciones = None
+        # Versión de los cambios de estado de la fuente ya aplicados
+        self._version_estados = None
+        self._marca_sync = 0
+        self._ultima_sync = 0.0
+        self.stats = {
+            "reconstrucciones": 0, "ultima_reconstruccion_segundos": 0.0, "sincronizaciones": 0,
+            "estados_sincronizados": 0,
+            "verificaciones": 0, "verificaciones_sin_indice": 0, "descartadas_por_bloom": 0,
+            "duplicadas": 0, "bloqueadas": 0,
+        }
+
+    @property
+    def construido(self):
+        return self._por_cedula is not None
+
+    def reconstruir(self):
+        """
+        Construye el índice desde cero con todas las solicitudes de la fuente
+
+        Returns:
+            int: Solicitudes indexadas
+        """
+        with self._sync_lock:
+            return self._reconstruir()
+
+    def construir_en_segundo_plano(self):
+        """
+        Lanza la construcción en un hilo si el índice no está construido ni
+        en construcción
+
+        Returns:
+            bool: True si se lanzó la construcción
+        """
+        if self.construido or self._sync_lock.locked():
+            return False
+        threading.Thread(target=self._construir_en_segundo_plano, name="indice-cedulas", daemon=True).start()
+        return True
+
+    def sincronizar(self):
+        """
+        Aplica las filas nuevas y los cambios de estado desde la última
+        sincronización
+
+        Returns:
+            int: Filas aplicadas (todas si hubo que reconstruir)
+        """
+        with self._sync_lock:
+            if not self.construido:
+                return self._reconstruir()
+            version_inicial = self._cambios_fn(None)[0]
+            df = self._fuente_fn()
+            if self._reconstrucciones_fn() != self._fuente_reconstrucciones:
+                # La fuente bajó la tabla completa: puede haber filas modificadas o borradas
+                return self._reconstruir(df, version_inicial)
+            # Se leen después del refresco: incluyen todo lo que trae `df`
+            version, cambios = self._cambios_fn(self._version_estados)
+            if cambios is None:
+                return self._reconstruir(df, version_inicial)
+            # Las filas repetidas del solapamiento solo se reemplazan por id
+            nuevas = df[self._segundos_columna(df) >= self._marca_sync - self._solapamiento]
+            with self._lock:
+                self._ultima_sync = self._clock()
+                self.stats["sincronizaciones"] += 1
+                self._marca_sync = max(
+                    self._marca_sync, self._agregar_filas(self._por_cedula, self._cedula_por_id, nuevas)
+                )
+                # Después de las filas, para que quede el estado más reciente
+                self.stats["estados_sincronizados"] += self._cambiar_estados(zip(cambios["id"], cambios["estado"]))
+                self._version_estados = version
+            return len(nuevas) + len(cambios)
+
+    def registrar(self, solicitud):
+        """
+        Agrega al índice una solicitud recién enviada
+
+        Args:
+            solicitud (dict): Fila con id, cedula, tipo_prestamo, fecha_solicitud y estado
+        """
+        self.registrar_lote(pd.DataFrame([solicitud]))
+
+    def registrar_lote(self, df):
+        """
+        Agrega al índice un DataFrame de solicitudes recién cargadas
+        """
+        if df.empty:
+            return
+        with self._lock:
+            # La fuente de una construcción en curso puede no tenerlas todavía
+            if self._registros_en_construccion is not None:
+                self._registros_en_construccion.append(df)
+            if self._por_cedula is not None:
+                self._agregar_filas(self._por_cedula, self._cedula_por_id, df)
+
+    def actualizar_estado(self, ids, estado):
+        """
+        Cambia el estado de solicitudes ya indexadas, en cuanto el cambio se
+        aplica en este proceso (sin esperar a la próxima sincronización)
+
+        Args:
+            ids (list): Ids de las solicitudes que cambiaron
+            estado (str): Estado nuevo
+        """
+        if not self.construido:
+            return
+        with self._lock:
+            self._cambiar_estados((id_, estado) for id_ in ids)
+
+    def verificar(self, cedula, tipo_prestamo):
+        """
+        Busca solicitudes previas de la cédula y aplica la política configurada
+
+        Si el índice aún no está construido se lanza su construcción en
+        segundo plano y la solicitud se deja pasar sin verificar; si está
+        vencido se sincroniza en segundo plano.
+
+        Args:
+            cedula (str): Cédula con o sin formato
+            tipo_prestamo (str): Tipo de la nueva solicitud
+
+        Returns:
+            Verificacion: duplicada, bloquear, mensaje para el usuario (sin
+                emoji: la app elige cómo mostrarlo) y solicitudes previas del
+                mismo tipo
+        """
+        if not self.construido:
+            # Construirlo aquí haría esperar varios segundos al primer envío del proceso
+            self.construir_en_segundo_plano()
+            with self._lock:
+                self.stats["verificaciones_sin_indice"] += 1
+            return Verificacion(False, False, None, [])
+        if self._clock() - self._ultima_sync > self._sync_segundos and not self._sync_lock.locked():
+            threading.Thread(target=self._sincronizar_en_segundo_plano, daemon=True).start()
+
+        clave = normalizar_cedula(cedula)
+        with self._lock:
+            self.stats["verificaciones"] += 1
+            if clave is None:
+                return Verificacion(False, False, None, [])
+            if self._bloom is not None and clave not in self._bloom:
+                self.stats["descartadas_por_bloom"] += 1
+                return Verificacion(False, False, None, [])
+            solicitudes = [Previa(id_, *fila) for id_, fila in self._por_cedula.get(clave, {}).items()]
+
+        previas = sorted(
+            (p for p in solicitudes if p.tipo_prestamo == tipo_prestamo),
+            key=lambda p: p.fecha, reverse=True,
+        )
+        abiertas = [p for p in solicitudes if p.estado in ESTADOS_ABIERTOS]
+        if not previas:
+            if abiertas:
+                aviso = f"Esta cédula tiene {len(abiertas)} solicitud(es) abierta(s) de otro tipo"
+                return Verificacion(False, False, aviso, [])
+            return Verificacion(False, False, None, [])
+
+        ultima = previas[0]
+        dias_desde = max(0.0, (self._clock() - ultima.fecha) / 86400)
+        descripcion = (
+            f"Esta cédula ya tiene {len(previas)} solicitud(es) de préstamo {tipo_prestamo}; "
+            f"la última hace {dias_desde:.0f} días, en estado {ultima.estado}"
+        )
+        if self._politica == "bloquear":
+            bloquear = True
+        elif self._politica == "dias":
+            bloquear = any(p.estado in ESTADOS_ABIERTOS for p in previas) or dias_desde < self._dias
+        else:
+            bloquear = False
+
+        with self._lock:
+            self.stats["duplicadas"] += 1
+            self.stats["bloqueadas"] += bloquear
+        if bloquear and self._politica == "dias":
+            descripcion += f". Podrá solicitar de nuevo cuando la anterior se cierre y pasen {self._dias} días"
+        return Verificacion(True, bloquear, descripcion, previas)
+
+    def estadisticas(self):
+        """
+        Retorna el tamaño del índice y sus contadores
+
+        Returns:
+            dict: Cédulas, solicitudes, memoria estimada en bytes y contadores
+        """
+        with self._lock:
+            por_cedula = self._por_cedula or {}
+            solicitudes = sum(len(s) for s in por_cedula.values())
+            memoria = sys.getsizeof(por_cedula) + sys.getsizeof(self._cedula_por_id or {}) + sum(
+                sys.getsizeof(clave) + sys.getsizeof(s) + sum(
+                    sys.getsizeof(id_) + sys.getsizeof(fila) + sys.getsizeof(fila[1]) for id_, fila in s.items()
+                )
+                for clave, s in por_cedula.items()
+            )
+            return {
+                "construido": self._por_cedula is not None,
+                "politica": self._politica,
+                "cedulas": len(por_cedula),
+                "solicitudes": solicitudes,
+                "memoria_bytes": memoria,
+                "bloom_bytes": self._bloom.bytes if self._bloom is not None else 0,
+                **self.stats,
+            }
+
+    # ---------- Internos ----------
+
+    def _reconstruir(self, df=None, version_estados=None):
+        # Se llama con _sync_lock tomado; el índice anterior sigue en uso hasta el cambio.
+        # `version_estados` es anterior a `df`: los cambios posteriores se vuelven a
+        # aplicar en la próxima sincronización, aunque `df` ya los traiga
+        inicio = time.perf_counter()
+        with self._lock:
+            self._registros_en_construccion = []
+        try:
+            if df is None:
+                version_estados = self._cambios_fn(None)[0]
+                df = self._fuente_fn()
+            por_cedula, cedula_por_id = {}, {}
+            marca = self._agregar_filas(por_cedula, cedula_por_id, df)
+        except Exception:
+            with self._lock:
+                self._registros_en_construccion = None
+            raise
+        bloom = None
+        if self._usar_bloom:
+            bloom = BloomFilter(2 * len(por_cedula))
+            for clave in por_cedula:
+                bloom.add(clave)
+        with self._lock:
+            for registrados in self._registros_en_construccion:
+                self._agregar_filas(por_cedula, cedula_por_id, registrados)
+                if bloom is not None:
+                    for clave in por_cedula.keys() & set(map(normalizar_cedula, registrados["cedula"])):
+                        bloom.add(clave)
+            self._registros_en_construccion = None
+            self._por_cedula, self._cedula_por_id, self._bloom = por_cedula, cedula_por_id, bloom
+            self._marca_sync = marca
+            self._version_estados = version_estados
+            self._ultima_sync = self._clock()
+            self._fuente_reconstrucciones = self._reconstrucciones_fn()
+            self.stats["reconstrucciones"] += 1
+            self.stats["ultima_reconstruccion_segundos"] = time.perf_counter() - inicio
+        print(f"✅ Índice de cédulas construido: {len(df)} solicitudes en {time.perf_counter() - inicio:.1f} s")
+        return len(df)
+
+    def _construir_en_segundo_plano(self):
+        try:
+            with self._sync_lock:
+                if not self.construido:
+                    self._reconstruir()
+        except Exception as e:
+            print(f"⚠️ No se pudo construir el índice de cédulas: {e}")
+
+    def _sincronizar_en_segundo_plano(self):
+        try:
+            self.sincronizar()
+        except Exception as e:
+            print(f"⚠️ No se pudo sincronizar el índice de cédulas: {e}")
+
+    def _cambiar_estados(self, cambios):
+        """
+        Cambia el estado de las solicitudes indexadas (se llama con _lock
+        tomado); retorna cuántas estaban en el índice
+        """
+        cambiadas = 0
+        for id_, estado in cambios:
+            clave = self._cedula_por_id.get(id_)
+            fila = self._por_cedula.get(clave, {}).get(id_)
+            if fila is not None:
+                self._por_cedula[clave][id_] = (fila[0], fila[1], estado)
+                cambiadas += 1
+        return cambiadas
+
+    @staticmethod
+    def _segundos_columna(df):
+        fechas = pd.to_datetime(df["fecha_solicitud"], utc=True, format="mixed")
+        return (fechas - _EPOCA) // pd.Timedelta(seconds=1)
+
+    def _agregar_filas(self, por_cedula, cedula_por_id, df):
+        """
+        Agrega o reemplaza filas en el diccionario; retorna la fecha más reciente
+        """
+        if df.empty:
+            return 0
+        claves = df["cedula"].astype(str).str.replace(r"\D", "", regex=True)
+        fechas = self._segundos_columna(df)
+        bloom = self._bloom if por_cedula is self._por_cedula else None
+        for id_, clave, tipo, fecha, estado in zip(
+            df["id"], claves, df["tipo_prestamo"], fechas, df["estado"]
+        ):
+            if not clave:
+                continue
+            clave = int(clave)
+            por_cedula.setdefault(clave, {})[id_] = (tipo, int(fecha), estado)
+            cedula_por_id[id_] = clave
+            if bloom is not None:
+                bloom.add(clave)
+        return int(fechas.max())
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def get_indice_cedulas():
+    """
+    Retorna el índice de cédulas compartido por el proceso (sin construirlo)
+    """
+    global _indice
+    with _indice_lock:
+        if _indice is None:
+            _indice = IndiceCedulas()
+        return _indice
+
+
+def verificar_duplicado(cedula, tipo_prestamo):
+    """
+    Verifica una solicitud contra el índice sin interrumpir el envío si falla
+
+    Returns:
+        Verificacion: Resultado; si el índice no está disponible, se permite el envío
+    """
+    try:
+        return get_indice_cedulas().verificar(cedula, tipo_prestamo)
+    except Exception as e:
+        print(f"⚠️ No se pudo verificar duplicados: {e}")
+        return Verificacion(False, False, None, [])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye el índice de cédulas y muestra sus estadísticas")
+    parser.add_argument("--cedula", help="Verifica una cédula después de construir el índice")
+    parser.add_argument("--tipo", default="Personal", help="Tipo de préstamo para --cedula")
+    args = parser.parse_args()
+
+    indice = get_indice_cedulas()
+    indice.reconstruir()
+    for clave, valor in indice.estadisticas().items():
+        print(f"   {clave}: {valor}")
+    if args.cedula:
+        print(indice.verificar(args.cedula, args.tipo))
@@ -0,0 +1,370 @@
+"""
+Métricas de acceso a datos: latencia, filas, bytes y errores por operación.
+
+gcp_config registra aquí cada llamada al cliente de BigQuery, etiquetada con
+la operación y el método del cliente (query, get_table, insert_rows_json...).
+La operación se declara: cada función de gcp_config lleva el decorador
+como_operacion, y el código que usa el cliente directamente (migrar_tabla.py)
+hace lo mismo o usa `with operacion("nombre"):`. Si una operación llama a
+otra, las llamadas cuentan para la de afuera; sin operación declarada quedan
+como SIN_OPERACION. Por cada par se acumula:
+
+- un histograma de latencia (segundos, cubetas BUCKETS),
+- filas leídas o escritas,
+- bytes procesados y facturados, slot-milisegundos y aciertos de la caché de
+  BigQuery (solo consultas),
+- errores por tipo de excepción.
+
+Salidas:
+- texto_prometheus(): formato de exposición de Prometheus. Con METRICAS_ARCHIVO
+  se escribe a ese archivo cada METRICAS_INTERVALO segundos (para el textfile
+  collector de node_exporter) y con METRICAS_PUERTO se sirve por HTTP en /metrics.
+- METRICAS_LOG=true: una línea JSON por llamada en el logger `metricas`.
+- resumen(): filas para el panel de administración de la app.
+
+Con METRICAS_ACTIVAS=false get_registro() retorna None y gcp_config usa el
+cliente sin envolver: no queda ningún costo por llamada.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from configuracion import get_configuracion
+
+_config = get_configuracion()
+METRICAS_ACTIVAS = _config.metricas_activas
+METRICAS_LOG = _config.metricas_log
+METRICAS_ARCHIVO = _config.metricas_archivo
+METRICAS_INTERVALO = _config.metricas_intervalo
+METRICAS_PUERTO = _config.metricas_puerto
+
+# Límites superiores (segundos) de las cubetas del histograma de latencia
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Acumuladores de cada serie que se exportan como contadores
+CONTADORES = {
+    "filas": ("datos_filas_total", "Filas leídas o escritas"),
+    "bytes_procesados": ("bigquery_bytes_procesados_total", "Bytes procesados por las consultas"),
+    "bytes_facturados": ("bigquery_bytes_facturados_total", "Bytes facturados por las consultas"),
+    "slot_ms": ("bigquery_slot_milisegundos_total", "Slot-milisegundos consumidos por las consultas"),
+    "cache_aciertos": ("bigquery_cache_aciertos_total", "Consultas respondidas por la caché de BigQuery"),
+}
+
+# Etiqueta de las llamadas hechas fuera de una operación declarada
+SIN_OPERACION = "sin_operacion"
+
+logger = logging.getLogger("metricas")
+
+# Operación en curso en este hilo (los hilos nuevos empiezan sin ninguna)
+_operacion_actual = contextvars.ContextVar("operacion_metricas", default=None)
+
+
+def operacion_actual():
+    """
+    Retorna la operación declarada en curso, o SIN_OPERACION
+    """
+    return _operacion_actual.get() or SIN_OPERACION
+
+
+@contextmanager
+def operacion(nombre):
+    """
+    Etiqueta con `nombre` las llamadas al cliente hechas dentro del bloque,
+    salvo que ya haya una operación en curso (se conserva la de afuera)
+    """
+    if _operacion_actual.get() is not None:
+        yield
+        return
+    token = _operacion_actual.set(nombre)
+    try:
+        yield
+    finally:
+        _operacion_actual.reset(token)
+
+
+def como_operacion(funcion):
+    """
+    Decorador: las llamadas al cliente dentro de la función se etiquetan con
+    su nombre. En un generador la etiqueta solo rige mientras avanza, no entre
+    un bloque y el siguiente; las excepciones y el cierre del generador de
+    afuera se pasan al de adentro, para que corran sus except y finally.
+    """
+    nombre = funcion.__name__
+    if inspect.isgeneratorfunction(funcion):
+        @functools.wraps(funcion)
+        def generador(*args, **kwargs):
+            iterador = funcion(*args, **kwargs)
+            avanzar = iterador.__next__
+            try:
+                while True:
+                    with operacion(nombre):
+                        try:
+                            valor = avanzar()
+                        except StopIteration as fin:
+                            return fin.value
+                    avanzar = iterador.__next__
+                    try:
+                        yield valor
+                    except GeneratorExit:
+                        raise
+                    except BaseException as e:
+                        avanzar = functools.partial(iterador.throw, e)
+            finally:
+                with operacion(nombre):
+                    iterador.close()
+        return generador
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        with operacion(nombre):
+            return funcion(*args, **kwargs)
+    return envoltura
+
+
+class _Serie:
+    """
+    Acumuladores de un par (operación, método)
+    """
+
+    def __init__(self):
+        self.cubetas = [0] * (len(BUCKETS) + 1)
+        self.llamadas = 0
+        self.segundos = 0.0
+        self.minimo = float("inf")
+        self.maximo = 0.0
+        self.errores = {}
+        for campo in CONTADORES:
+            setattr(self, campo, 0)
+
+    def percentil(self, q):
+        """
+        Estima el percentil q (0-1) interpolando dentro de la cubeta, acotado
+        por la menor y la mayor duración observadas
+        """
+        if not self.llamadas:
+            return None
+        objetivo = q * self.llamadas
+        acumulado = 0
+        for i, cantidad in enumerate(self.cubetas):
+            if cantidad and acumulado + cantidad >= objetivo:
+                inferior = max(BUCKETS[i - 1] if i else 0.0, self.minimo)
+                superior = min(BUCKETS[i] if i < len(BUCKETS) else self.maximo, self.maximo)
+                return inferior + (superior - inferior) * (objetivo - acumulado) / cantidad
+            acumulado += cantidad
+        return self.maximo
+
+
+class RegistroMetricas:
+    """
+    Registro de métricas del proceso, seguro entre hilos
+
+    Args:
+        log (bool): Escribir cada llamada como una línea JSON en el logger `metricas`
+    """
+
+    def __init__(self, log=METRICAS_LOG):
+        self._log = log
+        self._lock = threading.Lock()
+        self._series = {}
+        self._desde = time.time()
+
+    def registrar(self, operacion, metodo, segundos, error=None, **valores):
+        """
+        Anota una llamada
+
+        Args:
+            operacion (str): Operación declarada que hizo la llamada
+            metodo (str): Método del cliente (query, get_table...)
+            segundos (float): Duración
+            error (Exception): Excepción si la llamada falló
+            **valores: Acumuladores de CONTADORES (None se ignora; cache_aciertos
+                acepta un booleano)
+        """
+        with self._lock:
+            serie = self._series.get((operacion, metodo))
+            if serie is None:
+                serie = self._series[(operacion, metodo)] = _Serie()
+            serie.llamadas += 1
+            serie.segundos += segundos
+            serie.minimo = min(serie.minimo, segundos)
+            serie.maximo = max(serie.maximo, segundos)
+            serie.cubetas[bisect_left(BUCKETS, segundos)] += 1
+            if error is not None:
+                tipo = type(error).__name__
+                serie.errores[tipo] = serie.errores.get(tipo, 0) + 1
+            for campo, valor in valores.items():
+                if valor:
+                    setattr(serie, campo, getattr(serie, campo) + int(valor))
+
+        if self._log:
+            evento = {"operacion": operacion, "metodo": metodo, "segundos": round(segundos, 6)}
+            evento.update((campo, valor) for campo, valor in valores.items() if valor is not None)
+            if error is not None:
+                evento["error"] = f"{type(error).__name__}: {error}"
+            logger.info(json.dumps(evento, ensure_ascii=False, default=str))
+
+    @contextmanager
+    def medir(self, operacion, metodo):
+        """
+        Mide el bloque y lo registra; los acumuladores se agregan al dict que entrega
+        """
+        valores = {}
+        inicio = time.perf_counter()
+        try:
+            yield valores
+        except Exception as e:
+            self.registrar(operacion, metodo, time.perf_counter() - inicio, error=e, **valores)
+            raise
+        self.registrar(operacion, metodo, time.perf_counter() - inicio, **valores)
+
+    def resumen(self):
+        """
+        Una fila por (operación, método) para mostrar en pantalla
+
+        Returns:
+            list: Dicts con llamadas, errores, latencias y acumuladores
+        """
+        with self._lock:
+            return [
+                {
+                    "operacion": operacion,
+                    "metodo": metodo,
+                    "llamadas": serie.llamadas,
+                    "errores": sum(serie.errores.values()),
+                    "promedio_ms": 1000 * serie.segundos / serie.llamadas,
+                    "p50_ms": 1000 * serie.percentil(0.5),
+                    "p95_ms": 1000 * serie.percentil(0.95),
+                    **{campo: getattr(serie, campo) for campo in CONTADORES},
+                }
+                for (operacion, metodo), serie in sorted(self._series.items())
+            ]
+
+    def texto_prometheus(self):
+        """
+        Retorna las métricas en el formato de exposición de Prometheus
+        """
+        lineas = [
+            "# HELP datos_llamada_segundos Latencia de las llamadas a BigQuery",
+            "# TYPE datos_llamada_segundos histogram",
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+            for (operacion, metodo), serie in series:
+                etiquetas = f'operacion="{operacion}",metodo="{metodo}"'
+                acumulado = 0
+                for limite, cantidad in zip(BUCKETS + ("+Inf",), serie.cubetas):
+                    acumulado += cantidad
+                    lineas.append(f'datos_llamada_segundos_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+                lineas.append(f"datos_llamada_segundos_sum{{{etiquetas}}} {serie.segundos:.6f}")
+                lineas.append(f"datos_llamada_segundos_count{{{etiquetas}}} {serie.llamadas}")
+
+            lineas += ["# HELP datos_errores_total Llamadas fallidas por tipo de error",
+                       "# TYPE datos_errores_total counter"]
+            for (operacion, metodo), serie in series:
+                for tipo, cantidad in sorted(serie.errores.items()):
+                    lineas.append(
+                        f'datos_errores_total{{operacion="{operacion}",metodo="{metodo}",tipo="{tipo}"}} {cantidad}'
+                    )
+
+            for campo, (nombre, ayuda) in CONTADORES.items():
+                lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+                for (operacion, metodo), serie in series:
+                    lineas.append(f'{nombre}{{operacion="{operacion}",metodo="{metodo}"}} {getattr(serie, campo)}')
+
+        lineas += ["# HELP datos_metricas_desde_segundos Momento (epoch) en que se empezó a medir",
+                   "# TYPE datos_metricas_desde_segundos gauge",
+                   f"datos_metricas_desde_segundos {self._desde:.0f}"]
+        return "\n".join(lineas) + "\n"
+
+    def escribir_prometheus(self, path):
+        """
+        Escribe texto_prometheus() en un archivo, de forma atómica
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporal = f"{path}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(self.texto_prometheus())
+        os.replace(temporal, path)
+
+    def reiniciar(self):
+        """
+        Borra todo lo acumulado
+        """
+        with self._lock:
+            self._series.clear()
+            self._desde = time.time()
+
+
+def _exportar_a_archivo(registro, path, intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            registro.escribir_prometheus(path)
+        except OSError as e:
+            print(f"⚠️ No se pudieron escribir las métricas en {path}: {e}")
+
+
+def _servir_http(registro, puerto):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = registro.texto_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        servidor = ThreadingHTTPServer(("", puerto), Manejador)
+    except OSError as e:
+        # Otro proceso (por ejemplo otra instancia de la app) ya usa el puerto
+        print(f"⚠️ No se pudo exponer las métricas en el puerto {puerto}: {e}")
+        return
+    print(f"📈 Métricas en http://localhost:{puerto}/metrics")
+    servidor.serve_forever()
+
+
+_registro = None
+_registro_lock = threading.Lock()
+
+
+def get_registro():
+    """
+    Retorna el registro del proceso, o None si las métricas están desactivadas
+
+    La primera llamada lanza los hilos que exportan a METRICAS_ARCHIVO y
+    METRICAS_PUERTO, si están configurados.
+    """
+    global _registro
+    if not METRICAS_ACTIVAS:
+        return None
+    if _registro is None:
+        with _registro_lock:
+            if _registro is None:
+                registro = RegistroMetricas()
+                if METRICAS_ARCHIVO:
+                    threading.Thread(
+                        target=_exportar_a_archivo, args=(registro, METRICAS_ARCHIVO, METRICAS_INTERVALO),
+                        name="metricas-archivo", daemon=True,
+                    ).start()
+                if METRICAS_PUERTO:
+                    threading.Thread(
+                        target=_servir_http, args=(registro, METRICAS_PUERTO), name="metricas-http", daemon=True,
+                    ).start()
+                _registro = registro
+    return _registro
@@ -0,0 +1,288 @@
+"""
+Migra la tabla solicitudes_prestamo al esquema particionado y agrupado.
+
+La tabla original no tiene particiones, así que cada consulta lee (y se
+factura) el historial completo. Este script:
+
+1. Crea una tabla nueva particionada por día en fecha_solicitud y agrupada
+   por estado, tipo_prestamo y cedula, y copia todas las filas con una sola
+   consulta. La aplicación sigue escribiendo en la original.
+2. Pausa las escrituras (crea BATCH_WRITER_PAUSA_PATH) y espera a que
+   terminen las que están en curso. Las solicitudes se siguen aceptando y
+   quedan en el spool, las importaciones esperan y los cambios de estado
+   fallan con TablaEnMantenimiento (ver storage.py).
+3. Con la tabla quieta, copia a la nueva las filas que llegaron durante el
+   paso 1, le pasa los cambios de estado hechos durante el paso 1 a filas
+   ya copiadas (MERGE por id) y guarda la original completa como respaldo
+   (__respaldo_<fecha>). Las copias son consultas: los copy jobs no ven las
+   filas que aún están en el búfer de streaming. Antes de intercambiar se
+   comprueba que la nueva tenga todas las filas y los mismos estados.
+4. Intercambia las tablas y mantiene la pausa mientras BigQuery actualiza la
+   tabla recreada en el streaming (hasta unos minutos, en los que una
+   inserción puede responder sin error y perderse). Luego quita la pausa y
+   el escritor envía lo acumulado.
+
+La pausa es un archivo local: si la aplicación corre en varios servidores,
+BATCH_WRITER_PAUSA_PATH debe apuntar a un disco compartido, o hay que
+detener la aplicación en los demás antes de migrar.
+
+Uso:
+    python migrar_tabla.py --dry-run          # Solo reporta bytes antes/después
+    python migrar_tabla.py                    # Migra
+    python migrar_tabla.py --fake 100000      # Prueba con el cliente falso
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from google.cloud import bigquery
+import gcp_config
+from gcp_config import (
+    PROJECT_ID, DATASET_ID, TABLE_ID, get_bigquery_client, construir_consulta_solicitudes,
+    estimar_bytes, aplicar_particionado, esta_particionada, sql_merge,
+)
+from consultas import VENTANA_DIAS
+from batch_writer import PAUSA_PATH
+from metricas import como_operacion
+
+# Segundos para que termine un envío que empezó antes de la pausa
+ESPERA_PAUSA = 60
+# Segundos que la pausa se mantiene después de recrear la tabla
+ESPERA_STREAMING = 300
+
+
+def consultas_representativas(tabla):
+    """
+    Arma las consultas que hace la aplicación con más frecuencia
+
+    Returns:
+        list: Tuplas (descripción, SQL, QueryJobConfig)
+    """
+    hace_un_mes = datetime.now(timezone.utc).date() - timedelta(days=30)
+    incremental = f"""
+        SELECT *
+        FROM `{tabla}`
+        WHERE fecha_solicitud >= @desde
+          AND (fecha_solicitud > @desde OR id > @desde_id)
+    """
+    return [
+        (f"Listado, primera página (últimos {VENTANA_DIAS} días)",
+         *construir_consulta_solicitudes(tabla=tabla)),
+        ("Listado, pendientes del último mes",
+         *construir_consulta_solicitudes({"estado": ["Pendiente"], "fecha_desde": hace_un_mes}, tabla=tabla)),
+        ("Refresco incremental (últimos 10 minutos)", incremental, bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("desde", "TIMESTAMP", datetime.now(timezone.utc) - timedelta(minutes=10)),
+                bigquery.ScalarQueryParameter("desde_id", "STRING", ""),
+            ]
+        )),
+    ]
+
+
+def _fraccion_en_rango(tabla, job_config):
+    """
+    Fracción de filas cuya fecha cae dentro de los filtros de fecha de la consulta.
+    Solo lee la columna fecha_solicitud (8 bytes por fila).
+    """
+    parametros = {p.name: p for p in job_config.query_parameters}
+    condiciones = []
+    if "fecha_desde" in parametros:
+        condiciones.append("fecha_solicitud >= @fecha_desde")
+    if "desde" in parametros:
+        condiciones.append("fecha_solicitud >= @desde")
+    if "fecha_hasta" in parametros:
+        condiciones.append("fecha_solicitud < @fecha_hasta")
+    if not condiciones:
+        return 1.0
+
+    query = f"""
+        SELECT COUNT(*) AS total,
+               SUM(CASE WHEN {' AND '.join(condiciones)} THEN 1 ELSE 0 END) AS en_rango
+        FROM `{tabla}`
+    """
+    usados = [p for nombre, p in parametros.items() if f"@{nombre}" in query]
+    df = get_bigquery_client().query(
+        query, job_config=bigquery.QueryJobConfig(query_parameters=usados)
+    ).to_dataframe()
+    total, en_rango = int(df["total"].iloc[0]), int(df["en_rango"].iloc[0] or 0)
+    return en_rango / total if total else 1.0
+
+
+@como_operacion
+def reporte_bytes(tabla, estimar_particionada=False):
+    """
+    Calcula los bytes procesados por cada consulta representativa
+
+    Args:
+        tabla (str): Tabla completa a medir
+        estimar_particionada (bool): Además estima cuánto procesaría la misma
+            consulta si la tabla estuviera particionada
+
+    Returns:
+        list: Tuplas (descripción, bytes actuales, bytes estimados o None)
+    """
+    filas = []
+    for descripcion, query, job_config in consultas_representativas(tabla):
+        actuales = estimar_bytes(query, job_config)
+        estimados = int(actuales * _fraccion_en_rango(tabla, job_config)) if estimar_particionada else None
+        filas.append((descripcion, actuales, estimados))
+    return filas
+
+
+def _imprimir_reporte(titulo, filas, titulo_estimado="Particionada (est.)"):
+    print(f"\n📊 {titulo}")
+    for descripcion, actuales, estimados in filas:
+        linea = f"   {descripcion:<48} {actuales / 1024 / 1024:>10.2f} MB"
+        if estimados is not None:
+            ahorro = 100 * (1 - estimados / actuales) if actuales else 0
+            linea += f"  ->  {titulo_estimado}: {estimados / 1024 / 1024:>10.2f} MB ({ahorro:.0f}% menos)"
+        print(linea)
+
+
+def _contar(client, tabla):
+    # COUNT(*) incluye el búfer de streaming; num_rows de la tabla no
+    return int(client.query(f"SELECT COUNT(*) AS filas FROM `{tabla}`").to_dataframe()["filas"].iloc[0])
+
+
+def _contar_estados_distintos(client, tabla, nueva):
+    return int(client.query(f"""
+        SELECT COUNT(*) AS filas
+        FROM `{nueva}` AS n
+        JOIN `{tabla}` AS o ON o.id = n.id
+        WHERE n.estado != o.estado
+    """).to_dataframe()["filas"].iloc[0])
+
+
+@como_operacion
+def migrar(dry_run=False, espera_pausa=ESPERA_PAUSA, espera_streaming=ESPERA_STREAMING, pausa_path=PAUSA_PATH):
+    """
+    Migra la tabla al esquema particionado y agrupado
+
+    Args:
+        dry_run (bool): Solo reporta los bytes antes y los estimados después
+        espera_pausa (float): Segundos que se espera a los envíos en curso
+            después de pausar las escrituras
+        espera_streaming (float): Segundos que la pausa sigue después de
+            recrear la tabla
+        pausa_path (str): Archivo que pausa las escrituras en la tabla
+
+    Returns:
+        bool: True si la tabla quedó (o ya estaba) particionada, o si fue dry-run
+    """
+    client = get_bigquery_client()
+    tabla_id = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
+    origen = client.get_table(tabla_id)
+
+    if esta_particionada(origen):
+        print(f"ℹ️  La tabla {tabla_id} ya está particionada y agrupada.")
+        _imprimir_reporte("Bytes procesados por consulta", reporte_bytes(tabla_id))
+        return True
+
+    antes = reporte_bytes(tabla_id, estimar_particionada=dry_run)
+    _imprimir_reporte("Antes de migrar (tabla sin particionar)", antes)
+    if dry_run:
+        print("\nℹ️  Dry-run: no se modificó ninguna tabla.")
+        return True
+
+    sufijo = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    nueva_id = f"{tabla_id}__particionada_{sufijo}"
+    respaldo_id = f"{tabla_id}__respaldo_{sufijo}"
+
+    print(f"\n🔄 Creando {nueva_id}...")
+    nueva = aplicar_particionado(bigquery.Table(nueva_id, schema=origen.schema))
+    client.create_table(nueva)
+
+    print("🔄 Copiando filas...")
+    copia = bigquery.QueryJobConfig(destination=nueva_id, write_disposition="WRITE_APPEND")
+    client.query(f"SELECT * FROM `{tabla_id}`", job_config=copia).result()
+
+    print(f"⏸️ Pausando las escrituras ({pausa_path}) y esperando {espera_pausa:.0f} s a las que están en curso...")
+    os.makedirs(os.path.dirname(pausa_path) or ".", exist_ok=True)
+    open(pausa_path, "w").close()
+    try:
+        time.sleep(espera_pausa)
+
+        # Filas que llegaron a la original mientras se copiaba
+        recuperacion = client.query(f"""
+            INSERT INTO `{nueva_id}`
+            SELECT * FROM `{tabla_id}`
+            WHERE id NOT IN (SELECT id FROM `{nueva_id}`)
+        """)
+        recuperacion.result()
+        print(f"   Filas llegadas durante la copia: {recuperacion.num_dml_affected_rows}")
+
+        # Cambios de estado (estados.aplicar_transiciones) a filas que ya se habían copiado
+        conciliacion = client.query(sql_merge(nueva_id, tabla_id, ["estado"], "t.estado != s.estado"))
+        conciliacion.result()
+        print(f"   Estados cambiados durante la copia: {conciliacion.num_dml_affected_rows}")
+
+        client.create_table(bigquery.Table(respaldo_id, schema=origen.schema))
+        respaldo = bigquery.QueryJobConfig(destination=respaldo_id, write_disposition="WRITE_EMPTY")
+        client.query(f"SELECT * FROM `{tabla_id}`", job_config=respaldo).result()
+
+        filas_origen = _contar(client, tabla_id)
+        filas_respaldo = _contar(client, respaldo_id)
+        filas_nueva = _contar(client, nueva_id)
+        estados_distintos = _contar_estados_distintos(client, tabla_id, nueva_id)
+        print(f"   Origen: {filas_origen} filas, respaldo: {filas_respaldo}, nueva: {filas_nueva} "
+              f"({estados_distintos} con otro estado)")
+        if filas_respaldo != filas_origen or filas_nueva < filas_origen or estados_distintos:
+            print("❌ Las copias no coinciden con el origen, se cancela la migración")
+            client.delete_table(nueva_id)
+            client.delete_table(respaldo_id, not_found_ok=True)
+            return False
+
+        print(f"🔄 Intercambiando tablas (respaldo en {respaldo_id})...")
+        client.delete_table(tabla_id)
+        # La nueva solo recibió filas por consultas, así que no tiene búfer de streaming
+        client.copy_table(nueva_id, tabla_id).result()
+        client.delete_table(nueva_id)
+
+        print(f"⏳ Manteniendo la pausa {espera_streaming:.0f} s mientras el streaming reconoce la tabla nueva...")
+        time.sleep(espera_streaming)
+    finally:
+        os.remove(pausa_path)
+        print("▶️ Escrituras reanudadas")
+    print("✅ Migración completa")
+
+    despues = reporte_bytes(tabla_id)
+    _imprimir_reporte("Después de migrar", [
+        (descripcion, bytes_antes, bytes_despues)
+        for (descripcion, bytes_antes, _), (_, bytes_despues, _) in zip(antes, despues)
+    ], titulo_estimado="Particionada")
+    return True
+
+
+def _preparar_cliente_falso(filas):
+    """
+    Instala el cliente falso con una tabla sin particionar y datos sintéticos
+    """
+    from fake_bigquery import FakeBigQueryClient, generar_solicitudes
+    from schema import SCHEMA_SOLICITUDES
+
+    client = FakeBigQueryClient(project=PROJECT_ID)
+    gcp_config.configurar_cliente(lambda: client)
+    tabla_id = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
+    client.create_table(bigquery.Table(tabla_id, schema=[
+        bigquery.SchemaField(c.name, c.field_type, mode=c.mode) for c in SCHEMA_SOLICITUDES
+    ]))
+    for inicio in range(0, filas, 10_000):
+        client.insert_rows_json(tabla_id, generar_solicitudes(min(10_000, filas - inicio), dias=3 * 365, semilla=inicio))
+    print(f"🧪 Cliente falso con {filas} solicitudes sintéticas en {tabla_id}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra solicitudes_prestamo a una tabla particionada")
+    parser.add_argument("--dry-run", action="store_true", help="Solo reporta los bytes procesados antes y después")
+    parser.add_argument("--fake", type=int, metavar="FILAS",
+                        help="Usa el cliente falso local con FILAS solicitudes sintéticas")
+    parser.add_argument("--espera-pausa", type=float, default=ESPERA_PAUSA,
+                        help="Segundos para que terminen los envíos en curso al pausar las escrituras")
+    parser.add_argument("--espera-streaming", type=float, default=ESPERA_STREAMING,
+                        help="Segundos que se mantiene la pausa después de recrear la tabla")
+    args = parser.parse_args()
+
+    if args.fake:
+        _preparar_cliente_falso(args.fake)
+    raise SystemExit(0 if migrar(args.dry_run, args.espera_pausa, args.espera_streaming) else 1)
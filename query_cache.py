@@ -0,0 +1,150 @@
+"""
+Caché de consultas compartida entre todas las sesiones de Streamlit.
+
+Streamlit vuelve a ejecutar `app.py` completo con cada interacción, así que
+los resultados de las consultas se guardan a nivel de proceso, con clave
+(consulta, versión de la tabla). La versión se incrementa cada vez que este
+proceso escribe solicitudes o cuando el usuario pide recargar, y el TTL cubre
+los cambios hechos por otros procesos.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from configuracion import get_configuracion
+
+_config = get_configuracion()
+CACHE_TTL = _config.query_cache_ttl
+CACHE_MAX_ENTRIES = _config.query_cache_max_entries
+CACHE_MAX_MB = _config.query_cache_max_mb
+
+
+def _tamano(valor):
+    """
+    Estima los bytes que ocupa un resultado en memoria
+    """
+    if hasattr(valor, "memory_usage"):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, tuple):
+        return sum(_tamano(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class QueryCache:
+    """
+    Caché LRU con TTL y límite de tamaño para resultados de consultas.
+
+    Args:
+        ttl (float): Segundos que un resultado se considera vigente
+        max_entries (int): Máximo de resultados guardados
+        max_bytes (int): Máximo de memoria estimada para todos los resultados
+        clock (callable): Reloj monotónico, inyectable en pruebas
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 max_bytes=int(CACHE_MAX_MB * 1024 * 1024), clock=time.monotonic):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._cargando = {}
+        self._bytes = 0
+        self._version = 0
+        self.stats = {"consultas_evitadas": 0, "consultas_ejecutadas": 0, "expiradas": 0, "desalojadas": 0}
+
+    @property
+    def version(self):
+        return self._version
+
+    def get_or_load(self, consulta, loader):
+        """
+        Retorna el resultado guardado para la consulta o lo carga con `loader`
+
+        Si varias sesiones piden la misma consulta a la vez, solo una la
+        ejecuta y las demás esperan su resultado.
+
+        Args:
+            consulta (hashable): Identifica la consulta y sus parámetros
+            loader (callable): Función sin argumentos que ejecuta la consulta.
+                Si retorna None el resultado no se guarda.
+
+        Returns:
+            object: Resultado de la consulta
+        """
+        with self._lock:
+            clave = (consulta, self._version)
+            valor = self._leer(clave)
+            if valor is not None:
+                return valor
+            carga = self._cargando.setdefault(clave, threading.Lock())
+
+        with carga:
+            with self._lock:
+                valor = self._leer(clave)
+                if valor is not None:
+                    return valor
+                self.stats["consultas_ejecutadas"] += 1
+
+            try:
+                valor = loader()
+            finally:
+                with self._lock:
+                    self._cargando.pop(clave, None)
+
+            with self._lock:
+                if valor is not None and clave[1] == self._version:
+                    self._guardar(clave, valor)
+            return valor
+
+    def invalidate(self):
+        """
+        Descarta todos los resultados pasando a una nueva versión de la tabla
+        """
+        with self._lock:
+            self._version += 1
+            self._entradas.clear()
+            self._bytes = 0
+
+    # ---------- Internos (se llaman con _lock tomado) ----------
+
+    def _leer(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        valor, tamano, guardado_en = entrada
+        if self._clock() - guardado_en > self._ttl:
+            self._quitar(clave)
+            self.stats["expiradas"] += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.stats["consultas_evitadas"] += 1
+        return valor
+
+    def _guardar(self, clave, valor):
+        if clave in self._entradas:
+            self._quitar(clave)
+        tamano = _tamano(valor)
+        self._entradas[clave] = (valor, tamano, self._clock())
+        self._bytes += tamano
+        while len(self._entradas) > 1 and (
+            len(self._entradas) > self._max_entries or self._bytes > self._max_bytes
+        ):
+            self._quitar(next(iter(self._entradas)))
+            self.stats["desalojadas"] += 1
+
+    def _quitar(self, clave):
+        _, tamano, _ = self._entradas.pop(clave)
+        self._bytes -= tamano
+
+
+_query_cache = QueryCache()
+
+
+def get_query_cache():
+    """
+    Retorna la caché de consultas compartida por el proceso
+    """
+    return _query_cache
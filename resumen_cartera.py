@@ -0,0 +1,233 @@
+"""
+Resumen de la cartera para el tablero: solicitudes y monto por mes, tipo de
+préstamo, estado y banda de monto.
+
+Agrupar la tabla de solicitudes en cada visita al tablero leería todo el
+historial. En su lugar, la tabla resumen_cartera guarda una fila por
+(mes, tipo_prestamo, estado, banda_monto) con la cantidad de solicitudes y el
+monto total, y cada gráfico es una sola consulta pequeña sobre ella: unos
+miles de filas como mucho, sin importar cuántos años tenga la tabla.
+
+El resumen se mantiene por meses. Cada actualización vuelve a agregar solo:
+
+- los meses desde la actualización anterior, menos la misma ventana de
+  solapamiento de la caché local (SOLICITUDES_CACHE_OVERLAP_MINUTES) para
+  las filas que llegan tarde, y
+- los meses de las solicitudes que cambiaron de estado desde entonces
+  (estados.py registra cada cambio en el historial).
+
+En BigQuery cada mes es un rango sobre fecha_solicitud, así que solo se leen
+las particiones de esos meses, y el borrado y la nueva agregación van en una
+misma transacción. Después se compara cuántas solicitudes anteriores a esos
+meses tiene la tabla (en BigQuery, con los conteos por partición de
+INFORMATION_SCHEMA.PARTITIONS, sin leer la tabla) y cuántas cuenta el
+resumen; si no coinciden (una importación con fechas antiguas, filas
+borradas) el resumen se reconstruye completo.
+
+En la app el resumen se actualiza en segundo plano, a lo sumo cada
+RESUMEN_ACTUALIZAR_SEGUNDOS o cuando este proceso escribió solicitudes.
+
+Uso (por ejemplo, desde cron):
+    python resumen_cartera.py
+    python resumen_cartera.py --completo
+"""
+
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from configuracion import get_configuracion
+from consultas import meses_entre, inicio_del_mes, mes_de
+from query_cache import get_query_cache
+from schema import BANDAS_MONTO
+
+_config = get_configuracion()
+ACTUALIZAR_SEGUNDOS = _config.resumen_actualizar_segundos
+OVERLAP_MINUTES = _config.solicitudes_cache_overlap_minutes
+
+# Orden de las bandas en los gráficos (el alfabético no sirve)
+ORDEN_BANDAS = [etiqueta for _, etiqueta in BANDAS_MONTO]
+
+
+class ResumenCartera:
+    """
+    Mantiene la tabla resumen_cartera y consulta sus totales.
+
+    Args:
+        backend (module): Expone las funciones del resumen de storage.py; por
+            defecto, el backend configurado
+        actualizar_segundos (float): Mínimo de segundos entre actualizaciones
+            en segundo plano
+        solapamiento (timedelta): Tiempo antes de la última actualización que
+            se vuelve a agregar
+        clock (callable): Reloj monotónico, inyectable en pruebas
+    """
+
+    def __init__(self, backend=None, actualizar_segundos=ACTUALIZAR_SEGUNDOS,
+                 solapamiento=timedelta(minutes=OVERLAP_MINUTES), clock=time.monotonic):
+        if backend is None:
+            import storage as backend
+        self._backend = backend
+        self._actualizar_segundos = actualizar_segundos
+        self._solapamiento = solapamiento
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ultima = None
+        self._version_tabla = None
+        # Aumenta con cada actualización; forma parte de la clave de la caché de consultas
+        self.version = 0
+        self.stats = {
+            "actualizaciones": 0, "reconstrucciones": 0, "meses_recalculados": 0,
+            "ultima_actualizacion_segundos": 0.0,
+        }
+
+    @property
+    def actualizado_en_proceso(self):
+        return self._ultima is not None
+
+    def actualizar(self, completo=False):
+        """
+        Vuelve a agregar los meses que cambiaron desde la última actualización
+
+        Args:
+            completo (bool): Reconstruye el resumen de toda la tabla
+
+        Returns:
+            dict: Modo (incremental o completo), meses recalculados y segundos
+        """
+        with self._lock:
+            inicio = time.perf_counter()
+            version_tabla = get_query_cache().version
+            ahora = datetime.now(timezone.utc)
+            ultima = None if completo else self._backend.ultima_actualizacion_resumen()
+
+            meses = None
+            if ultima is not None:
+                desde = ultima - self._solapamiento
+                recientes = meses_entre(desde, ahora)
+                meses = sorted(set(recientes) | set(self._backend.meses_con_cambios_de_estado(desde)))
+                self._backend.reagregar_resumen(meses, ahora)
+                # Los meses recientes pueden estar recibiendo filas ahora mismo: solo se comparan los anteriores
+                en_tabla, en_resumen = self._backend.contar_resumen(inicio_del_mes(recientes[0]))
+                if en_tabla != en_resumen:
+                    print(f"ℹ️ El resumen cuenta {en_resumen} solicitudes anteriores a {recientes[0]} y la tabla "
+                          f"{en_tabla}, reconstruyendo el resumen completo")
+                    meses = None
+
+            if meses is None:
+                self._backend.reagregar_resumen(None, ahora)
+                self.stats["reconstrucciones"] += 1
+
+            segundos = time.perf_counter() - inicio
+            self._ultima = self._clock()
+            self._version_tabla = version_tabla
+            self.version += 1
+            self.stats["actualizaciones"] += 1
+            self.stats["meses_recalculados"] += len(meses) if meses is not None else 0
+            self.stats["ultima_actualizacion_segundos"] = segundos
+            return {
+                "modo": "incremental" if meses is not None else "completo",
+                "meses": meses,
+                "segundos": segundos,
+            }
+
+    def vencido(self):
+        """
+        True si nunca se actualizó en este proceso, si pasó el intervalo o si
+        el proceso escribió solicitudes desde la última actualización
+        """
+        return (
+            self._ultima is None
+            or self._clock() - self._ultima > self._actualizar_segundos
+            or get_query_cache().version != self._version_tabla
+        )
+
+    def actualizar_si_vencido(self):
+        """
+        Lanza la actualización en un hilo si el resumen está vencido y no hay
+        otra en curso
+
+        Returns:
+            bool: True si se lanzó una actualización
+        """
+        if not self.vencido() or self._lock.locked():
+            return False
+        threading.Thread(target=self._actualizar_en_segundo_plano, name="resumen-cartera", daemon=True).start()
+        return True
+
+    def consultar(self, dimension, desde_mes=None):
+        """
+        Totales por una dimensión, guardados en la caché de consultas
+
+        Args:
+            dimension (str): mes, tipo_prestamo, estado o banda_monto
+            desde_mes (str): Primer mes AAAA-MM incluido (None = todo el historial)
+
+        Returns:
+            pandas.DataFrame: dimension, solicitudes y monto_total
+        """
+        def cargar():
+            df = self._backend.consultar_resumen(dimension, desde_mes)
+            if dimension == "banda_monto":
+                df = df.sort_values("banda_monto", key=lambda s: s.map(ORDEN_BANDAS.index), ignore_index=True)
+            return df
+
+        return get_query_cache().get_or_load(("resumen", dimension, desde_mes, self.version), cargar)
+
+    def ultima_actualizacion(self):
+        """
+        Momento de la última actualización registrada en la tabla (de
+        cualquier proceso), o None si el resumen está vacío
+        """
+        return self._backend.ultima_actualizacion_resumen()
+
+    # ---------- Internos ----------
+
+    def _actualizar_en_segundo_plano(self):
+        try:
+            self.actualizar()
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el resumen de la cartera: {e}")
+
+
+_resumen = None
+_resumen_lock = threading.Lock()
+
+
+def get_resumen_cartera():
+    """
+    Retorna el resumen de la cartera compartido por el proceso
+    """
+    global _resumen
+    with _resumen_lock:
+        if _resumen is None:
+            _resumen = ResumenCartera()
+        return _resumen
+
+
+def mes_inicial(meses_atras):
+    """
+    Primer mes AAAA-MM de un período que termina en el mes actual
+
+    Args:
+        meses_atras (int): Meses del período (0 = todo el historial)
+
+    Returns:
+        str: Mes inicial, o None para todo el historial
+    """
+    if not meses_atras:
+        return None
+    return str(pd.Period(mes_de(datetime.now(timezone.utc)), freq="M") - (meses_atras - 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualiza el resumen de la cartera del tablero")
+    parser.add_argument("--completo", action="store_true", help="Reconstruye el resumen de toda la tabla")
+    args = parser.parse_args()
+
+    resultado = get_resumen_cartera().actualizar(completo=args.completo)
+    if resultado["modo"] == "completo":
+        print(f"✅ Resumen reconstruido en {resultado['segundos']:.1f} s")
+    else:
+        print(f"✅ Resumen actualizado en {resultado['segundos']:.1f} s: {', '.join(resultado['meses'])}")
@@ -0,0 +1,155 @@
+"""
+Esquemas de las tablas, compartidos por todos los backends.
+"""
+
+import hashlib
+from collections import namedtuple
+
+TABLE_ID = "solicitudes_prestamo"
+
+# Mismos atributos que bigquery.SchemaField, para poder tratarlos igual
+Columna = namedtuple("Columna", ["name", "field_type", "mode"])
+
+SCHEMA_SOLICITUDES = [
+    Columna("id", "STRING", "REQUIRED"),
+    Columna("fecha_solicitud", "TIMESTAMP", "REQUIRED"),
+    Columna("nombre", "STRING", "REQUIRED"),
+    Columna("cedula", "STRING", "REQUIRED"),
+    Columna("telefono", "STRING", "REQUIRED"),
+    Columna("email", "STRING", "NULLABLE"),
+    Columna("fecha_nacimiento", "DATE", "REQUIRED"),
+    Columna("ocupacion", "STRING", "REQUIRED"),
+    Columna("tipo_prestamo", "STRING", "REQUIRED"),
+    Columna("monto_solicitado", "FLOAT64", "REQUIRED"),
+    Columna("plazo_meses", "INTEGER", "REQUIRED"),
+    Columna("proposito", "STRING", "REQUIRED"),
+    Columna("estado", "STRING", "REQUIRED"),
+]
+
+COLUMNAS = [columna.name for columna in SCHEMA_SOLICITUDES]
+
+# Resultados de la evaluación de crédito (evaluacion_credito.py), una fila por solicitud
+EVALUACIONES_TABLE_ID = "evaluaciones_credito"
+
+SCHEMA_EVALUACIONES = [
+    Columna("id", "STRING", "REQUIRED"),
+    Columna("puntaje", "INTEGER", "REQUIRED"),
+    Columna("recomendacion", "STRING", "REQUIRED"),
+    Columna("codigos_motivo", "STRING", "NULLABLE"),
+    Columna("version_modelo", "STRING", "REQUIRED"),
+    Columna("fecha_evaluacion", "TIMESTAMP", "REQUIRED"),
+]
+
+COLUMNAS_EVALUACIONES = [columna.name for columna in SCHEMA_EVALUACIONES]
+
+# Historial de cambios de estado (estados.py), una fila por cambio aplicado
+HISTORIAL_TABLE_ID = "historial_estados"
+
+SCHEMA_HISTORIAL = [
+    Columna("id", "STRING", "REQUIRED"),
+    Columna("estado_anterior", "STRING", "REQUIRED"),
+    Columna("estado_nuevo", "STRING", "REQUIRED"),
+    Columna("usuario", "STRING", "NULLABLE"),
+    Columna("comentario", "STRING", "NULLABLE"),
+    Columna("fecha_cambio", "TIMESTAMP", "REQUIRED"),
+]
+
+COLUMNAS_HISTORIAL = [columna.name for columna in SCHEMA_HISTORIAL]
+
+# Resumen de la cartera (resumen_cartera.py): totales por mes, tipo de préstamo,
+# estado y banda de monto. `mes` es AAAA-MM de fecha_solicitud en UTC y
+# `actualizado` el momento en que se recalculó la fila
+RESUMEN_TABLE_ID = "resumen_cartera"
+
+SCHEMA_RESUMEN = [
+    Columna("mes", "STRING", "REQUIRED"),
+    Columna("tipo_prestamo", "STRING", "REQUIRED"),
+    Columna("estado", "STRING", "REQUIRED"),
+    Columna("banda_monto", "STRING", "REQUIRED"),
+    Columna("solicitudes", "INTEGER", "REQUIRED"),
+    Columna("monto_total", "FLOAT64", "REQUIRED"),
+    Columna("actualizado", "TIMESTAMP", "REQUIRED"),
+]
+
+COLUMNAS_RESUMEN = [columna.name for columna in SCHEMA_RESUMEN]
+
+# Particionado diario por fecha de solicitud y agrupamiento por las columnas
+# que más se filtran, para que las consultas solo lean lo que necesitan
+CAMPO_PARTICION = "fecha_solicitud"
+CAMPOS_CLUSTERING = ["estado", "tipo_prestamo", "cedula"]
+
+
+# BigQuery reporta los tipos con su nombre heredado aunque se creen con el estándar
+_TIPOS_EQUIVALENTES = {"FLOAT64": "FLOAT", "INT64": "INTEGER", "BOOL": "BOOLEAN"}
+
+# Resultado de preparar una tabla: accion es creada, al_dia o actualizada;
+# agregadas son las columnas nuevas que se agregaron y incompatibles las
+# diferencias que no se aplican solas (columnas REQUIRED nuevas, tipos cambiados)
+ResultadoEsquema = namedtuple("ResultadoEsquema", ["accion", "agregadas", "incompatibles"])
+
+
+def _tipo(campo):
+    return _TIPOS_EQUIVALENTES.get(campo.field_type, campo.field_type)
+
+
+def schema_fingerprint(schema):
+    """
+    Calcula una huella del esquema para detectar columnas nuevas o cambiadas
+
+    Args:
+        schema (list): Lista de columnas con name, field_type y mode
+            (bigquery.SchemaField o Columna)
+
+    Returns:
+        str: Hash SHA-256 de nombre, tipo y modo de cada columna
+    """
+    partes = [f"{campo.name}:{_tipo(campo)}:{campo.mode or 'NULLABLE'}" for campo in schema]
+    return hashlib.sha256("|".join(partes).encode()).hexdigest()
+
+
+def comparar_esquemas(actual, declarado, comparar_tipos=True):
+    """
+    Compara el esquema de una tabla existente con el declarado
+
+    Args:
+        actual (list): Columnas de la tabla (name, field_type, mode)
+        declarado (list): Columnas que espera la aplicación
+        comparar_tipos (bool): Si es False solo se comparan los nombres
+
+    Returns:
+        tuple: (columnas declaradas que se pueden agregar, porque son NULLABLE,
+                lista de textos con las diferencias que no se aplican solas)
+    """
+    existentes = {campo.name: campo for campo in actual}
+    agregables, incompatibles = [], []
+    for columna in declarado:
+        campo = existentes.get(columna.name)
+        if campo is None:
+            if columna.mode == "NULLABLE":
+                agregables.append(columna)
+            else:
+                incompatibles.append(f"{columna.name}: columna {columna.mode} nueva")
+        elif comparar_tipos and (_tipo(campo), campo.mode or "NULLABLE") != (_tipo(columna), columna.mode):
+            incompatibles.append(
+                f"{columna.name}: {_tipo(campo)} {campo.mode} en la tabla, {_tipo(columna)} {columna.mode} declarada"
+            )
+    return agregables, incompatibles
+
+# Valores permitidos y límites del formulario de solicitud
+TIPOS_PRESTAMO = ["Personal", "Hipotecario", "Vehicular", "Educativo", "Emergencia"]
+ESTADOS = ["Pendiente", "En revisión", "Aprobada", "Rechazada"]
+MONTO_MIN = 1000.0
+MONTO_MAX = 5000000.0
+PLAZO_MIN = 6
+PLAZO_MAX = 120
+PLAZO_PASO = 6
+EDAD_MINIMA = 18
+
+# Bandas de monto del resumen: (límite superior inclusivo, etiqueta); la última no tiene límite
+BANDAS_MONTO = [
+    (50000, "Hasta 50 mil"),
+    (100000, "50 a 100 mil"),
+    (250000, "100 a 250 mil"),
+    (500000, "250 a 500 mil"),
+    (None, "Más de 500 mil"),
+]
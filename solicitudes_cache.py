@@ -0,0 +1,316 @@
+"""
+Caché local en Parquet de la tabla de solicitudes con carga incremental.
+
+En lugar de leer toda la tabla en cada recarga, se guarda una copia local y una
+marca de agua (fecha_solicitud, id) de la última fila conocida. Cada refresco
+solo trae las filas posteriores a la marca, menos una ventana de solapamiento
+para las filas que llegan tarde, y las combina con la copia local por `id`.
+
+La única columna que la aplicación cambia en filas existentes es `estado`, y
+cada cambio queda en el historial (estados.py). Cada refresco lee también los
+cambios de estado desde el refresco anterior, menos el mismo solapamiento, y
+los aplica a la copia, sin importar si llegaron filas nuevas.
+
+La copia completa se vuelve a bajar cuando cambia el esquema de la tabla,
+cuando la tabla fue recreada, cuando una versión nueva guarda otras columnas
+o tipos (FORMATO), o cuando la fecha de modificación de la tabla avanzó y lo
+traído no lo explica:
+
+- no llegaron filas nuevas ni cambios de estado (otro UPDATE/DELETE), o
+- la tabla tiene otra cantidad de filas anteriores a la ventana que la copia
+  (filas que llegaron tarde, como las de un spool reenviado después de una
+  caída larga, o filas borradas).
+
+La copia no incluye `proposito` y usa los tipos compactos de consultas.compactar.
+
+Cada cambio de estado que se aplica a la copia queda además en un registro
+numerado (estados_cambiados), para que quien sigue la caché, como el índice
+de cédulas, reciba también los cambios a solicitudes antiguas.
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from configuracion import get_configuracion
+from consultas import compactar
+from schema import schema_fingerprint
+
+_config = get_configuracion()
+CACHE_DIR = _config.solicitudes_cache_dir
+OVERLAP_MINUTES = _config.solicitudes_cache_overlap_minutes
+
+# Cambia cuando cambian las columnas o los tipos que se guardan; una copia
+# de otro formato se descarta y se baja de nuevo
+FORMATO = 2
+
+# Marca de agua inicial: trae toda la tabla
+_INICIO = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Lotes de cambios de estado que se conservan para estados_cambiados
+CAMBIOS_CONSERVADOS = 256
+
+
+class SolicitudesCache:
+    """
+    Mantiene una copia local de la tabla de solicitudes.
+
+    Args:
+        cache_dir (str): Carpeta donde se guardan el Parquet y la marca de agua
+        overlap (timedelta): Ventana de solapamiento para filas que llegan tarde
+        metadata_fn (callable): Retorna la tabla con sus metadatos (schema,
+            created, modified)
+        fetch_fn (callable): Recibe (desde, desde_id) y retorna un DataFrame
+            con las filas posteriores a esa marca de agua
+        cambios_fn (callable): Recibe una fecha y retorna los cambios de
+            estado desde entonces (id, estado, fecha_cambio), en orden
+        contar_fn (callable): Recibe una fecha y retorna cuántas solicitudes
+            tiene la tabla hasta esa fecha_solicitud
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, overlap=timedelta(minutes=OVERLAP_MINUTES),
+                 metadata_fn=None, fetch_fn=None, cambios_fn=None, contar_fn=None):
+        if None in (metadata_fn, fetch_fn, cambios_fn, contar_fn):
+            from storage import (
+                get_table_metadata, get_solicitudes_desde, get_cambios_de_estado, contar_solicitudes_hasta,
+            )
+            metadata_fn = metadata_fn or get_table_metadata
+            fetch_fn = fetch_fn or get_solicitudes_desde
+            cambios_fn = cambios_fn or get_cambios_de_estado
+            contar_fn = contar_fn or contar_solicitudes_hasta
+
+        self._datos_path = os.path.join(cache_dir, "solicitudes.parquet")
+        self._meta_path = os.path.join(cache_dir, "meta.json")
+        self._cache_dir = cache_dir
+        self._overlap = overlap
+        self._metadata_fn = metadata_fn
+        self._fetch_fn = fetch_fn
+        self._cambios_fn = cambios_fn
+        self._contar_fn = contar_fn
+        self._lock = threading.Lock()
+        self._df = None
+        self._meta = None
+        # (versión, DataFrame id, estado) por cada lote de cambios aplicado
+        self._cambios_estado = deque(maxlen=CAMBIOS_CONSERVADOS)
+        self._version_estados = 0
+        self.stats = {"refrescos": 0, "resincronizaciones": 0, "filas_traidas": 0, "cambios_aplicados": 0}
+
+    def refresh(self, forzar_completo=False):
+        """
+        Trae las filas nuevas, las combina con la copia local y la guarda
+
+        Args:
+            forzar_completo (bool): Ignora la marca de agua y baja toda la tabla
+
+        Returns:
+            pandas.DataFrame: Todas las solicitudes, de la más reciente a la más antigua
+        """
+        with self._lock:
+            self._cargar_local()
+            inicio = datetime.now(timezone.utc)
+            tabla = self._metadata_fn()
+            huella = schema_fingerprint(tabla.schema)
+            modified = tabla.modified.isoformat() if tabla.modified else None
+            created = tabla.created.isoformat() if tabla.created else None
+
+            meta = self._meta or {}
+            completo = (
+                forzar_completo
+                or self._df is None
+                or meta.get("schema") != huella
+                or meta.get("created") != created
+                or meta.get("formato") != FORMATO
+            )
+
+            if not completo:
+                desde = self._desde(meta)
+                nuevas = self._traer(desde, meta["watermark_id"] if not self._overlap else "")
+                # Las filas del solapamiento ya estaban en la caché, no cuentan como nuevas
+                hay_nuevas = (~nuevas["id"].isin(self._df["id"])).any() if not nuevas.empty else False
+                df = self._combinar(self._df, nuevas)
+                df, aplicados = self._aplicar_cambios(df, self._cambios_fn(self._desde_cambios(meta)))
+
+                if meta.get("modified") != modified:
+                    if not hay_nuevas and not aplicados:
+                        print("ℹ️ La tabla cambió sin filas nuevas ni cambios de estado, resincronizando la caché completa")
+                        completo = True
+                    else:
+                        en_tabla = self._contar_fn(desde)
+                        en_cache = int((df["fecha_solicitud"] <= pd.Timestamp(desde)).sum())
+                        if en_tabla != en_cache:
+                            print(f"ℹ️ La tabla tiene {en_tabla} solicitudes anteriores a la ventana y la caché "
+                                  f"{en_cache}, resincronizando la caché completa")
+                            completo = True
+
+            if completo:
+                self.stats["resincronizaciones"] += 1
+                df = self._ordenar(self._traer(_INICIO, ""))
+
+            self.stats["refrescos"] += 1
+            self._guardar(df, {
+                "formato": FORMATO,
+                "schema": huella,
+                "created": created,
+                "modified": modified,
+                **self._marca_de_agua(df, meta),
+                "actualizado": datetime.now(timezone.utc).isoformat(),
+                # Los cambios de estado se leen desde aquí en el próximo refresco
+                "cambios_desde": inicio.isoformat(),
+            })
+            return df
+
+    def actualizar_estado(self, ids, estado):
+        """
+        Cambia el estado de solicitudes en la copia en memoria, en cuanto el
+        cambio se aplica en este proceso; el próximo refresco lo lee del
+        historial y lo guarda
+
+        Args:
+            ids (list): Ids de las solicitudes que cambiaron
+            estado (str): Estado nuevo
+        """
+        with self._lock:
+            if self._df is not None:
+                self._df, _ = self._aplicar_cambios(self._df, pd.DataFrame({"id": list(ids), "estado": estado}))
+
+    def estados_cambiados(self, desde=None):
+        """
+        Cambios de estado aplicados a la copia después de una versión
+
+        Args:
+            desde (int): Versión retornada por una llamada anterior; None
+                solo consulta la versión actual
+
+        Returns:
+            tuple: (versión actual, DataFrame id, estado en el orden en que
+                se aplicaron, o None si esos cambios ya no se conservan)
+        """
+        with self._lock:
+            if desde is None or desde == self._version_estados:
+                return self._version_estados, pd.DataFrame(columns=["id", "estado"])
+            if not self._version_estados - len(self._cambios_estado) <= desde < self._version_estados:
+                return self._version_estados, None
+            lotes = [cambios for version, cambios in self._cambios_estado if version > desde]
+            return self._version_estados, pd.concat(lotes, ignore_index=True)
+
+    def load(self):
+        """
+        Retorna la copia local sin consultar la base (None si no existe)
+        """
+        with self._lock:
+            self._cargar_local()
+            return self._df
+
+    def clear(self):
+        """
+        Borra la copia local; el próximo refresco bajará la tabla completa
+        """
+        with self._lock:
+            for path in (self._datos_path, self._meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._df = None
+            self._meta = None
+
+    # ---------- Internos ----------
+
+    def _traer(self, desde, desde_id):
+        nuevas = self._fetch_fn(desde, desde_id)
+        self.stats["filas_traidas"] += len(nuevas)
+        return nuevas
+
+    def _desde(self, meta):
+        return datetime.fromisoformat(meta["watermark_fecha"]) - self._overlap
+
+    def _desde_cambios(self, meta):
+        # Copias de versiones anteriores: desde su última actualización
+        return datetime.fromisoformat(meta.get("cambios_desde") or meta["actualizado"]) - self._overlap
+
+    def _aplicar_cambios(self, df, cambios):
+        """
+        Pone en la copia el último estado de cada solicitud que cambió
+
+        Returns:
+            tuple: (DataFrame, cantidad de solicitudes de la copia con cambios,
+                aunque ya tuvieran ese estado por actualizar_estado)
+        """
+        if cambios.empty:
+            return df, 0
+        ultimo = cambios.drop_duplicates("id", keep="last").set_index("id")["estado"]
+        nuevos = df["id"].map(ultimo)
+        encontrados = int(nuevos.notna().sum())
+        mascara = nuevos.notna() & (nuevos != df["estado"].astype(object))
+        if not mascara.any():
+            return df, encontrados
+        estados = df["estado"].astype(object).where(~mascara, nuevos)
+        self.stats["cambios_aplicados"] += int(mascara.sum())
+        self._version_estados += 1
+        self._cambios_estado.append((self._version_estados, pd.DataFrame({
+            "id": df.loc[mascara, "id"].astype(object).to_numpy(),
+            "estado": nuevos[mascara].to_numpy(),
+        })))
+        return compactar(df.assign(estado=estados)), encontrados
+
+    @staticmethod
+    def _marca_de_agua(df, meta_anterior):
+        if df.empty:
+            return {
+                "watermark_fecha": meta_anterior.get("watermark_fecha", _INICIO.isoformat()),
+                "watermark_id": meta_anterior.get("watermark_id", ""),
+            }
+        ultima = df.iloc[0]
+        return {
+            "watermark_fecha": pd.Timestamp(ultima["fecha_solicitud"]).isoformat(),
+            "watermark_id": str(ultima["id"]),
+        }
+
+    @staticmethod
+    def _ordenar(df):
+        return df.sort_values(["fecha_solicitud", "id"], ascending=False, ignore_index=True)
+
+    def _combinar(self, actual, nuevas):
+        if nuevas.empty:
+            return actual
+        # Las filas del solapamiento reemplazan a su versión anterior
+        df = pd.concat([actual[~actual["id"].isin(nuevas["id"])], nuevas], ignore_index=True)
+        # Si las categorías de ocupacion difieren, concat deja objetos
+        return self._ordenar(compactar(df))
+
+    def _cargar_local(self):
+        if self._df is not None or not os.path.exists(self._meta_path):
+            return
+        try:
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            df = pd.read_parquet(self._datos_path)
+        except Exception as e:
+            print(f"⚠️ No se pudo leer la caché local ({e}), se bajará la tabla completa")
+            return
+        self._df, self._meta = df, meta
+
+    def _guardar(self, df, meta):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        # Escribir a archivos temporales y reemplazar para no dejar una caché a medias
+        df.to_parquet(self._datos_path + ".tmp", index=False)
+        with open(self._meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(self._datos_path + ".tmp", self._datos_path)
+        os.replace(self._meta_path + ".tmp", self._meta_path)
+        self._df, self._meta = df, meta
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_solicitudes_cache():
+    """
+    Retorna la caché de solicitudes compartida por el proceso
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SolicitudesCache()
+        return _cache
@@ -0,0 +1,1028 @@
+"""
+Backends de almacenamiento para las solicitudes de préstamo.
+
+La aplicación habla con un repositorio que expone las mismas funciones que
+`gcp_config` (`insert_solicitud`, `get_all_solicitudes`,
+`create_table_if_not_exists`, ...). El backend se elige en el `.env` con
+STORAGE_BACKEND:
+
+    bigquery  -> BigQuery, a través de gcp_config (por defecto)
+    sqlite    -> Archivo SQLite local, para desarrollo, CI y pruebas de carga
+                 sin conexión a GCP
+"""
+
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pandas as pd
+from configuracion import get_configuracion
+from schema import (
+    TABLE_ID, SCHEMA_SOLICITUDES, COLUMNAS,
+    EVALUACIONES_TABLE_ID, SCHEMA_EVALUACIONES, COLUMNAS_EVALUACIONES,
+    HISTORIAL_TABLE_ID, SCHEMA_HISTORIAL, COLUMNAS_HISTORIAL,
+    RESUMEN_TABLE_ID, SCHEMA_RESUMEN, COLUMNAS_RESUMEN,
+    ResultadoEsquema, comparar_esquemas,
+)
+from consultas import (
+    construir_where, columnas_proyectadas, separar_pagina, compactar,
+    validar_dimension, sql_banda_monto, condicion_meses, mes_de,
+)
+
+_config = get_configuracion()
+STORAGE_BACKEND = _config.storage_backend
+SQLITE_PATH = _config.sqlite_path
+# Mientras exista este archivo migrar_tabla.py está copiando la tabla de BigQuery
+PAUSA_PATH = _config.batch_writer_pausa_path
+
+
+class TablaEnMantenimiento(RuntimeError):
+    """
+    La tabla de solicitudes se está migrando (existe BATCH_WRITER_PAUSA_PATH);
+    no se escribió nada y la operación se puede repetir cuando termine
+    """
+
+
+def _verificar_pausa():
+    if PAUSA_PATH and os.path.exists(PAUSA_PATH):
+        raise TablaEnMantenimiento(
+            "La tabla de solicitudes está en mantenimiento; intenta de nuevo en unos minutos"
+        )
+
+
+class SolicitudesRepository(ABC):
+    """
+    Operaciones de lectura y escritura sobre la tabla solicitudes_prestamo
+    """
+
+    @abstractmethod
+    def create_table_if_not_exists(self):
+        """
+        Crea la tabla si no existe
+
+        Returns:
+            bool: True si la tabla existe o fue creada, False si hubo error
+        """
+
+    @abstractmethod
+    def asegurar_esquema(self):
+        """
+        Crea las tablas que falten y agrega a las existentes las columnas
+        NULLABLE nuevas del esquema declarado
+
+        Returns:
+            dict: ResultadoEsquema de cada tabla, por nombre
+        """
+
+    @abstractmethod
+    def insertar_lote_solicitudes(self, filas):
+        """
+        Inserta un lote de solicitudes de forma idempotente por `id`
+
+        Returns:
+            list: Errores por fila con el formato de `insert_rows_json`
+        """
+
+    @abstractmethod
+    def cargar_solicitudes(self, df):
+        """
+        Carga un DataFrame de solicitudes en bloque (importaciones masivas)
+
+        Returns:
+            int: Número de filas cargadas
+        """
+
+    @abstractmethod
+    def get_all_solicitudes(self, columnas=None):
+        """
+        Args:
+            columnas (list): Columnas a leer (por defecto todas menos `proposito`)
+
+        Returns:
+            pandas.DataFrame: Todas las solicitudes con tipos compactos, o None si hubo error
+        """
+
+    @abstractmethod
+    def get_table_metadata(self):
+        """
+        Returns:
+            object: Objeto con `schema`, `created`, `modified` y `num_rows`
+        """
+
+    @abstractmethod
+    def get_solicitudes_desde(self, desde, desde_id="", columnas=None):
+        """
+        Args:
+            columnas (list): Columnas a leer (por defecto todas menos `proposito`)
+
+        Returns:
+            pandas.DataFrame: Solicitudes posteriores a la marca (desde, desde_id)
+        """
+
+    @abstractmethod
+    def consultar_solicitudes(self, filtros=None, columnas=None, cursor=None, limite=50):
+        """
+        Returns:
+            tuple: (DataFrame con una página, cursor de la siguiente o None)
+        """
+
+    @abstractmethod
+    def iterar_solicitudes(self, filtros=None, columnas=None, tamano_bloque=10000, ventana_dias=0):
+        """
+        Recorre todas las solicitudes que cumplen los filtros, con una sola
+        consulta leída por páginas
+
+        Yields:
+            pandas.DataFrame: Página de solicitudes con tipos compactos
+        """
+
+    @abstractmethod
+    def crear_tabla_evaluaciones(self):
+        """
+        Crea la tabla de resultados de la evaluación de crédito si no existe
+
+        Returns:
+            bool: True si la tabla existe o fue creada, False si hubo error
+        """
+
+    @abstractmethod
+    def contar_solicitudes_por_cedula(self):
+        """
+        Returns:
+            pandas.Series: Número de solicitudes de cada cédula, indexado por cédula
+        """
+
+    @abstractmethod
+    def iterar_pendientes_sin_evaluar(self, tamano_bloque=10000):
+        """
+        Yields:
+            pandas.DataFrame: Bloques de solicitudes pendientes sin evaluación
+                (id, cedula, fecha_nacimiento, tipo_prestamo, monto_solicitado, plazo_meses)
+        """
+
+    @abstractmethod
+    def guardar_evaluaciones(self, df):
+        """
+        Inserta o reemplaza un lote de evaluaciones con una sola sentencia
+
+        Returns:
+            int: Filas insertadas o actualizadas
+        """
+
+    @abstractmethod
+    def crear_tabla_historial(self):
+        """
+        Crea la tabla del historial de cambios de estado si no existe
+
+        Returns:
+            bool: True si la tabla existe o fue creada, False si hubo error
+        """
+
+    @abstractmethod
+    def aplicar_transiciones(self, df):
+        """
+        Cambia el estado de un lote de solicitudes con una sola sentencia,
+        solo donde la solicitud sigue en `estado_anterior`, y anota en el
+        historial los cambios aplicados
+
+        Args:
+            df (pandas.DataFrame): Columnas de SCHEMA_HISTORIAL
+
+        Returns:
+            pandas.DataFrame: Conflictos, con id y estado_actual
+        """
+
+    @abstractmethod
+    def crear_tabla_resumen(self):
+        """
+        Crea la tabla del resumen de la cartera si no existe
+
+        Returns:
+            bool: True si la tabla existe o fue creada, False si hubo error
+        """
+
+    @abstractmethod
+    def ultima_actualizacion_resumen(self):
+        """
+        Returns:
+            datetime: Momento del último recálculo del resumen, o None si está vacío
+        """
+
+    @abstractmethod
+    def meses_con_cambios_de_estado(self, desde):
+        """
+        Returns:
+            list: Meses AAAA-MM (de fecha_solicitud) de las solicitudes que
+                cambiaron de estado desde `desde`
+        """
+
+    @abstractmethod
+    def reagregar_resumen(self, meses=None, actualizado=None):
+        """
+        Borra y vuelve a agregar los meses pedidos del resumen (None = todos),
+        en una sola transacción
+        """
+
+    @abstractmethod
+    def contar_resumen(self, antes_de):
+        """
+        Returns:
+            tuple: (solicitudes anteriores a `antes_de` en la tabla, en el resumen)
+        """
+
+    @abstractmethod
+    def consultar_resumen(self, dimension, desde_mes=None):
+        """
+        Returns:
+            pandas.DataFrame: dimension, solicitudes y monto_total desde `desde_mes`
+        """
+
+    @abstractmethod
+    def get_historial_estados(self, solicitud_id):
+        """
+        Returns:
+            pandas.DataFrame: Cambios de estado de la solicitud, del más reciente al más antiguo
+        """
+
+    @abstractmethod
+    def get_cambios_de_estado(self, desde):
+        """
+        Returns:
+            pandas.DataFrame: id, estado nuevo y fecha_cambio de los cambios
+                desde `desde`, del más antiguo al más reciente
+        """
+
+    @abstractmethod
+    def contar_solicitudes_hasta(self, hasta):
+        """
+        Returns:
+            int: Solicitudes con fecha_solicitud hasta `hasta` (incluida)
+        """
+
+    def insert_solicitud(self, solicitud_data):
+        """
+        Inserta una solicitud
+
+        Returns:
+            bool: True si fue exitoso, False si hubo error
+        """
+        try:
+            errors = self.insertar_lote_solicitudes([solicitud_data])
+        except Exception as e:
+            print(f"❌ Error al guardar la solicitud: {type(e).__name__}: {e}")
+            return False
+        if errors:
+            print(f"❌ Errores al insertar datos: {errors}")
+            return False
+        return True
+
+
+class BigQueryRepository(SolicitudesRepository):
+    """
+    Repositorio respaldado por BigQuery; delega en las funciones de gcp_config
+
+    Las escrituras en la tabla de solicitudes lanzan TablaEnMantenimiento
+    mientras migrar_tabla.py la copia: un cambio hecho en la original durante
+    la copia se perdería al intercambiarlas.
+    """
+
+    def create_table_if_not_exists(self):
+        from gcp_config import create_table_if_not_exists
+        return create_table_if_not_exists()
+
+    def asegurar_esquema(self):
+        from gcp_config import asegurar_esquema
+        return asegurar_esquema()
+
+    def insertar_lote_solicitudes(self, filas):
+        from gcp_config import insertar_lote_solicitudes
+        _verificar_pausa()
+        return insertar_lote_solicitudes(filas)
+
+    def cargar_solicitudes(self, df):
+        from gcp_config import cargar_lote_solicitudes
+        _verificar_pausa()
+        return cargar_lote_solicitudes(df)
+
+    def get_all_solicitudes(self, columnas=None):
+        from gcp_config import get_all_solicitudes
+        return get_all_solicitudes(columnas)
+
+    def get_table_metadata(self):
+        from gcp_config import get_table_metadata
+        return get_table_metadata()
+
+    def get_solicitudes_desde(self, desde, desde_id="", columnas=None):
+        from gcp_config import get_solicitudes_desde
+        return get_solicitudes_desde(desde, desde_id, columnas)
+
+    def consultar_solicitudes(self, filtros=None, columnas=None, cursor=None, limite=50):
+        from gcp_config import consultar_solicitudes
+        return consultar_solicitudes(filtros, columnas, cursor, limite)
+
+    def iterar_solicitudes(self, filtros=None, columnas=None, tamano_bloque=10000, ventana_dias=0):
+        from gcp_config import iterar_solicitudes
+        return iterar_solicitudes(filtros, columnas, tamano_bloque, ventana_dias)
+
+    def crear_tabla_evaluaciones(self):
+        from gcp_config import create_evaluaciones_table_if_not_exists
+        return create_evaluaciones_table_if_not_exists()
+
+    def contar_solicitudes_por_cedula(self):
+        from gcp_config import contar_solicitudes_por_cedula
+        return contar_solicitudes_por_cedula()
+
+    def iterar_pendientes_sin_evaluar(self, tamano_bloque=10000):
+        from gcp_config import iterar_pendientes_sin_evaluar
+        return iterar_pendientes_sin_evaluar(tamano_bloque)
+
+    def guardar_evaluaciones(self, df):
+        from gcp_config import guardar_evaluaciones
+        return guardar_evaluaciones(df)
+
+    def crear_tabla_historial(self):
+        from gcp_config import create_historial_table_if_not_exists
+        return create_historial_table_if_not_exists()
+
+    def aplicar_transiciones(self, df):
+        from gcp_config import aplicar_transiciones
+        _verificar_pausa()
+        return aplicar_transiciones(df)
+
+    def get_historial_estados(self, solicitud_id):
+        from gcp_config import get_historial_estados
+        return get_historial_estados(solicitud_id)
+
+    def get_cambios_de_estado(self, desde):
+        from gcp_config import get_cambios_de_estado
+        return get_cambios_de_estado(desde)
+
+    def contar_solicitudes_hasta(self, hasta):
+        from gcp_config import contar_solicitudes_hasta
+        return contar_solicitudes_hasta(hasta)
+
+    def crear_tabla_resumen(self):
+        from gcp_config import create_resumen_table_if_not_exists
+        return create_resumen_table_if_not_exists()
+
+    def ultima_actualizacion_resumen(self):
+        from gcp_config import ultima_actualizacion_resumen
+        return ultima_actualizacion_resumen()
+
+    def meses_con_cambios_de_estado(self, desde):
+        from gcp_config import meses_con_cambios_de_estado
+        return meses_con_cambios_de_estado(desde)
+
+    def reagregar_resumen(self, meses=None, actualizado=None):
+        from gcp_config import reagregar_resumen
+        return reagregar_resumen(meses, actualizado)
+
+    def contar_resumen(self, antes_de):
+        from gcp_config import contar_resumen
+        return contar_resumen(antes_de)
+
+    def consultar_resumen(self, dimension, desde_mes=None):
+        from gcp_config import consultar_resumen
+        return consultar_resumen(dimension, desde_mes)
+
+
+# Tipos de BigQuery -> tipos de SQLite
+_TIPOS_SQLITE = {
+    "STRING": "TEXT",
+    "TIMESTAMP": "TEXT",
+    "DATE": "TEXT",
+    "FLOAT64": "REAL",
+    "INTEGER": "INTEGER",
+}
+
+
+def timestamp_utc(valor):
+    """
+    Normaliza un TIMESTAMP a texto ISO en UTC, comparable como string.
+    Igual que BigQuery, una fecha sin zona horaria se interpreta como UTC.
+    """
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    if valor.tzinfo is None:
+        valor = valor.replace(tzinfo=timezone.utc)
+    return valor.astimezone(timezone.utc).isoformat(sep=" ", timespec="microseconds")
+
+
+class SQLiteRepository(SolicitudesRepository):
+    """
+    Repositorio local en un archivo SQLite con el mismo esquema de 13 columnas.
+
+    Args:
+        path (str): Ruta del archivo de base de datos (":memory:" no se
+            admite porque cada operación abre su propia conexión)
+    """
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tabla_lista = False
+
+    @contextmanager
+    def _conectar(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def create_table_if_not_exists(self):
+        try:
+            with self._lock:
+                if self._tabla_lista:
+                    return True
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                columnas = ",\n".join(
+                    f"{c.name} {_TIPOS_SQLITE[c.field_type]}"
+                    f"{' NOT NULL' if c.mode == 'REQUIRED' else ''}"
+                    f"{' PRIMARY KEY' if c.name == 'id' else ''}"
+                    for c in SCHEMA_SOLICITUDES
+                )
+                ahora = datetime.now(timezone.utc).isoformat()
+                with self._conectar() as conn:
+                    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE_ID} (\n{columnas}\n)")
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_ID}_fecha ON {TABLE_ID} (fecha_solicitud, id)")
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_ID}_cedula ON {TABLE_ID} (cedula)")
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_ID}_estado ON {TABLE_ID} (estado)")
+                    # Equivalente local de los metadatos created/modified de BigQuery
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS _tablas (nombre TEXT PRIMARY KEY, created TEXT, modified TEXT)"
+                    )
+                    conn.execute(
+                        "INSERT OR IGNORE INTO _tablas VALUES (?, ?, ?)", (TABLE_ID, ahora, ahora)
+                    )
+                self._tabla_lista = True
+            print(f"✅ Tabla local {TABLE_ID} lista en {self.path}")
+            return True
+        except Exception as e:
+            print(f"❌ Error al crear la tabla local: {e}")
+            return False
+
+    def asegurar_esquema(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tablas = [
+            (TABLE_ID, SCHEMA_SOLICITUDES, self.create_table_if_not_exists),
+            (EVALUACIONES_TABLE_ID, SCHEMA_EVALUACIONES, self.crear_tabla_evaluaciones),
+            (HISTORIAL_TABLE_ID, SCHEMA_HISTORIAL, self.crear_tabla_historial),
+            (RESUMEN_TABLE_ID, SCHEMA_RESUMEN, self.crear_tabla_resumen),
+        ]
+        resultados = {}
+        for nombre, declarado, crear in tablas:
+            with self._conectar() as conn:
+                existentes = [
+                    SimpleNamespace(name=fila[1], field_type=None, mode=None)
+                    for fila in conn.execute(f"PRAGMA table_info({nombre})")
+                ]
+            if not existentes:
+                if not crear():
+                    raise RuntimeError(f"No se pudo crear la tabla local {nombre}")
+                resultados[nombre] = ResultadoEsquema("creada", [], [])
+                continue
+            # SQLite no distingue STRING, DATE y TIMESTAMP: solo se comparan nombres
+            agregables, incompatibles = comparar_esquemas(existentes, declarado, comparar_tipos=False)
+            with self._conectar() as conn:
+                for columna in agregables:
+                    conn.execute(f"ALTER TABLE {nombre} ADD COLUMN {columna.name} {_TIPOS_SQLITE[columna.field_type]}")
+            crear()
+            resultados[nombre] = ResultadoEsquema(
+                "actualizada" if agregables else "al_dia", [c.name for c in agregables], incompatibles
+            )
+        return resultados
+
+    def _marcar_modificada(self, conn):
+        conn.execute(
+            "UPDATE _tablas SET modified = ? WHERE nombre = ?",
+            (datetime.now(timezone.utc).isoformat(), TABLE_ID),
+        )
+
+    def _a_tupla(self, fila):
+        valores = dict(fila)
+        valores["fecha_solicitud"] = timestamp_utc(valores["fecha_solicitud"])
+        valores["fecha_nacimiento"] = str(valores["fecha_nacimiento"])
+        return tuple(valores.get(columna) for columna in COLUMNAS)
+
+    def insertar_lote_solicitudes(self, filas):
+        self.create_table_if_not_exists()
+        sql = (
+            f"INSERT INTO {TABLE_ID} ({', '.join(COLUMNAS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNAS)}) "
+            "ON CONFLICT (id) DO NOTHING"
+        )
+        try:
+            with self._conectar() as conn:
+                conn.executemany(sql, [self._a_tupla(fila) for fila in filas])
+                self._marcar_modificada(conn)
+            return []
+        except (sqlite3.IntegrityError, ValueError, KeyError):
+            pass
+
+        # Alguna fila es inválida: insertar una por una para reportar cuáles
+        errores = []
+        with self._conectar() as conn:
+            for indice, fila in enumerate(filas):
+                try:
+                    conn.execute(sql, self._a_tupla(fila))
+                except (sqlite3.IntegrityError, ValueError, KeyError) as e:
+                    errores.append({"index": indice, "errors": [{"reason": "invalid", "message": str(e)}]})
+            self._marcar_modificada(conn)
+        return errores
+
+    def cargar_solicitudes(self, df):
+        filas = df.astype(object).where(df.notna(), None).to_dict("records")
+        errores = self.insertar_lote_solicitudes(filas)
+        if errores:
+            raise ValueError(f"{len(errores)} filas no se pudieron cargar: {errores[:3]}")
+        return len(df)
+
+    def _leer(self, where="", parametros=(), columnas=None, limite=None):
+        self.create_table_if_not_exists()
+        sql = f"SELECT {', '.join(columnas_proyectadas(columnas))} FROM {TABLE_ID} {where} ORDER BY fecha_solicitud DESC, id DESC"
+        if limite is not None:
+            sql += f" LIMIT {int(limite)}"
+        with self._conectar() as conn:
+            df = pd.read_sql_query(sql, conn, params=parametros)
+        return self._tipos(df)
+
+    @staticmethod
+    def _tipos(df):
+        # Mismos tipos que entrega BigQuery
+        df["fecha_solicitud"] = pd.to_datetime(df["fecha_solicitud"], utc=True, format="ISO8601")
+        if "fecha_nacimiento" in df:
+            df["fecha_nacimiento"] = pd.to_datetime(df["fecha_nacimiento"]).dt.date
+        return compactar(df)
+
+    @staticmethod
+    def _valores(parametros):
+        return {
+            nombre: timestamp_utc(valor) if tipo == "TIMESTAMP" else valor
+            for nombre, (tipo, valor) in parametros.items()
+        }
+
+    def get_all_solicitudes(self, columnas=None):
+        try:
+            df = self._leer(columnas=columnas)
+            print(f"✅ Se obtuvieron {len(df)} solicitudes")
+            return df
+        except Exception as e:
+            print(f"❌ Error al leer la base local: {e}")
+            return None
+
+    def get_table_metadata(self):
+        self.create_table_if_not_exists()
+        with self._conectar() as conn:
+            created, modified = conn.execute(
+                "SELECT created, modified FROM _tablas WHERE nombre = ?", (TABLE_ID,)
+            ).fetchone()
+            num_rows = conn.execute(f"SELECT COUNT(*) FROM {TABLE_ID}").fetchone()[0]
+        return SimpleNamespace(
+            schema=SCHEMA_SOLICITUDES,
+            created=datetime.fromisoformat(created),
+            modified=datetime.fromisoformat(modified),
+            num_rows=num_rows,
+        )
+
+    def get_solicitudes_desde(self, desde, desde_id="", columnas=None):
+        desde = timestamp_utc(desde)
+        return self._leer(
+            "WHERE fecha_solicitud > ? OR (fecha_solicitud = ? AND id > ?)",
+            (desde, desde, desde_id),
+            columnas,
+        )
+
+    def consultar_solicitudes(self, filtros=None, columnas=None, cursor=None, limite=50):
+        where, parametros = construir_where(filtros, cursor, prefijo=":")
+        df = self._leer(where, self._valores(parametros), columnas, limite + 1)
+        return separar_pagina(df, limite)
+
+    def iterar_solicitudes(self, filtros=None, columnas=None, tamano_bloque=10000, ventana_dias=0):
+        self.create_table_if_not_exists()
+        where, parametros = construir_where(filtros, prefijo=":", ventana_dias=ventana_dias)
+        columnas = columnas_proyectadas(columnas)
+        with self._conectar() as conn:
+            cursor = conn.execute(
+                f"SELECT {', '.join(columnas)} FROM {TABLE_ID} {where} ORDER BY fecha_solicitud DESC, id DESC",
+                self._valores(parametros),
+            )
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    break
+                yield self._tipos(pd.DataFrame(filas, columns=columnas))
+
+    def crear_tabla_evaluaciones(self):
+        try:
+            self.create_table_if_not_exists()
+            columnas = ",\n".join(
+                f"{c.name} {_TIPOS_SQLITE[c.field_type]}"
+                f"{' NOT NULL' if c.mode == 'REQUIRED' else ''}"
+                f"{' PRIMARY KEY' if c.name == 'id' else ''}"
+                for c in SCHEMA_EVALUACIONES
+            )
+            with self._conectar() as conn:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {EVALUACIONES_TABLE_ID} (\n{columnas}\n)")
+            return True
+        except Exception as e:
+            print(f"❌ Error al crear la tabla local de evaluaciones: {e}")
+            return False
+
+    def contar_solicitudes_por_cedula(self):
+        self.create_table_if_not_exists()
+        with self._conectar() as conn:
+            df = pd.read_sql_query(
+                f"SELECT cedula, COUNT(*) AS solicitudes FROM {TABLE_ID} GROUP BY cedula", conn
+            )
+        return df.set_index("cedula")["solicitudes"]
+
+    def iterar_pendientes_sin_evaluar(self, tamano_bloque=10000):
+        self.crear_tabla_evaluaciones()
+        columnas = ["id", "cedula", "fecha_nacimiento", "tipo_prestamo", "monto_solicitado", "plazo_meses"]
+        with self._conectar() as conn:
+            cursor = conn.execute(f"""
+                SELECT {', '.join(f's.{c}' for c in columnas)}
+                FROM {TABLE_ID} AS s
+                LEFT JOIN {EVALUACIONES_TABLE_ID} AS e ON e.id = s.id
+                WHERE s.estado = 'Pendiente' AND e.id IS NULL
+            """)
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    break
+                df = pd.DataFrame(filas, columns=columnas)
+                df["fecha_nacimiento"] = pd.to_datetime(df["fecha_nacimiento"]).dt.date
+                yield df
+
+    def guardar_evaluaciones(self, df):
+        if df.empty:
+            return 0
+        self.crear_tabla_evaluaciones()
+        filas = df[COLUMNAS_EVALUACIONES].astype(object).where(df[COLUMNAS_EVALUACIONES].notna(), None)
+        filas["fecha_evaluacion"] = filas["fecha_evaluacion"].map(timestamp_utc)
+        columnas = ", ".join(COLUMNAS_EVALUACIONES)
+        with self._conectar() as conn:
+            # El lote se sube a una tabla temporal y se aplica con un solo upsert
+            conn.execute(f"CREATE TEMP TABLE _lote_evaluaciones AS SELECT * FROM {EVALUACIONES_TABLE_ID} WHERE 0")
+            conn.executemany(
+                f"INSERT INTO _lote_evaluaciones ({columnas}) VALUES ({', '.join('?' for _ in COLUMNAS_EVALUACIONES)})",
+                filas.itertuples(index=False, name=None),
+            )
+            cursor = conn.execute(
+                f"INSERT INTO {EVALUACIONES_TABLE_ID} ({columnas}) "
+                f"SELECT {columnas} FROM _lote_evaluaciones WHERE true "
+                "ON CONFLICT (id) DO UPDATE SET "
+                + ", ".join(f"{c} = excluded.{c}" for c in COLUMNAS_EVALUACIONES if c != "id")
+            )
+            conn.execute("DROP TABLE _lote_evaluaciones")
+            return cursor.rowcount
+
+    def crear_tabla_historial(self):
+        try:
+            self.create_table_if_not_exists()
+            columnas = ",\n".join(
+                f"{c.name} {_TIPOS_SQLITE[c.field_type]}{' NOT NULL' if c.mode == 'REQUIRED' else ''}"
+                for c in SCHEMA_HISTORIAL
+            )
+            with self._conectar() as conn:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {HISTORIAL_TABLE_ID} (\n{columnas}\n)")
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{HISTORIAL_TABLE_ID}_id ON {HISTORIAL_TABLE_ID} (id, fecha_cambio)"
+                )
+            return True
+        except Exception as e:
+            print(f"❌ Error al crear la tabla local de historial: {e}")
+            return False
+
+    def aplicar_transiciones(self, df):
+        if df.empty:
+            return pd.DataFrame(columns=["id", "estado_actual"])
+        self.crear_tabla_historial()
+        filas = df[COLUMNAS_HISTORIAL].astype(object).where(df[COLUMNAS_HISTORIAL].notna(), None)
+        filas["fecha_cambio"] = filas["fecha_cambio"].map(timestamp_utc)
+        columnas = ", ".join(COLUMNAS_HISTORIAL)
+        with self._conectar() as conn:
+            # Mismos pasos que el script de BigQuery, en una sola transacción
+            conn.execute(f"CREATE TEMP TABLE _lote_estados AS SELECT * FROM {HISTORIAL_TABLE_ID} WHERE 0")
+            conn.executemany(
+                f"INSERT INTO _lote_estados ({columnas}) VALUES ({', '.join('?' for _ in COLUMNAS_HISTORIAL)})",
+                filas.itertuples(index=False, name=None),
+            )
+            conn.execute(
+                f"INSERT INTO {HISTORIAL_TABLE_ID} ({columnas}) "
+                f"SELECT {', '.join(f's.{c}' for c in COLUMNAS_HISTORIAL)} FROM _lote_estados AS s "
+                f"JOIN {TABLE_ID} AS t ON t.id = s.id WHERE t.estado = s.estado_anterior"
+            )
+            conn.execute(
+                f"UPDATE {TABLE_ID} AS t SET estado = s.estado_nuevo FROM _lote_estados AS s "
+                "WHERE t.id = s.id AND t.estado = s.estado_anterior"
+            )
+            conflictos = pd.read_sql_query(
+                f"SELECT s.id, t.estado AS estado_actual FROM _lote_estados AS s "
+                f"LEFT JOIN {TABLE_ID} AS t ON t.id = s.id "
+                f"LEFT JOIN {HISTORIAL_TABLE_ID} AS h ON h.id = s.id AND h.fecha_cambio = s.fecha_cambio "
+                "WHERE h.id IS NULL",
+                conn,
+            )
+            conn.execute("DROP TABLE _lote_estados")
+            self._marcar_modificada(conn)
+        return conflictos
+
+    def get_historial_estados(self, solicitud_id):
+        self.crear_tabla_historial()
+        with self._conectar() as conn:
+            df = pd.read_sql_query(
+                f"SELECT * FROM {HISTORIAL_TABLE_ID} WHERE id = ? ORDER BY fecha_cambio DESC",
+                conn, params=(solicitud_id,),
+            )
+        df["fecha_cambio"] = pd.to_datetime(df["fecha_cambio"], utc=True, format="ISO8601")
+        return df
+
+    def get_cambios_de_estado(self, desde):
+        self.crear_tabla_historial()
+        with self._conectar() as conn:
+            df = pd.read_sql_query(
+                f"SELECT id, estado_nuevo AS estado, fecha_cambio FROM {HISTORIAL_TABLE_ID} "
+                "WHERE fecha_cambio >= ? ORDER BY fecha_cambio",
+                conn, params=(timestamp_utc(desde),),
+            )
+        df["fecha_cambio"] = pd.to_datetime(df["fecha_cambio"], utc=True, format="ISO8601")
+        return df
+
+    def contar_solicitudes_hasta(self, hasta):
+        with self._conectar() as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM {TABLE_ID} WHERE fecha_solicitud <= ?", (timestamp_utc(hasta),)
+            ).fetchone()[0]
+
+    def crear_tabla_resumen(self):
+        try:
+            self.create_table_if_not_exists()
+            columnas = ",\n".join(
+                f"{c.name} {_TIPOS_SQLITE[c.field_type]}{' NOT NULL' if c.mode == 'REQUIRED' else ''}"
+                for c in SCHEMA_RESUMEN
+            )
+            with self._conectar() as conn:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {RESUMEN_TABLE_ID} (\n{columnas}\n)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{RESUMEN_TABLE_ID}_mes ON {RESUMEN_TABLE_ID} (mes)")
+            return True
+        except Exception as e:
+            print(f"❌ Error al crear la tabla local del resumen: {e}")
+            return False
+
+    def ultima_actualizacion_resumen(self):
+        self.crear_tabla_resumen()
+        with self._conectar() as conn:
+            valor = conn.execute(f"SELECT MAX(actualizado) FROM {RESUMEN_TABLE_ID}").fetchone()[0]
+        return datetime.fromisoformat(valor) if valor else None
+
+    def meses_con_cambios_de_estado(self, desde):
+        self.crear_tabla_historial()
+        with self._conectar() as conn:
+            filas = conn.execute(
+                f"SELECT DISTINCT substr(s.fecha_solicitud, 1, 7) FROM {HISTORIAL_TABLE_ID} AS h "
+                f"JOIN {TABLE_ID} AS s ON s.id = h.id WHERE h.fecha_cambio >= ?",
+                (timestamp_utc(desde),),
+            ).fetchall()
+        return [fila[0] for fila in filas]
+
+    def reagregar_resumen(self, meses=None, actualizado=None):
+        if meses is not None and not meses:
+            return
+        self.crear_tabla_resumen()
+        if meses is None:
+            condicion_fecha, condicion_mes, parametros = "1", "1", {}
+        else:
+            condicion_fecha, condicion_mes, parametros = condicion_meses(meses, prefijo=":")
+        valores = self._valores(parametros)
+        valores["actualizado"] = timestamp_utc(actualizado or datetime.now(timezone.utc))
+        # Las fechas se guardan como texto ISO en UTC: el mes son sus primeros 7 caracteres
+        with self._conectar() as conn:
+            conn.execute(f"DELETE FROM {RESUMEN_TABLE_ID} WHERE {condicion_mes}", valores)
+            conn.execute(
+                f"INSERT INTO {RESUMEN_TABLE_ID} ({', '.join(COLUMNAS_RESUMEN)}) "
+                f"SELECT substr(fecha_solicitud, 1, 7) AS mes, tipo_prestamo, estado, "
+                f"{sql_banda_monto()} AS banda_monto, COUNT(*), SUM(monto_solicitado), :actualizado "
+                f"FROM {TABLE_ID} WHERE {condicion_fecha} GROUP BY mes, tipo_prestamo, estado, banda_monto",
+                valores,
+            )
+
+    def contar_resumen(self, antes_de):
+        self.crear_tabla_resumen()
+        with self._conectar() as conn:
+            return conn.execute(
+                f"SELECT (SELECT COUNT(*) FROM {TABLE_ID} WHERE fecha_solicitud < ?), "
+                f"(SELECT COALESCE(SUM(solicitudes), 0) FROM {RESUMEN_TABLE_ID} WHERE mes < ?)",
+                (timestamp_utc(antes_de), mes_de(antes_de)),
+            ).fetchone()
+
+    def consultar_resumen(self, dimension, desde_mes=None):
+        validar_dimension(dimension)
+        self.crear_tabla_resumen()
+        with self._conectar() as conn:
+            return pd.read_sql_query(
+                f"SELECT {dimension}, SUM(solicitudes) AS solicitudes, SUM(monto_total) AS monto_total "
+                f"FROM {RESUMEN_TABLE_ID} {'WHERE mes >= ?' if desde_mes else ''} "
+                f"GROUP BY {dimension} ORDER BY {dimension}",
+                conn, params=(desde_mes,) if desde_mes else (),
+            )
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_repository():
+    """
+    Retorna el repositorio configurado en STORAGE_BACKEND
+    """
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            if STORAGE_BACKEND == "sqlite":
+                _repository = SQLiteRepository()
+            elif STORAGE_BACKEND == "bigquery":
+                _repository = BigQueryRepository()
+            else:
+                raise ValueError(f"STORAGE_BACKEND desconocido: {STORAGE_BACKEND}")
+        return _repository
+
+
+_esquema = None
+_esquema_error = None
+_esquema_lock = threading.Lock()
+_esquema_hilo = None
+
+
+def preparar_esquema():
+    """
+    Prepara las tablas una sola vez por proceso (ver asegurar_esquema)
+
+    El resultado queda guardado: las llamadas siguientes no hablan con el
+    backend. Si falla, la próxima llamada lo vuelve a intentar.
+
+    Returns:
+        dict: ResultadoEsquema de cada tabla, por nombre
+    """
+    global _esquema, _esquema_error
+    if _esquema is not None:
+        return _esquema
+    with _esquema_lock:
+        if _esquema is None:
+            try:
+                resultados = get_repository().asegurar_esquema()
+            except Exception as e:
+                _esquema_error = e
+                raise
+            for nombre, resultado in resultados.items():
+                if resultado.accion == "creada":
+                    print(f"✅ Tabla {nombre} creada")
+                elif resultado.accion == "actualizada":
+                    print(f"✅ Tabla {nombre}: columnas agregadas {', '.join(resultado.agregadas)}")
+                if resultado.incompatibles:
+                    print(f"⚠️ Tabla {nombre}: diferencias que no se aplican solas: {'; '.join(resultado.incompatibles)}")
+            _esquema, _esquema_error = resultados, None
+    return _esquema
+
+
+def preparar_esquema_en_segundo_plano():
+    """
+    Lanza preparar_esquema en un hilo, una sola vez por proceso, para que la
+    primera página no espere al backend
+    """
+    global _esquema_hilo
+
+    def preparar():
+        try:
+            preparar_esquema()
+        except Exception as e:
+            print(f"❌ No se pudo preparar el esquema: {type(e).__name__}: {e}")
+
+    with _esquema_lock:
+        if _esquema is None and (_esquema_hilo is None or not _esquema_hilo.is_alive()):
+            _esquema_hilo = threading.Thread(target=preparar, name="preparar-esquema", daemon=True)
+            _esquema_hilo.start()
+
+
+def estado_esquema():
+    """
+    Estado de la preparación, sin llamar al backend
+
+    Returns:
+        tuple: (resultados o None si aún no termina, último error o None)
+    """
+    return _esquema, _esquema_error
+
+
+def _repositorio():
+    # Las operaciones de datos esperan a que el esquema esté listo (solo la primera vez)
+    preparar_esquema()
+    return get_repository()
+
+
+# Mismas funciones que gcp_config, resueltas contra el backend configurado
+
+def create_table_if_not_exists():
+    return get_repository().create_table_if_not_exists()
+
+
+def insert_solicitud(solicitud_data):
+    return _repositorio().insert_solicitud(solicitud_data)
+
+
+def insertar_lote_solicitudes(filas):
+    return _repositorio().insertar_lote_solicitudes(filas)
+
+
+def cargar_solicitudes(df):
+    return _repositorio().cargar_solicitudes(df)
+
+
+def get_all_solicitudes(columnas=None):
+    return _repositorio().get_all_solicitudes(columnas)
+
+
+def get_table_metadata():
+    return _repositorio().get_table_metadata()
+
+
+def get_solicitudes_desde(desde, desde_id="", columnas=None):
+    return _repositorio().get_solicitudes_desde(desde, desde_id, columnas)
+
+
+def consultar_solicitudes(filtros=None, columnas=None, cursor=None, limite=50):
+    return _repositorio().consultar_solicitudes(filtros, columnas, cursor, limite)
+
+
+def iterar_solicitudes(filtros=None, columnas=None, tamano_bloque=10000, ventana_dias=0):
+    return _repositorio().iterar_solicitudes(filtros, columnas, tamano_bloque, ventana_dias)
+
+
+def crear_tabla_evaluaciones():
+    return get_repository().crear_tabla_evaluaciones()
+
+
+def contar_solicitudes_por_cedula():
+    return _repositorio().contar_solicitudes_por_cedula()
+
+
+def iterar_pendientes_sin_evaluar(tamano_bloque=10000):
+    return _repositorio().iterar_pendientes_sin_evaluar(tamano_bloque)
+
+
+def guardar_evaluaciones(df):
+    return _repositorio().guardar_evaluaciones(df)
+
+
+def crear_tabla_historial():
+    return get_repository().crear_tabla_historial()
+
+
+def aplicar_transiciones(df):
+    return _repositorio().aplicar_transiciones(df)
+
+
+def get_historial_estados(solicitud_id):
+    return _repositorio().get_historial_estados(solicitud_id)
+
+
+def get_cambios_de_estado(desde):
+    return _repositorio().get_cambios_de_estado(desde)
+
+
+def contar_solicitudes_hasta(hasta):
+    return _repositorio().contar_solicitudes_hasta(hasta)
+
+
+def crear_tabla_resumen():
+    return get_repository().crear_tabla_resumen()
+
+
+def ultima_actualizacion_resumen():
+    return _repositorio().ultima_actualizacion_resumen()
+
+
+def meses_con_cambios_de_estado(desde):
+    return _repositorio().meses_con_cambios_de_estado(desde)
+
+
+def reagregar_resumen(meses=None, actualizado=None):
+    return _repositorio().reagregar_resumen(meses, actualizado)
+
+
+def contar_resumen(antes_de):
+    return _repositorio().contar_resumen(antes_de)
+
+
+def consultar_resumen(dimension, desde_mes=None):
+    return _repositorio().consultar_resumen(dimension, desde_mes)
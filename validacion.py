@@ -0,0 +1,319 @@
+"""
+Reglas de validación y normalización de solicitudes.
+
+Cada regla se declara una sola vez en REGLAS y tiene dos implementaciones:
+una escalar, para el formulario (`validar_solicitud`, una solicitud a la vez),
+y una vectorizada, para la importación masiva (`validar_lote`, un DataFrame
+completo columna por columna). Así ambos caminos aplican exactamente las
+mismas reglas y los mismos mensajes.
+
+Antes de validar, cada campo se normaliza según NORMALIZACION: los textos se
+recortan, la cédula y el teléfono quedan solo con dígitos, las fechas se
+convierten a fecha y los montos a número. Después de validar, la cédula y el
+teléfono se devuelven con el formato con que se guardan en la tabla.
+
+`validar_lote` trabaja los textos como cadenas de Arrow (pyarrow) y los
+devuelve con el tipo de texto por defecto de pandas: con cadenas de objetos
+Python cada operación `.str` es un ciclo por fila y el lote apenas es más
+rápido que validar una solicitud a la vez. Con pandas 2 el texto se sigue
+devolviendo como objetos y esa conversión se lleva parte de la ganancia;
+benchmark_validacion.py mide ambos caminos.
+"""
+
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import pandas as pd
+from schema import (
+    TIPOS_PRESTAMO, ESTADOS, MONTO_MIN, MONTO_MAX,
+    PLAZO_MIN, PLAZO_MAX, PLAZO_PASO, EDAD_MINIMA,
+)
+
+# Solo dígitos ASCII, igual que en las expresiones de Arrow que usa validar_lote
+_NO_DIGITO = re.compile(r"[^0-9]")
+
+# Tipo de los textos dentro de validar_lote
+_TEXTO_ARROW = "string[pyarrow]"
+
+# Formato de fecha del formulario y de las exportaciones; las demás se
+# interpretan una por una
+_FORMATO_FECHA = "%Y-%m-%d"
+
+# Regla de validación: `tipo` indica qué se comprueba y `parametro` con qué valor
+Regla = namedtuple("Regla", ["campo", "tipo", "parametro", "motivo"])
+
+REGLAS = [
+    Regla("nombre", "longitud_minima", 3, "El nombre debe tener al menos 3 caracteres"),
+    Regla("cedula", "digitos", 11, "La cédula debe tener 11 dígitos"),
+    Regla("telefono", "digitos", 10, "El teléfono debe tener 10 dígitos"),
+    Regla("ocupacion", "obligatorio", None, "La ocupación es obligatoria"),
+    Regla("proposito", "longitud_minima", 10, "El propósito debe tener al menos 10 caracteres"),
+    Regla("fecha_nacimiento", "fecha", None, "La fecha de nacimiento no es válida"),
+    Regla("fecha_nacimiento", "edad_minima", EDAD_MINIMA, f"El solicitante debe tener al menos {EDAD_MINIMA} años"),
+    Regla("tipo_prestamo", "en_lista", tuple(TIPOS_PRESTAMO),
+          f"El tipo de préstamo debe ser uno de: {', '.join(TIPOS_PRESTAMO)}"),
+    Regla("monto_solicitado", "rango", (MONTO_MIN, MONTO_MAX, None),
+          f"El monto debe estar entre {MONTO_MIN:,.0f} y {MONTO_MAX:,.0f}"),
+    Regla("plazo_meses", "rango", (PLAZO_MIN, PLAZO_MAX, PLAZO_PASO),
+          f"El plazo debe estar entre {PLAZO_MIN} y {PLAZO_MAX} meses, en múltiplos de {PLAZO_PASO}"),
+    Regla("estado", "en_lista", tuple(ESTADOS), f"El estado debe ser uno de: {', '.join(ESTADOS)}"),
+]
+
+# Cómo se normaliza cada campo antes de validarlo (el resto son textos)
+NORMALIZACION = {
+    "cedula": "digitos",
+    "telefono": "digitos",
+    "fecha_nacimiento": "fecha",
+    "monto_solicitado": "numero",
+    "plazo_meses": "numero",
+}
+
+CAMPOS_VALIDADOS = [
+    "nombre", "cedula", "telefono", "email", "fecha_nacimiento", "ocupacion",
+    "tipo_prestamo", "monto_solicitado", "plazo_meses", "proposito", "estado",
+]
+
+ESTADO_INICIAL = "Pendiente"
+
+
+# ========== FORMATO ==========
+
+def solo_digitos(texto):
+    """
+    Quita todo lo que no sea dígito
+
+    Args:
+        texto (str): Cadena que puede contener números y otros caracteres
+
+    Returns:
+        str: Solo los dígitos del texto
+    """
+    return _NO_DIGITO.sub("", texto or "")
+
+
+def formatear_cedula(texto):
+    """
+    Aplica el formato (XXX) XXXXXXX-X a una cédula de 11 dígitos
+
+    Args:
+        texto (str): Cadena que puede contener números y otros caracteres
+
+    Returns:
+        str: Cédula formateada, o el texto original si no tiene 11 dígitos
+    """
+    numeros = solo_digitos(texto)
+    if len(numeros) == 11:
+        return f"({numeros[:3]}) {numeros[3:10]}-{numeros[10:]}"
+    return texto
+
+
+def formatear_telefono(texto):
+    """
+    Aplica el formato (XXX) XXX-XXXX a un teléfono de 10 dígitos
+
+    Args:
+        texto (str): Cadena que puede contener números y otros caracteres
+
+    Returns:
+        str: Teléfono formateado, o el texto original si no tiene 10 dígitos
+    """
+    numeros = solo_digitos(texto)
+    if len(numeros) == 10:
+        return f"({numeros[:3]}) {numeros[3:6]}-{numeros[6:]}"
+    return texto
+
+
+# ========== REGLAS: VERSIÓN ESCALAR ==========
+
+def _fecha_limite(hoy, edad):
+    return hoy - timedelta(days=edad * 365)
+
+
+def _fuera_de_rango(valor, parametro):
+    minimo, maximo, paso = parametro
+    return valor is None or not (minimo <= valor <= maximo) or bool(paso and valor % paso)
+
+
+_ESCALARES = {
+    "longitud_minima": lambda valor, parametro, hoy: len(valor) < parametro,
+    "digitos": lambda valor, parametro, hoy: len(valor) != parametro,
+    "obligatorio": lambda valor, parametro, hoy: not valor,
+    "fecha": lambda valor, parametro, hoy: valor is None,
+    "edad_minima": lambda valor, parametro, hoy: valor is not None and valor > _fecha_limite(hoy, parametro),
+    "en_lista": lambda valor, parametro, hoy: valor not in parametro,
+    "rango": lambda valor, parametro, hoy: _fuera_de_rango(valor, parametro),
+}
+
+
+def _a_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = _a_texto(valor)
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        pass
+    fecha = pd.to_datetime(texto or None, errors="coerce", format="mixed")
+    return None if pd.isna(fecha) else fecha.date()
+
+
+def _a_numero(valor):
+    try:
+        numero = float(str(valor).strip()) if isinstance(valor, str) else float(valor)
+    except (TypeError, ValueError):
+        return None
+    return None if numero != numero else numero
+
+
+def _a_texto(valor):
+    return "" if valor is None else str(valor).strip()
+
+
+_NORMALIZADORES = {
+    "digitos": lambda valor: solo_digitos(_a_texto(valor)),
+    "fecha": _a_fecha,
+    "numero": _a_numero,
+    "texto": _a_texto,
+}
+
+
+def validar_solicitud(datos, hoy=None):
+    """
+    Normaliza y valida una solicitud
+
+    Args:
+        datos (dict): Valores ingresados; `estado` es opcional (por defecto Pendiente)
+        hoy (date): Fecha de referencia para la edad mínima
+
+    Returns:
+        tuple: (dict con los valores normalizados y formateados,
+                lista de (campo, motivo) con los errores; vacía si es válida)
+    """
+    hoy = hoy or date.today()
+    valores = {
+        campo: _NORMALIZADORES[NORMALIZACION.get(campo, "texto")](datos.get(campo))
+        for campo in CAMPOS_VALIDADOS
+    }
+    valores["estado"] = valores["estado"] or ESTADO_INICIAL
+
+    errores = [
+        (regla.campo, regla.motivo)
+        for regla in REGLAS
+        if _ESCALARES[regla.tipo](valores[regla.campo], regla.parametro, hoy)
+    ]
+
+    valores["cedula"] = formatear_cedula(valores["cedula"])
+    valores["telefono"] = formatear_telefono(valores["telefono"])
+    valores["email"] = valores["email"] or None
+    if valores["plazo_meses"] is not None and valores["plazo_meses"].is_integer():
+        valores["plazo_meses"] = int(valores["plazo_meses"])
+    return valores, errores
+
+
+# ========== REGLAS: VERSIÓN VECTORIZADA ==========
+
+def _rango_columna(serie, parametro):
+    minimo, maximo, paso = parametro
+    fuera = ~serie.between(minimo, maximo)
+    if paso:
+        fuera |= serie % paso != 0
+    return fuera
+
+
+_VECTORIZADAS = {
+    "longitud_minima": lambda serie, parametro, hoy: serie.str.len() < parametro,
+    "digitos": lambda serie, parametro, hoy: serie.str.len() != parametro,
+    "obligatorio": lambda serie, parametro, hoy: serie.eq(""),
+    "fecha": lambda serie, parametro, hoy: serie.isna(),
+    "edad_minima": lambda serie, parametro, hoy: serie > pd.Timestamp(_fecha_limite(hoy, parametro)),
+    "en_lista": lambda serie, parametro, hoy: ~serie.isin(parametro),
+    "rango": lambda serie, parametro, hoy: _rango_columna(serie, parametro),
+}
+
+
+def _texto_columna(df, campo):
+    if campo not in df:
+        return pd.Series("", index=df.index, dtype=_TEXTO_ARROW)
+    return df[campo].astype(_TEXTO_ARROW).fillna("").str.strip()
+
+
+def _digitos_columna(texto):
+    # La mayoría ya viene solo con dígitos; solo se limpian las demás
+    limpios = texto.str.fullmatch(r"[0-9]*")
+    if limpios.all():
+        return texto
+    return texto.where(limpios, texto.str.replace(r"[^0-9]", "", regex=True))
+
+
+def _fecha_columna(texto):
+    fechas = pd.to_datetime(texto, errors="coerce", format=_FORMATO_FECHA)
+    resto = fechas.isna() & texto.ne("")
+    if resto.any():
+        fechas[resto] = pd.to_datetime(texto[resto], errors="coerce", format="mixed")
+    return fechas
+
+
+def _normalizar_columna(df, campo):
+    tipo = NORMALIZACION.get(campo, "texto")
+    texto = _texto_columna(df, campo)
+    if tipo == "digitos":
+        return _digitos_columna(texto)
+    if tipo == "fecha":
+        return _fecha_columna(texto)
+    if tipo == "numero":
+        # Sobre objetos, to_numeric da int64 o float64 como en el formulario, no Int64/Float64
+        return pd.to_numeric(texto.astype(object), errors="coerce")
+    return texto
+
+
+def _formatear_columna(digitos, cortes):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # Una sola expresión por columna; las que no tienen el largo exacto quedan
+    # igual. Con referencias (\1) pandas usaría re.sub fila por fila, por eso
+    # se llama a Arrow directamente
+    a, b, largo = cortes
+    patron = rf"^([0-9]{{{a}}})([0-9]{{{b - a}}})([0-9]{{{largo - b}}})$"
+    formateado = pc.replace_substring_regex(pa.array(digitos.array), patron, r"(\1) \2-\3")
+    return pd.Series(pd.arrays.ArrowStringArray(formateado), index=digitos.index, name=digitos.name)
+
+
+def validar_lote(df, hoy=None):
+    """
+    Normaliza y valida un DataFrame de solicitudes columna por columna
+
+    Args:
+        df (pandas.DataFrame): Solicitudes; las columnas faltantes se tratan como vacías
+        hoy (date): Fecha de referencia para la edad mínima
+
+    Returns:
+        tuple: (DataFrame con los campos normalizados y formateados, con el
+                mismo orden de filas que `df` y un índice 0..n-1,
+                DataFrame de errores con columnas posicion, campo, motivo)
+    """
+    hoy = hoy or date.today()
+    df = df.reset_index(drop=True)
+    valores = {campo: _normalizar_columna(df, campo) for campo in CAMPOS_VALIDADOS}
+    valores["estado"] = valores["estado"].replace("", ESTADO_INICIAL)
+
+    errores = []
+    for regla in REGLAS:
+        mascara = _VECTORIZADAS[regla.tipo](valores[regla.campo], regla.parametro, hoy)
+        mascara = mascara.fillna(True).to_numpy(dtype=bool)
+        if mascara.any():
+            errores.append(pd.DataFrame({"posicion": mascara.nonzero()[0], "campo": regla.campo, "motivo": regla.motivo}))
+    errores = (
+        pd.concat(errores, ignore_index=True).sort_values("posicion", kind="stable", ignore_index=True)
+        if errores else pd.DataFrame(columns=["posicion", "campo", "motivo"])
+    )
+
+    valores["cedula"] = _formatear_columna(valores["cedula"], (3, 10, 11))
+    valores["telefono"] = _formatear_columna(valores["telefono"], (3, 6, 10))
+    for campo, serie in valores.items():
+        if serie.dtype == _TEXTO_ARROW:
+            valores[campo] = serie.astype(str)
+    valores["email"] = valores["email"].replace("", None)
+    return pd.DataFrame(valores), errores